@@ -0,0 +1,79 @@
+"""add category_stats
+
+Revision ID: 40c4508e8392
+Revises: 8c418303252d
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "40c4508e8392"
+down_revision: Union[str, Sequence[str], None] = "8c418303252d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "category_stats",
+        sa.Column("category_id", sa.Integer(), nullable=False),
+        sa.Column("event_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("active_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column(
+            "picture_count", sa.Integer(), server_default="0", nullable=False
+        ),
+        sa.Column("latest_event_date", sa.Date(), nullable=True),
+        sa.Column("latest_cover", sa.String(), nullable=True),
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["category_id"],
+            ["category.id"],
+            name=op.f("fk_category_stats_category_id_category"),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk_category_stats")),
+        sa.UniqueConstraint(
+            "category_id", name=op.f("uq_category_stats_category_id")
+        ),
+    )
+    # начальное заполнение сводки по существующим данным
+    op.execute(
+        """
+        INSERT INTO category_stats (
+            category_id, event_count, active_count, picture_count,
+            latest_event_date, latest_cover
+        )
+        SELECT
+            c.id,
+            (SELECT count(*) FROM event e WHERE e.category_id = c.id),
+            (SELECT count(*) FROM event e WHERE e.category_id = c.id AND e.active),
+            (
+                SELECT count(*) FROM picture p
+                JOIN event e ON p.event_id = e.id
+                WHERE e.category_id = c.id
+            ),
+            (
+                SELECT e.date FROM event e
+                WHERE e.category_id = c.id AND e.active
+                ORDER BY e.created DESC LIMIT 1
+            ),
+            (
+                SELECT e.cover FROM event e
+                WHERE e.category_id = c.id AND e.active
+                ORDER BY e.created DESC LIMIT 1
+            )
+        FROM category c
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("category_stats")
@@ -0,0 +1,37 @@
+"""add picture metadata
+
+Revision ID: 5b2e7d9a1c43
+Revises: 40c4508e8392
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "5b2e7d9a1c43"
+down_revision: Union[str, Sequence[str], None] = "40c4508e8392"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("picture", sa.Column("width", sa.Integer(), nullable=True))
+    op.add_column("picture", sa.Column("height", sa.Integer(), nullable=True))
+    op.add_column("picture", sa.Column("orientation", sa.SmallInteger(), nullable=True))
+    op.add_column(
+        "picture",
+        sa.Column("taken_at", sa.DateTime(timezone=False), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("picture", "taken_at")
+    op.drop_column("picture", "orientation")
+    op.drop_column("picture", "height")
+    op.drop_column("picture", "width")
@@ -0,0 +1,28 @@
+"""add picture placeholder
+
+Revision ID: 8c1f3a6e2d57
+Revises: 5b2e7d9a1c43
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "8c1f3a6e2d57"
+down_revision: Union[str, Sequence[str], None] = "5b2e7d9a1c43"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("picture", sa.Column("placeholder", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("picture", "placeholder")
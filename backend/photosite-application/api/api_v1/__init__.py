@@ -3,6 +3,7 @@ from core.config import settings
 from .pictures import router as pictures_router
 from .events import router as events_router
 from .users import router as users_router
+from .categories import router as categories_router
 
 router = APIRouter(
     prefix=settings.api.v1.prefix,
@@ -14,3 +15,4 @@ router = APIRouter(
 router.include_router(pictures_router)
 router.include_router(events_router)
 router.include_router(users_router)
+router.include_router(categories_router)
@@ -0,0 +1,37 @@
+from typing import Annotated
+from fastapi import APIRouter, Depends, Response
+from fastapi_cache.decorator import cache
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.models import db_helper
+from core.schemas.category import CategoryStatsRead
+from crud import categories as categories_crud
+from utils.caching import events_key_builder, cached_json_response, JsonResponseCoder
+from utils.serialization import dump_json
+
+router = APIRouter(
+    prefix=settings.api.v1.categories,
+    tags=[
+        "categories",
+    ],
+)
+
+get_async_read_db = Annotated[AsyncSession, Depends(db_helper.read_session_getter)]
+
+
+@router.get("", response_model=list[CategoryStatsRead])
+@cache(
+    expire=settings.cache.term,
+    key_builder=events_key_builder,  # type: ignore
+    coder=JsonResponseCoder,
+)
+async def get_categories_summary(db: get_async_read_db) -> Response:
+    """
+    Функция операции для получения сводки по всем категориям:
+    количество съемок (всего и активных), количество фотографий,
+    дата и обложка последней созданной активной съемки.
+    Читает по одной строке на категорию из таблицы category_stats.
+    """
+    rows = await categories_crud.get_categories_stats(db)
+    return cached_json_response(dump_json([dict(row) for row in rows]))
@@ -1,14 +1,24 @@
-from typing import Annotated
-from collections.abc import Sequence
-from fastapi import APIRouter, Depends, Form, Path, Query, UploadFile, File, status
+from typing import Annotated, Literal
+from fastapi import (
+    APIRouter,
+    Depends,
+    Form,
+    HTTPException,
+    Path,
+    Query,
+    Response,
+    UploadFile,
+    File,
+    status,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi_cache.decorator import cache
 from fastapi_cache import FastAPICache
 
 
 from core.models import db_helper
-from core.models.event import Event
 from core.models.user import User
+from core.models.category import CategoryName
 from core.config import settings
 from core.schemas.event import (
     EventRead,
@@ -16,11 +26,27 @@ from core.schemas.event import (
     EventDescriptionUpdate,
     EventReadWithCategoryName,
     EventList,
+    EventReadCompact,
+    EventReadPartial,
+    EventListPartial,
+    EventListsByCategory,
 )
 from crud import events as events_crud
 
+from utils import upload_jobs
+from utils.admission import admit_upload
 from utils.authorization import get_current_user
-from utils.caching import events_key_builder
+from utils.upload_progress import UploadProgress, get_upload_id
+from utils.caching import events_key_builder, cached_json_response, JsonResponseCoder
+from utils.serialization import (
+    EVENT_COLUMNS,
+    EVENT_FIELDS,
+    EVENT_FIELDS_WITH_PICTURES,
+    PICTURE_COLUMNS,
+    dump_json,
+    render_event,
+    sparse_fields_parser,
+)
 
 router = APIRouter(
     prefix=settings.api.v1.events,
@@ -30,6 +56,15 @@ router = APIRouter(
 )
 
 get_async_db = Annotated[AsyncSession, Depends(db_helper.session_getter)]
+get_async_read_db = Annotated[AsyncSession, Depends(db_helper.read_session_getter)]
+
+# разреженные наборы полей (?fields=...), входят в ключ кеша
+event_fields = Annotated[
+    tuple[str, ...] | None, Depends(sparse_fields_parser(EVENT_FIELDS_WITH_PICTURES))
+]
+event_list_fields = Annotated[
+    tuple[str, ...] | None, Depends(sparse_fields_parser(EVENT_FIELDS))
+]
 
 
 @router.get("/cache_reset")
@@ -49,45 +84,139 @@ async def get_all_inactive_events(
     return await events_crud.get_inactive_events(db)
 
 
-@router.get("/{category}/{date}", response_model=EventRead)
-@cache(expire=settings.cache.term, key_builder=events_key_builder)  # type: ignore
+@router.get("/latest", response_model=EventListsByCategory)
+@cache(
+    expire=settings.cache.term,
+    key_builder=events_key_builder,  # type: ignore
+    coder=JsonResponseCoder,
+)
+async def get_latest_events_for_categories(
+    db: get_async_read_db,
+    fields: event_list_fields,
+    categories: Annotated[
+        list[str],
+        Query(description="Категории; по умолчанию все категории сайта"),
+    ] = [category.value for category in CategoryName],
+    limit: Annotated[int, Query()] = settings.querysettings.limit,
+) -> Response:
+    """
+    Функция операции для главной страницы: первые страницы съемок
+    нескольких категорий вместе с полным количеством съемок в каждой
+    за один запрос к базе данных. Ответ кешируется одной записью.
+    Параметр fields работает так же, как для списка съемок категории.
+    """
+    columns = fields or EVENT_COLUMNS
+
+    events_by_category = await events_crud.get_latest_events_by_categories(
+        db,
+        categories,
+        limit=limit,
+        columns=columns,
+    )
+
+    content = {
+        category: {
+            "total_count": total_count,
+            "events": [render_event(event, columns) for event in events],
+        }
+        for category, (total_count, events) in events_by_category.items()
+    }
+    return cached_json_response(dump_json(content))
+
+
+@router.get(
+    "/{category}/{date}",
+    response_model=EventRead | EventReadCompact | EventReadPartial,
+)
+@cache(
+    expire=settings.cache.term,
+    key_builder=events_key_builder,  # type: ignore
+    coder=JsonResponseCoder,
+)
 async def get_one_event_pictures(
-    db: get_async_db,
+    db: get_async_read_db,
     category: Annotated[str, Path()],
     date: Annotated[str, Path()],
-):
+    fields: event_fields,
+    picture_format: Annotated[
+        Literal["full", "compact"], Query(alias="format")
+    ] = "full",
+) -> Response:
     """
     Функция операции для получения всех фотографий из одной съемки.
+    При format=compact фотографии возвращаются списком имен файлов
+    с общим префиксом пути (схема EventReadCompact), что заметно
+    уменьшает ответ для больших съемок. Параметр fields ограничивает
+    набор полей в ответе и загружаемых из базы колонок (схема
+    EventReadPartial). Формат и набор полей входят в ключ кеша.
+    Ответ собирается из строк таблиц без ORM-моделей и повторной
+    валидации, response_model используется только для документации.
     """
-    return await events_crud.get_event_with_pictures(db, category, date)
+    columns = [field for field in fields or EVENT_COLUMNS if field != "pictures"]
+    event = await events_crud.get_event_row(db, category, date, columns)
+
+    pictures = None
+    if fields is None or "pictures" in fields:
+        compact = picture_format == "compact"
+        pictures = await events_crud.get_event_picture_rows(
+            db, event["id"], ("name",) if compact else PICTURE_COLUMNS
+        )
+        has_pictures = bool(pictures)
+    else:
+        has_pictures = await events_crud.event_has_pictures(db, event["id"])
+    # как и раньше, съемка без фотографий не отдается, какие бы поля
+    # ни были запрошены
+    if not has_pictures:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Такой съемки не существует",
+        )
+
+    content = render_event(
+        event,
+        columns,
+        pictures,
+        path_prefix=f"{category}/{date}/" if picture_format == "compact" else None,
+    )
+    return cached_json_response(dump_json(content))
 
 
-@router.get("/{category}", response_model=EventList)
-@cache(expire=settings.cache.term, key_builder=events_key_builder)  # type: ignore
+@router.get("/{category}", response_model=EventList | EventListPartial)
+@cache(
+    expire=settings.cache.term,
+    key_builder=events_key_builder,  # type: ignore
+    coder=JsonResponseCoder,
+)
 async def get_events_with_category(
-    db: get_async_db,
+    db: get_async_read_db,
     category: Annotated[str, Path()],
+    fields: event_list_fields,
     limit: Annotated[int, Query()] = settings.querysettings.limit,
     page: Annotated[int, Query()] = 1,
-) -> dict[str, int | Sequence[Event]]:
+) -> Response:
     """
     Функция операции для получения всех съемок из данной категории
     в обратном хронологическом порядке. Возвращает объект с полным
-    количеством записей для пагинации и последовательностью из
-    экземпляров orm-модели Event.
+    количеством записей для пагинации и списком съемок. Параметр fields
+    ограничивает набор полей съемок в ответе и выбираемых из базы колонок.
+    Ответ собирается из строк таблицы без ORM-моделей и повторной
+    валидации, response_model используется только для документации.
     """
+    columns = fields or EVENT_COLUMNS
 
     total_count, events = await events_crud.get_events_by_category(
         db,
         category,
         limit=limit,
         page=page,
+        columns=columns,
     )
 
-    return {
+    content = {
         "total_count": total_count,
-        "events": events,
+        "events": [render_event(event, columns) for event in events],
     }
+    return cached_json_response(dump_json(content))
 
 
 @router.get("/{category}/{date}/admin", response_model=EventRead)
@@ -145,16 +274,32 @@ async def add_pictures(
     category: Annotated[str, Path()],
     date: Annotated[str, Path()],
     files: Annotated[list[UploadFile], File()],
-) -> list[str]:
+    response: Response,
+    upload_id: Annotated[str | None, Depends(get_upload_id)],
+) -> list[str] | dict[str, str]:
     """Конечная точка для добавления фотографий к существующей съемке.
     Категория и дата съемки поступают не через форму, а как параметры пути.
     Файлы поступают через форму и должны быть валидированы
     схемой EventUpdate. На этот маршрут должен отправляться запрос на фронтенде
-    при нажатии кнопки.
+    при нажатии кнопки. При settings.uploads.async_processing файлы
+    ставятся в очередь, ответ 202 содержит id задачи. Прогресс отдается
+    по X-Upload-Id запроса или id задачи, как и для загрузки новой съемки.
     """
+    if settings.uploads.async_processing:
+        job_id = await upload_jobs.enqueue_upload_job(
+            upload_jobs.JOB_ADD_PICTURES, category, date, files
+        )
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"job_id": job_id, "status": "queued"}
+
     await FastAPICache.clear()
 
-    return await events_crud.add_pictures_to_existing_event(db, category, date, files)
+    # прогресс открывается первым: отказ допуска (503, 413) тоже
+    # публикуется клиенту, ждущему события этой загрузки, как failed
+    async with UploadProgress(upload_id) as progress, admit_upload(files):
+        return await events_crud.add_pictures_to_existing_event(
+            db, category, date, files, progress=progress
+        )
 
 
 @router.patch("/{category}/{date}/description", response_model=EventReadNoPictures)
@@ -1,13 +1,34 @@
-from typing import Annotated
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status
+from typing import Annotated, Literal
+from fastapi import (
+    APIRouter,
+    Depends,
+    UploadFile,
+    File,
+    Form,
+    Header,
+    HTTPException,
+    Path,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
 from fastapi_cache import FastAPICache
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.config import settings
-from core.schemas.picture import PictureRead
+from core.schemas.picture import (
+    PictureRead,
+    ResumableUploadCreate,
+    ResumableUploadRead,
+    UploadJobRead,
+)
 from core.models import db_helper
 from core.models.user import User
 from utils.authorization import get_current_user
 from crud import pictures as pictures_crud
+from utils import resumable_uploads, upload_jobs
+from utils.admission import admit_upload
+from utils.upload_progress import UploadProgress, get_upload_id, progress_events
 
 router = APIRouter(
     prefix=settings.api.v1.pictures,
@@ -33,21 +54,44 @@ async def get_all_pictures_sorted_by_id(
 async def upload_pictures_operation(
     user: Annotated[User, Depends(get_current_user)],
     db: get_async_db,
+    response: Response,
+    upload_id: Annotated[str | None, Depends(get_upload_id)],
     files: Annotated[list[UploadFile], File()],
     category: Annotated[str, Form()],
     date: Annotated[str, Form()],
     event_cover: Annotated[UploadFile, Form()],
     event_description: Annotated[str | None, Form()] = None,
 ):
+    """Загрузка новой съемки. При settings.uploads.async_processing
+    файлы только сохраняются и ставятся в очередь, ответ 202 содержит
+    id задачи для GET /pictures/jobs/{job_id}. Прогресс обработки
+    отдается конечной точкой /pictures/uploads/{upload_id}/progress,
+    где upload_id - заголовок X-Upload-Id запроса или id задачи."""
+    if settings.uploads.async_processing:
+        job_id = await upload_jobs.enqueue_upload_job(
+            upload_jobs.JOB_CREATE_EVENT,
+            category,
+            date,
+            files,
+            event_cover,
+            event_description,
+        )
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"job_id": job_id, "status": "queued"}
+
     await FastAPICache.clear()
-    return await pictures_crud.upload_pictures(
-        db,
-        files,
-        category,
-        date,
-        event_cover,
-        event_description,
-    )
+    # прогресс открывается первым: отказ допуска (503, 413) тоже
+    # публикуется клиенту, ждущему события этой загрузки, как failed
+    async with UploadProgress(upload_id) as progress, admit_upload(files):
+        return await pictures_crud.upload_pictures(
+            db,
+            files,
+            category,
+            date,
+            event_cover,
+            event_description,
+            progress=progress,
+        )
 
 
 @router.delete("", status_code=status.HTTP_204_NO_CONTENT)
@@ -65,3 +109,147 @@ async def delete_pictures_operation(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e),
         )
+
+
+@router.get("/jobs/{job_id}", response_model=UploadJobRead)
+async def get_upload_job_status(
+    user: Annotated[User, Depends(get_current_user)],
+    job_id: Annotated[str, Path()],
+):
+    """Состояние задачи асинхронной загрузки: queued, processing,
+    done (result - имена сохраненных файлов) или failed (detail - причина)"""
+    job = await upload_jobs.get_upload_job(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Задача загрузки не найдена",
+        )
+    return job
+
+
+@router.get("/uploads/{upload_id}/progress")
+async def stream_upload_progress(
+    user: Annotated[User, Depends(get_current_user)],
+    request: Request,
+    upload_id: Annotated[str, Path(pattern=r"^[A-Za-z0-9-]{1,64}$")],
+) -> StreamingResponse:
+    """Поток Server-Sent Events с прогрессом обработки загрузки по файлам:
+    snapshot с текущими счетчиками, затем события progress (этапы
+    received, written, thumbnailed, committed) и итоговое done или failed.
+    События передаются через Redis pub/sub, поэтому поток может отдавать
+    любой воркер."""
+    return StreamingResponse(
+        progress_events(request, upload_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# id возобновляемой загрузки (имя каталога), часть загрузки и имя файла в ней
+resumable_upload_id = Annotated[str, Path(pattern=r"^[0-9a-f]{32}$")]
+resumable_part = Annotated[Literal["files", "cover"], Path()]
+resumable_name = Annotated[str, Path()]
+
+
+@router.post(
+    "/resumable",
+    status_code=status.HTTP_201_CREATED,
+    response_model=ResumableUploadRead,
+)
+async def create_resumable_upload(
+    user: Annotated[User, Depends(get_current_user)],
+    db: get_async_db,
+    data: ResumableUploadCreate,
+):
+    """Создание возобновляемой загрузки для больших съемок. Каждый файл
+    отправляется кусками не больше chunk_size запросами PATCH на
+    /pictures/resumable/{upload_id}/{files|cover}/{name} с заголовком
+    Upload-Offset. После обрыва принятое смещение возвращает HEAD на тот же
+    адрес. Когда все файлы приняты, загрузка завершается запросом
+    POST /pictures/resumable/{upload_id}/finalize."""
+    return await resumable_uploads.create_resumable_upload(db, data)
+
+
+@router.get("/resumable/{upload_id}", response_model=ResumableUploadRead)
+async def get_resumable_upload(
+    user: Annotated[User, Depends(get_current_user)],
+    upload_id: resumable_upload_id,
+):
+    """Принятые смещения всех файлов загрузки"""
+    return await resumable_uploads.get_resumable_upload(upload_id)
+
+
+@router.head("/resumable/{upload_id}/{part}/{name}")
+async def get_resumable_file_offset(
+    user: Annotated[User, Depends(get_current_user)],
+    upload_id: resumable_upload_id,
+    part: resumable_part,
+    name: resumable_name,
+) -> Response:
+    """Принятое смещение файла в заголовке Upload-Offset"""
+    offset, size = await resumable_uploads.get_file_offset(upload_id, part, name)
+    return Response(
+        headers={
+            "Upload-Offset": str(offset),
+            "Upload-Length": str(size),
+            "Cache-Control": "no-store",
+        }
+    )
+
+
+@router.patch(
+    "/resumable/{upload_id}/{part}/{name}",
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def upload_resumable_chunk(
+    user: Annotated[User, Depends(get_current_user)],
+    request: Request,
+    upload_id: resumable_upload_id,
+    part: resumable_part,
+    name: resumable_name,
+    upload_offset: Annotated[int, Header(ge=0)],
+    content_length: Annotated[int | None, Header()] = None,
+) -> Response:
+    """Прием куска файла. Тело запроса записывается на диск по мере
+    получения, новое смещение возвращается в заголовке Upload-Offset"""
+    offset = await resumable_uploads.write_chunk(
+        upload_id,
+        part,
+        name,
+        upload_offset,
+        request.stream(),
+        content_length,
+    )
+    return Response(
+        status_code=status.HTTP_204_NO_CONTENT,
+        headers={"Upload-Offset": str(offset)},
+    )
+
+
+@router.post("/resumable/{upload_id}/finalize", status_code=status.HTTP_201_CREATED)
+async def finalize_resumable_upload(
+    user: Annotated[User, Depends(get_current_user)],
+    db: get_async_db,
+    response: Response,
+    upload_id: resumable_upload_id,
+):
+    """Завершение возобновляемой загрузки: создание съемки или добавление
+    фотографий к существующей, как при обычной загрузке. При
+    settings.uploads.async_processing ответ 202 с id задачи, равным id
+    загрузки. Прогресс отдается по id загрузки."""
+    result = await resumable_uploads.finalize_resumable_upload(
+        db, upload_id, settings.uploads.async_processing
+    )
+    if result is None:
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"job_id": upload_id, "status": "queued"}
+    return result
+
+
+@router.delete("/resumable/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_resumable_upload(
+    user: Annotated[User, Depends(get_current_user)],
+    upload_id: resumable_upload_id,
+) -> None:
+    """Отмена возобновляемой загрузки с удалением принятых файлов"""
+    await resumable_uploads.delete_resumable_upload(upload_id)
@@ -7,7 +7,7 @@ from core.config import settings
 from crud import users as users_crud
 from core.models.db_helper import db_helper
 from utils.authorization import (
-    verify_password,
+    verify_password_async,
     create_access_token,
     create_refresh_token,
     get_current_user,
@@ -15,7 +15,6 @@ from utils.authorization import (
 )
 from exceptions.user import incorrect_username_or_password
 
-
 get_async_db = Annotated[AsyncSession, Depends(db_helper.session_getter)]
 
 router = APIRouter(
@@ -33,7 +32,9 @@ async def login(
 ):
     """Конечная точка для авторизации. Создает access- и refresh-токены"""
     user = await users_crud.get_user_by_username(db, form_data.username)
-    if user is None or not verify_password(form_data.password, user.hashed_password):
+    if user is None or not await verify_password_async(
+        form_data.password, user.hashed_password
+    ):
         raise incorrect_username_or_password
 
     access_token = create_access_token(
@@ -0,0 +1,73 @@
+"""Сравнение размера ответа и времени кодирования съемки в полном
+(EventRead) и компактном (EventReadCompact) форматах.
+
+Запуск из каталога photosite-application:
+
+    python -m benchmarks.bench_compact_gallery
+"""
+
+import timeit
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+
+from core.schemas.event import EventRead, EventReadCompact
+from utils.serialization import EVENT_COLUMNS, render_event
+
+CATEGORY = "wedding"
+EVENT_DATE = "2024-05-25"
+REPEAT = 20
+
+
+def make_event(pictures_count: int) -> SimpleNamespace:
+    """Создает объект, повторяющий атрибуты ORM-модели Event с фотографиями"""
+    uploaded = datetime(2024, 5, 26, 12, 30, tzinfo=timezone.utc)
+    pictures = [
+        SimpleNamespace(
+            id=number,
+            name=f"{number:05d}.jpg",
+            uploaded=uploaded,
+            event_id=1,
+            path=f"{CATEGORY}/{EVENT_DATE}/{number:05d}.jpg",
+        )
+        for number in range(1, pictures_count + 1)
+    ]
+    return SimpleNamespace(
+        id=1,
+        category_id=1,
+        date=date.fromisoformat(EVENT_DATE),
+        cover=f"event_covers/{CATEGORY}/{EVENT_DATE}/00001.jpg",
+        description="Описание съемки",
+        created=uploaded,
+        active=True,
+        pictures=pictures,
+    )
+
+
+def encode_full(event: SimpleNamespace) -> bytes:
+    return (
+        EventRead.model_validate(event, from_attributes=True).model_dump_json().encode()
+    )
+
+
+def encode_compact(event: SimpleNamespace) -> bytes:
+    content = render_event(
+        vars(event),
+        EVENT_COLUMNS,
+        [vars(picture) for picture in event.pictures],
+        path_prefix=f"{CATEGORY}/{EVENT_DATE}/",
+    )
+    return EventReadCompact.model_validate(content).model_dump_json().encode()
+
+
+def main() -> None:
+    print(f"{'фото':>6} {'формат':>8} {'байт':>10} {'мс/ответ':>10}")
+    for pictures_count in (10, 100, 1000):
+        event = make_event(pictures_count)
+        for name, encoder in (("full", encode_full), ("compact", encode_compact)):
+            size = len(encoder(event))
+            seconds = timeit.timeit(lambda: encoder(event), number=REPEAT) / REPEAT
+            print(f"{pictures_count:>6} {name:>8} {size:>10} {seconds * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
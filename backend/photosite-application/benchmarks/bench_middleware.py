@@ -0,0 +1,143 @@
+"""Накладные расходы middleware на один запрос: прежние функции
+@app.middleware("http") (log_requests и headers_control, каждая
+оборачивается в BaseHTTPMiddleware) и RequestMiddleware из
+utils.middleware. Приложение вызывается напрямую через ASGI, без
+сети и HTTP-клиента; конечная точка возвращает готовый JSON. Вывод
+логов отключен, чтобы сравнивались только сами middleware.
+
+Запуск из каталога photosite-application:
+
+    python -m benchmarks.bench_middleware
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+
+from fastapi import FastAPI, Request, Response
+
+from core.config import settings
+from utils.middleware import RequestMiddleware
+
+REQUESTS = 5000
+BODY = b'{"total_count": 0, "events": []}'
+
+
+def endpoint() -> Response:
+    return Response(
+        content=BODY,
+        media_type="application/json",
+        headers={"Cache-Control": f"max-age={settings.cache.term}"},
+    )
+
+
+def make_plain_app() -> FastAPI:
+    app = FastAPI()
+    app.get("/events")(endpoint)
+    return app
+
+
+def make_base_http_app() -> FastAPI:
+    """Приложение с middleware в прежнем виде из main.py"""
+    app = make_plain_app()
+    logger = logging.getLogger("main")
+
+    @app.middleware("http")
+    async def log_requests(request: Request, call_next: Callable) -> Response:
+        start_time = time.time()
+        logger.info(
+            f"Request: {request.method} {request.url.path}",
+            extra={
+                "method": request.method,
+                "path": request.url.path,
+                "client_ip": request.client.host if request.client else "unknown",
+                "user_agent": request.headers.get("user-agent", "unknown"),
+            },
+        )
+        response: Response = await call_next(request)
+        process_time = time.time() - start_time
+        logger.info(
+            f"Request completed in {process_time:.4f} seconds with status code {response.status_code}",
+            extra={
+                "status_code": response.status_code,
+                "processing_time": f"{process_time:.4f}",
+            },
+        )
+        return response
+
+    @app.middleware("http")
+    async def headers_control(request: Request, call_next: Callable) -> Response:
+        response: Response = await call_next(request)
+        if "max-age" in (
+            cache_control_header := response.headers.get("Cache-Control", "Empty")
+        ):
+            if (
+                int(cache_control_header.split("=")[-1])
+                > settings.cache.max_age_maximum
+            ):
+                response.headers["Cache-Control"] = (
+                    f"max-age={settings.cache.max_age_maximum}"
+                )
+        return response
+
+    return app
+
+
+def make_asgi_app() -> FastAPI:
+    app = make_plain_app()
+    app.add_middleware(RequestMiddleware)
+    return app
+
+
+async def call(app: FastAPI) -> None:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/events",
+        "raw_path": b"/events",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"test"), (b"user-agent", b"bench")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("test", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def measure(app: FastAPI) -> float:
+    # первый запрос собирает стек middleware приложения
+    await call(app)
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        await call(app)
+    return (time.perf_counter() - started) / REQUESTS
+
+
+async def main() -> None:
+    logging.disable(logging.CRITICAL)
+    plain = await measure(make_plain_app())
+    print(f"{'middleware':<22} {'мкс/запрос':>11} {'накладные, мкс':>15}")
+    for title, app in (
+        ("без middleware", make_plain_app()),
+        ("BaseHTTPMiddleware x2", make_base_http_app()),
+        ("RequestMiddleware", make_asgi_app()),
+    ):
+        per_request = await measure(app)
+        print(
+            f"{title:<22} {per_request * 1e6:>11.1f} {(per_request - plain) * 1e6:>15.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
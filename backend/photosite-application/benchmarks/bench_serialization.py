@@ -0,0 +1,91 @@
+"""Сравнение времени сериализации съемки с 10/100/1000 фотографиями:
+прежний путь FastAPI (валидация ORM-объекта схемой EventRead и
+преобразование в JSON) и быстрый путь utils.serialization (словари из
+строк таблиц сразу в байты через orjson).
+
+Запуск из каталога photosite-application:
+
+    python -m benchmarks.bench_serialization
+"""
+
+import timeit
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+
+import orjson
+from pydantic import TypeAdapter
+
+from core.schemas.event import EventRead
+from utils.serialization import EVENT_COLUMNS, PICTURE_COLUMNS, dump_json, render_event
+
+CATEGORY = "wedding"
+EVENT_DATE = "2024-05-25"
+REPEAT = 20
+
+event_adapter = TypeAdapter(EventRead)
+
+
+def make_rows(pictures_count: int) -> tuple[dict, list[dict]]:
+    """Создает строки таблиц event и picture, как их возвращает
+    result.mappings()"""
+    uploaded = datetime(2024, 5, 26, 12, 30, tzinfo=timezone.utc)
+    event = {
+        "id": 1,
+        "category_id": 1,
+        "date": date.fromisoformat(EVENT_DATE),
+        "cover": f"event_covers/{CATEGORY}/{EVENT_DATE}/00001.jpg",
+        "description": "Описание съемки",
+        "created": uploaded,
+        "active": True,
+    }
+    pictures = [
+        {
+            "id": number,
+            "name": f"{number:05d}.jpg",
+            "uploaded": uploaded,
+            "event_id": 1,
+            "path": f"{CATEGORY}/{EVENT_DATE}/{number:05d}.jpg",
+        }
+        for number in range(1, pictures_count + 1)
+    ]
+    return event, pictures
+
+
+def encode_validated(orm_event: SimpleNamespace) -> bytes:
+    """Повторяет serialize_response FastAPI с response_model=EventRead
+    и рендеринг ORJSONResponse"""
+    model = event_adapter.validate_python(orm_event, from_attributes=True)
+    return orjson.dumps(event_adapter.dump_python(model, mode="json"))
+
+
+def encode_fast(event: dict, pictures: list[dict]) -> bytes:
+    return dump_json(render_event(event, EVENT_COLUMNS, pictures))
+
+
+def main() -> None:
+    print(f"{'фото':>6} {'validated, мс':>14} {'fast, мс':>10} {'ускорение':>10}")
+    for pictures_count in (10, 100, 1000):
+        event, pictures = make_rows(pictures_count)
+        orm_event = SimpleNamespace(
+            **event, pictures=[SimpleNamespace(**picture) for picture in pictures]
+        )
+        # оба пути должны давать одинаковый JSON
+        assert orjson.loads(encode_validated(orm_event)) == orjson.loads(
+            encode_fast(event, pictures)
+        )
+        assert tuple(pictures[0]) == PICTURE_COLUMNS
+
+        validated = (
+            timeit.timeit(lambda: encode_validated(orm_event), number=REPEAT) / REPEAT
+        )
+        fast = (
+            timeit.timeit(lambda: encode_fast(event, pictures), number=REPEAT) / REPEAT
+        )
+        print(
+            f"{pictures_count:>6} {validated * 1000:>14.3f} {fast * 1000:>10.3f}"
+            f" {validated / fast:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
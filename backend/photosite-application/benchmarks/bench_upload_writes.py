@@ -0,0 +1,91 @@
+"""Запись файлов загрузки на локальный диск: прежняя последовательная
+запись (чтение UploadFile и запись через aiofiles блоками по 8 КБ,
+по файлу за раз) и write_files_on_disc из utils.pictures (копирование
+в потоке блоками по 1 МБ, write_concurrency файлов одновременно в пределах
+upload_write_budget). Исходные файлы, как и у Starlette, лежат во временных
+файлах на диске. Перед каждым прогоном каталог назначения очищается,
+после прогона данные сбрасываются на диск (os.sync), чтобы время включало
+запись, а не только копирование в кеш страниц.
+
+Запуск из каталога photosite-application (по умолчанию 300 файлов по 15 МБ,
+нужно около 9 ГБ свободного места):
+
+    python -m benchmarks.bench_upload_writes [files] [size_mb]
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiofiles
+from fastapi import UploadFile
+
+from core.config import settings
+from utils.pictures import write_files_on_disc
+
+
+async def write_sequentially(directory: Path, files: list[UploadFile]) -> None:
+    """Запись в прежнем виде из save_multiple_files_to_event"""
+    for file in files:
+        async with aiofiles.open(directory / str(file.filename), "wb") as buffer:
+            while chunk := await file.read(8192):
+                await buffer.write(chunk)
+
+
+def make_sources(directory: Path, count: int, size: int) -> list[Path]:
+    directory.mkdir()
+    block = os.urandom(1024 * 1024)
+    paths = []
+    for i in range(count):
+        path = directory / f"{i}.jpg"
+        with open(path, "wb") as file:
+            for _ in range(size // len(block)):
+                file.write(block)
+        paths.append(path)
+    os.sync()
+    return paths
+
+
+async def run(write, sources: list[Path], target: Path) -> float:
+    shutil.rmtree(target, ignore_errors=True)
+    target.mkdir()
+    files = [
+        UploadFile(file=open(path, "rb"), filename=path.name, size=path.stat().st_size)
+        for path in sources
+    ]
+    started = time.perf_counter()
+    try:
+        await write(target, files)
+        await asyncio.to_thread(os.sync)
+    finally:
+        for file in files:
+            file.file.close()
+    return time.perf_counter() - started
+
+
+async def main(count: int, size_mb: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        sources = make_sources(Path(tmp) / "sources", count, size_mb * 1024 * 1024)
+        target = Path(tmp) / "target"
+        total_mb = count * size_mb
+
+        print(
+            f"{count} файлов по {size_mb} МБ, write_concurrency="
+            f"{settings.uploads.write_concurrency}, max_inflight_bytes="
+            f"{settings.uploads.max_inflight_bytes // 1024 // 1024} МБ"
+        )
+        for name, write in (
+            ("последовательно, aiofiles 8 КБ", write_sequentially),
+            ("write_files_on_disc", write_files_on_disc),
+        ):
+            seconds = await run(write, sources, target)
+            print(f"{name:32} {seconds:7.2f} с  {total_mb / seconds:7.1f} МБ/с")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    asyncio.run(main(*(args + [300, 15][len(args) :])))
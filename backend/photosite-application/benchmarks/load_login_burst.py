@@ -0,0 +1,109 @@
+"""Задержка чтения галереи во время всплеска входов в админку.
+
+Запросы галереи моделируются корутинами: ожидание ответа базы
+(asyncio.sleep) и сериализация съемки со 100 фотографиями, как в
+быстром пути utils.serialization. Одновременно с ними выполняется
+пачка проверок пароля bcrypt - сначала прямо в цикле событий
+(verify_password, как было в обработчике login), затем через пул
+потоков (verify_password_async). Для каждого режима выводятся p50
+и p99 задержки запросов галереи.
+
+Запуск из каталога photosite-application:
+
+    python -m benchmarks.load_login_burst
+"""
+
+import asyncio
+import logging
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+
+from benchmarks.bench_serialization import make_rows
+from utils.authorization import (
+    hash_password,
+    password_hashing_stats,
+    verify_password,
+    verify_password_async,
+)
+from utils.serialization import EVENT_COLUMNS, dump_json, render_event
+
+GALLERY_REQUESTS = 300
+GALLERY_INTERVAL = 0.002
+DB_LATENCY = 0.002
+LOGINS = 8
+
+PASSWORD = "benchmark-password"
+HASHED_PASSWORD = hash_password(PASSWORD)
+EVENT, PICTURES = make_rows(100)
+
+
+async def gallery_request(scheduled: float) -> float:
+    """Задержка считается от запланированного момента отправки, а не
+    от фактического: пока цикл событий заблокирован, запросы не
+    отправляются, и без этого их ожидание не попало бы в замер"""
+    await asyncio.sleep(DB_LATENCY)
+    dump_json(render_event(EVENT, EVENT_COLUMNS, PICTURES))
+    return time.perf_counter() - scheduled
+
+
+async def blocking_login(delay: float) -> None:
+    await asyncio.sleep(delay)
+    verify_password(PASSWORD, HASHED_PASSWORD)
+
+
+async def offloaded_login(delay: float) -> None:
+    await asyncio.sleep(delay)
+    await verify_password_async(PASSWORD, HASHED_PASSWORD)
+
+
+async def run(login: Callable[[float], Awaitable[None]] | None) -> list[float]:
+    # входы равномерно распределены по времени отправки запросов галереи
+    window = GALLERY_REQUESTS * GALLERY_INTERVAL
+    logins = []
+    if login is not None:
+        logins = [
+            asyncio.create_task(login(window * number / LOGINS))
+            for number in range(LOGINS)
+        ]
+
+    requests = []
+    started = time.perf_counter()
+    for number in range(GALLERY_REQUESTS):
+        scheduled = started + number * GALLERY_INTERVAL
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        requests.append(asyncio.create_task(gallery_request(scheduled)))
+
+    latencies = await asyncio.gather(*requests)
+    await asyncio.gather(*logins)
+    return latencies
+
+
+def percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100)[q - 1]
+
+
+async def main() -> None:
+    # предупреждения о долгом ожидании в очереди здесь ожидаемы
+    logging.disable(logging.WARNING)
+    print(f"{'режим':<22} {'p50, мс':>8} {'p99, мс':>8}")
+    for title, login in (
+        ("без входов", None),
+        ("bcrypt в цикле", blocking_login),
+        ("bcrypt в пуле потоков", offloaded_login),
+    ):
+        latencies = await run(login)
+        print(
+            f"{title:<22} {percentile(latencies, 50) * 1000:>8.1f}"
+            f" {percentile(latencies, 99) * 1000:>8.1f}"
+        )
+
+    print(
+        f"\nожидание в очереди пула: "
+        f"среднее {password_hashing_stats.queue_seconds_total / password_hashing_stats.count * 1000:.1f} мс, "
+        f"максимум {password_hashing_stats.queue_seconds_max * 1000:.1f} мс"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
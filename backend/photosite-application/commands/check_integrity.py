@@ -0,0 +1,364 @@
+"""Сверка файлов фотографий с базой данных. Запись файлов и коммит
+в upload_pictures, delete_event и edit_event_base_data не атомарны,
+поэтому после сбоев возможны строки picture без исходного файла,
+фотографии без превью, съемки без обложки и файлы или каталоги,
+не принадлежащие ни одной съемке.
+
+Каталоги image_dir, thumbnails_dir и covers_dir имеют вид
+категория/дата/файл, поэтому сверка идет по съемкам: в памяти хранятся
+только список съемок и содержимое нескольких каталогов, а не все пути
+архива. Строки picture читаются из базы курсором на стороне сервера
+в порядке id съемки, каталоги съемок читаются os.scandir параллельно
+в пуле потоков, опережая обработку не больше чем на --window съемок.
+
+С --repair недостающие превью создаются заново в пуле процессов,
+лишние файлы и каталоги удаляются, если они старше --min-age секунд
+(более новые могут принадлежать идущей загрузке). Строки picture без
+исходного файла только выводятся: удалять их из базы нужно вручную.
+
+Запуск из каталога photosite-application:
+
+    python -m commands.check_integrity [--repair] [--workers 8]
+
+Код возврата 1, если найдены неисправленные расхождения.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import time
+from collections import Counter, deque
+from collections.abc import AsyncIterator, Iterable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from sqlalchemy import Row, select
+from sqlalchemy.ext.asyncio import AsyncResult, AsyncSession, async_sessionmaker
+
+from core.config import settings
+from core.models import Category, Event, Picture, db_helper
+from logging_config import setup_logging
+from utils.pictures import rebuild_thumbnail
+
+logger = logging.getLogger(__name__)
+
+# виды расхождений
+MISSING_ORIGINAL = "missing_original"
+MISSING_THUMBNAIL = "missing_thumbnail"
+MISSING_COVER = "missing_cover"
+ORPHAN_FILE = "orphan_file"
+ORPHAN_DIRECTORY = "orphan_directory"
+
+TITLES = {
+    MISSING_ORIGINAL: "Нет исходного файла",
+    MISSING_THUMBNAIL: "Нет превью",
+    MISSING_COVER: "Нет файла обложки",
+    ORPHAN_FILE: "Лишний файл",
+    ORPHAN_DIRECTORY: "Лишний каталог",
+}
+
+
+class Scan(NamedTuple):
+    files: set[str]
+    dirs: set[str]
+
+
+class EventScan(NamedTuple):
+    images: Scan
+    thumbnails: Scan
+    covers: Scan
+
+
+def scan_directory(path: Path) -> Scan:
+    """Имена файлов и подкаталогов; пустой результат, если каталога нет"""
+    files: set[str] = set()
+    dirs: set[str] = set()
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.add(entry.name)
+                else:
+                    files.add(entry.name)
+    except FileNotFoundError:
+        pass
+    return Scan(files, dirs)
+
+
+def scan_event(key: str) -> EventScan:
+    return EventScan(
+        scan_directory(settings.static.image_dir / key),
+        scan_directory(settings.static.thumbnails_dir / key),
+        scan_directory(settings.static.covers_dir / key),
+    )
+
+
+async def pictures_by_event(
+    result: AsyncResult[Any],
+) -> AsyncIterator[tuple[int, set[str]]]:
+    """Группирует строки (event_id, name), упорядоченные по event_id"""
+    event_id, names = None, set()
+    async for partition in result.partitions():
+        for row in partition:
+            if row.event_id != event_id:
+                if event_id is not None:
+                    yield event_id, names
+                event_id, names = row.event_id, set()
+            names.add(row.name)
+    if event_id is not None:
+        yield event_id, names
+
+
+class IntegrityChecker:
+    """Сверка и, при repair, исправление расхождений. Найденные
+    расхождения сразу выводятся в журнал и считаются в problems,
+    исправленные - в repaired, неудавшиеся исправления - в failed."""
+
+    def __init__(
+        self,
+        scan_executor: Executor,
+        repair_executor: Executor | None = None,
+        min_age: float = 3600,
+        window: int = 64,
+    ) -> None:
+        self.scan_executor = scan_executor
+        self.repair_executor = repair_executor
+        self.min_age = min_age
+        self.window = window
+        self.problems: Counter[str] = Counter()
+        self.repaired: Counter[str] = Counter()
+        self.failed: Counter[str] = Counter()
+        self._rebuilds: list[asyncio.Future] = []
+
+    def report(self, kind: str, path: Path) -> None:
+        self.problems[kind] += 1
+        logger.warning(f"{TITLES[kind]}: {path}")
+
+    def remove(self, kind: str, path: Path) -> None:
+        """Сообщает о лишнем файле или каталоге и при repair удаляет его.
+        Исправленным считается только удаленный этим вызовом путь; ошибки
+        удаления (например, нет прав) выводятся в журнал и считаются
+        в failed, не прерывая сверку."""
+        self.report(kind, path)
+        if self.repair_executor is None:
+            return
+        try:
+            if time.time() - path.lstat().st_mtime < self.min_age:
+                logger.info(f"Не удален, изменен недавно: {path}")
+                return
+            if kind == ORPHAN_DIRECTORY:
+                shutil.rmtree(path)
+            else:
+                path.unlink()
+        except FileNotFoundError:
+            logger.info(f"Уже удален: {path}")
+            return
+        except OSError as e:
+            logger.error(f"Не удалось удалить {path}: {e!r}")
+            self.failed[kind] += 1
+            return
+        self.repaired[kind] += 1
+
+    async def rebuild(self, picture_path: str) -> None:
+        """Создает превью в пуле процессов; ожидание готовности
+        откладывается до накопления window задач"""
+        if self.repair_executor is None:
+            return
+        loop = asyncio.get_running_loop()
+        self._rebuilds.append(
+            loop.run_in_executor(self.repair_executor, rebuild_thumbnail, picture_path)
+        )
+        if len(self._rebuilds) >= self.window:
+            await self.finish_rebuilds()
+
+    async def finish_rebuilds(self) -> None:
+        results = await asyncio.gather(*self._rebuilds, return_exceptions=True)
+        self._rebuilds.clear()
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"Не удалось создать превью: {result!r}")
+                self.failed[MISSING_THUMBNAIL] += 1
+            else:
+                self.repaired[MISSING_THUMBNAIL] += 1
+
+    async def check_roots(self, keys: set[str]) -> None:
+        """Проверяет верхние уровни каталогов (категория/дата): каталоги дат,
+        которым не соответствует ни одна съемка, и файлы вне каталогов дат"""
+        loop = asyncio.get_running_loop()
+        for root in (
+            settings.static.image_dir,
+            settings.static.thumbnails_dir,
+            settings.static.covers_dir,
+        ):
+            top = await loop.run_in_executor(self.scan_executor, scan_directory, root)
+            for name in sorted(top.files):
+                self.remove(ORPHAN_FILE, root / name)
+
+            categories = sorted(top.dirs)
+            scans = await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        self.scan_executor, scan_directory, root / category
+                    )
+                    for category in categories
+                )
+            )
+            for category, scan in zip(categories, scans):
+                for name in sorted(scan.files):
+                    self.remove(ORPHAN_FILE, root / category / name)
+                for name in sorted(scan.dirs):
+                    if f"{category}/{name}" not in keys:
+                        self.remove(ORPHAN_DIRECTORY, root / category / name)
+
+    async def scan_events(
+        self, events: Iterable[tuple[Row, str]]
+    ) -> AsyncIterator[tuple[Row, str, EventScan]]:
+        """Читает каталоги съемок в пуле потоков, опережая потребителя
+        не больше чем на window съемок"""
+        loop = asyncio.get_running_loop()
+        pending: deque[tuple[Row, str, asyncio.Future[EventScan]]] = deque()
+        for event, key in events:
+            future = loop.run_in_executor(self.scan_executor, scan_event, key)
+            pending.append((event, key, future))
+            if len(pending) >= self.window:
+                event, key, future = pending.popleft()
+                yield event, key, await future
+        while pending:
+            event, key, future = pending.popleft()
+            yield event, key, await future
+
+    async def check_event(
+        self, event: Row, key: str, names: set[str], scan: EventScan
+    ) -> None:
+        image_dir = settings.static.image_dir / key
+        thumbnails_dir = settings.static.thumbnails_dir / key
+        covers_dir = settings.static.covers_dir / key
+
+        for name in sorted(names - scan.images.files):
+            self.report(MISSING_ORIGINAL, image_dir / name)
+        # превью можно создать, только если есть исходный файл
+        for name in sorted((names & scan.images.files) - scan.thumbnails.files):
+            self.report(MISSING_THUMBNAIL, thumbnails_dir / name)
+            await self.rebuild(f"{key}/{name}")
+
+        cover_path = settings.static.base_image_dir / event.cover
+        cover_names = set()
+        if cover_path.parent == covers_dir:
+            cover_names.add(cover_path.name)
+            if cover_path.name not in scan.covers.files:
+                self.report(MISSING_COVER, cover_path)
+        elif not cover_path.is_file():
+            self.report(MISSING_COVER, cover_path)
+
+        for directory, directory_scan, expected in (
+            (image_dir, scan.images, names),
+            (thumbnails_dir, scan.thumbnails, names),
+            (covers_dir, scan.covers, cover_names),
+        ):
+            for name in sorted(directory_scan.files - expected):
+                self.remove(ORPHAN_FILE, directory / name)
+            for name in sorted(directory_scan.dirs):
+                self.remove(ORPHAN_DIRECTORY, directory / name)
+
+
+async def check_integrity(
+    session_factory: async_sessionmaker[AsyncSession],
+    checker: IntegrityChecker,
+) -> None:
+    async with session_factory() as db:
+        if db.get_bind().dialect.name == "postgresql":
+            # список съемок и поток фотографий читаются из одного снимка
+            # данных: при READ COMMITTED второй запрос видел бы съемки,
+            # зафиксированные после первого
+            await db.connection(
+                execution_options={"isolation_level": "REPEATABLE READ"}
+            )
+        result = await db.execute(
+            select(Event.id, Event.date, Event.cover, Category.name.label("category"))
+            .join(Category, Event.category_id == Category.id)
+            .order_by(Event.id)
+        )
+        events = [
+            (event, f"{event.category}/{event.date.isoformat()}")
+            for event in result.all()
+        ]
+        await checker.check_roots({key for _, key in events})
+
+        pictures = await db.stream(
+            select(Picture.event_id, Picture.name)
+            .order_by(Picture.event_id)
+            .execution_options(yield_per=1000)
+        )
+        groups = pictures_by_event(pictures)
+        group = await anext(groups, None)
+        async for event, key, scan in checker.scan_events(events):
+            # фотографии съемок, которых нет в списке, пропускаются: иначе
+            # группа перестала бы продвигаться, и файлы всех следующих съемок
+            # считались бы лишними
+            while group is not None and group[0] < event.id:
+                group = await anext(groups, None)
+            names: set[str] = set()
+            if group is not None and group[0] == event.id:
+                names = group[1]
+                group = await anext(groups, None)
+            await checker.check_event(event, key, names, scan)
+
+    await checker.finish_rebuilds()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Сверка файлов фотографий с базой")
+    parser.add_argument("--repair", action="store_true")
+    parser.add_argument(
+        "--workers", type=int, default=8, help="потоков для чтения каталогов"
+    )
+    parser.add_argument(
+        "--repair-workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="процессов для создания превью",
+    )
+    parser.add_argument(
+        "--min-age",
+        type=float,
+        default=3600,
+        help="возраст в секундах, после которого лишние файлы удаляются",
+    )
+    parser.add_argument("--window", type=int, default=64)
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace) -> int:
+    started = time.monotonic()
+    repair_executor = ProcessPoolExecutor(args.repair_workers) if args.repair else None
+    try:
+        with ThreadPoolExecutor(args.workers) as scan_executor:
+            checker = IntegrityChecker(
+                scan_executor,
+                repair_executor,
+                min_age=args.min_age,
+                window=args.window,
+            )
+            await check_integrity(db_helper.session_factory, checker)
+    finally:
+        if repair_executor is not None:
+            repair_executor.shutdown()
+    await db_helper.dispose()
+
+    elapsed = time.monotonic() - started
+    logger.info(
+        f"Сверка завершена за {elapsed:.1f} с. Найдено: {dict(checker.problems)}, "
+        f"исправлено: {dict(checker.repaired)}, "
+        f"не удалось исправить: {dict(checker.failed)}"
+    )
+    remaining = checker.problems.total() - checker.repaired.total()
+    return 1 if remaining else 0
+
+
+if __name__ == "__main__":
+    setup_logging()
+    sys.exit(asyncio.run(main(parse_args())))
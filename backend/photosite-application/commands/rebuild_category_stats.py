@@ -0,0 +1,36 @@
+"""Пересчет сводной таблицы category_stats по текущим данным таблиц
+event и picture. Нужен после ручных правок базы или если сводка
+разошлась с данными. После пересчета сбрасывается кеш ответов, иначе
+/categories отдавал бы прежние счетчики до истечения кеша.
+
+Запуск из каталога photosite-application:
+
+    python -m commands.rebuild_category_stats
+"""
+
+import asyncio
+
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.redis import RedisBackend
+
+from core.config import settings
+from core.models import db_helper
+from core.redis_helper import redis_helper
+from crud.categories import rebuild_all_category_stats
+
+
+async def main() -> None:
+    async with db_helper.session_factory() as db:
+        await rebuild_all_category_stats(db)
+
+    FastAPICache.init(
+        RedisBackend(redis_helper.client),
+        prefix=settings.redis.prefix,
+    )
+    await FastAPICache.clear()
+    await redis_helper.dispose()
+    await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,220 @@
+"""Пересоздание превью всех фотографий, например после изменения
+settings.static.thumbnails_width/height/target_ratio. Заодно заполняются
+размеры, ориентация, время съемки и заглушка фотографии (колонки Picture,
+добавленные позже самих фотографий).
+
+Строки picture читаются по порядку id пачками через курсор на стороне
+сервера, превью создаются в пуле процессов. После каждой пачки id
+последней обработанной фотографии записывается в файл контрольной точки,
+и прерванный запуск (в том числе по SIGTERM) продолжается с нее.
+
+Команда запускается на сервере работающего сайта, поэтому по умолчанию
+занимает немного ядер (--workers 2), а изображения передаются в пул
+не чаще --rate в секунду, каждое по отдельности, а не пачкой сразу.
+На свободном сервере оба параметра можно увеличить, --rate 0 снимает
+ограничение частоты.
+
+Запуск из каталога photosite-application:
+
+    python -m commands.rebuild_thumbnails [--workers 2] [--rate 20]
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.redis import RedisBackend
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from core.config import settings
+from core.models import Picture, db_helper
+from core.redis_helper import redis_helper
+from logging_config import setup_logging
+from utils.pictures import rebuild_thumbnail
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT = Path("rebuild_thumbnails.checkpoint")
+
+
+def read_checkpoint(checkpoint: Path) -> int:
+    """id последней обработанной фотографии или 0, если файла нет"""
+    try:
+        return int(checkpoint.read_text())
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(checkpoint: Path, last_id: int) -> None:
+    temporary = checkpoint.with_name(checkpoint.name + ".tmp")
+    temporary.write_text(str(last_id))
+    temporary.replace(checkpoint)
+
+
+class TokenBucket:
+    """Ограничение частоты: не больше rate событий в секунду, подряд
+    без ожидания - не больше burst. При rate=0 ограничения нет."""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    async def take(self) -> None:
+        if not self.rate:
+            return
+        while True:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+async def rebuild_batch(
+    db: AsyncSession,
+    executor: Executor,
+    rows: list[tuple[int, str]],
+    limiter: TokenBucket,
+) -> int:
+    """Пересоздает превью пачки фотографий и сохраняет их метаданные.
+    Каждое изображение передается в пул после разрешения limiter.
+    Фотографии, которые не удалось обработать (нет исходного файла,
+    поврежденное изображение), пропускаются с предупреждением в журнале.
+    Возвращает число пропущенных фотографий."""
+    loop = asyncio.get_running_loop()
+    futures = []
+    for _, path in rows:
+        await limiter.take()
+        futures.append(loop.run_in_executor(executor, rebuild_thumbnail, path))
+    results = await asyncio.gather(*futures, return_exceptions=True)
+
+    values = []
+    failed = 0
+    for (picture_id, path), result in zip(rows, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Не удалось пересоздать превью {path}: {result!r}")
+            failed += 1
+            continue
+        values.append({"id": picture_id, **result._asdict()})
+
+    if values:
+        await db.execute(update(Picture), values)
+        await db.commit()
+    return failed
+
+
+async def rebuild_thumbnails(
+    session_factory: async_sessionmaker[AsyncSession],
+    executor: Executor,
+    checkpoint: Path,
+    batch_size: int = 200,
+    rate: float = 0,
+    stopping: asyncio.Event | None = None,
+) -> tuple[int, int]:
+    """Пересоздает превью фотографий с id больше записанного в checkpoint.
+    rate - наибольшее число изображений в секунду (0 - без ограничения).
+    Файл контрольной точки удаляется, когда обработаны все фотографии.
+    Возвращает число обработанных и пропущенных фотографий."""
+    last_id = read_checkpoint(checkpoint)
+    if last_id:
+        logger.info(f"Продолжение с фотографии id > {last_id}")
+
+    done = failed = 0
+    started = time.monotonic()
+    limiter = TokenBucket(rate)
+    async with session_factory() as reader, session_factory() as writer:
+        result = await reader.stream(
+            select(Picture.id, Picture.path)
+            .where(Picture.id > last_id)
+            .order_by(Picture.id)
+            .execution_options(yield_per=batch_size)
+        )
+        async for partition in result.partitions():
+            rows = [(row.id, row.path) for row in partition]
+            failed += await rebuild_batch(writer, executor, rows, limiter)
+            done += len(rows)
+            write_checkpoint(checkpoint, rows[-1][0])
+
+            elapsed = max(time.monotonic() - started, 1e-9)
+            logger.info(
+                f"Обработано {done} фотографий (id до {rows[-1][0]}), "
+                f"{done / elapsed:.1f} изобр./с"
+            )
+            if stopping is not None and stopping.is_set():
+                logger.info("Остановка, следующий запуск продолжит с контрольной точки")
+                await result.close()
+                return done, failed
+
+    checkpoint.unlink(missing_ok=True)
+    return done, failed
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Пересоздание превью фотографий")
+    parser.add_argument(
+        "--workers", type=int, default=2, help="процессов для создания превью"
+    )
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument(
+        "--rate", type=float, default=20, help="изображений в секунду, 0 - без предела"
+    )
+    parser.add_argument("--checkpoint", type=Path, default=DEFAULT_CHECKPOINT)
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="начать сначала, а не с контрольной точки",
+    )
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace) -> None:
+    if args.restart:
+        args.checkpoint.unlink(missing_ok=True)
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopping.set)
+
+    started = time.monotonic()
+    with ProcessPoolExecutor(args.workers) as executor:
+        done, failed = await rebuild_thumbnails(
+            db_helper.session_factory,
+            executor,
+            args.checkpoint,
+            batch_size=args.batch_size,
+            rate=args.rate,
+            stopping=stopping,
+        )
+    elapsed = max(time.monotonic() - started, 1e-9)
+    logger.info(
+        f"Готово: {done} фотографий, пропущено {failed}, "
+        f"{elapsed:.1f} с, {done / elapsed:.1f} изобр./с"
+    )
+
+    # в ответах API изменились метаданные фотографий
+    if done:
+        FastAPICache.init(
+            RedisBackend(redis_helper.client),
+            prefix=settings.redis.prefix,
+        )
+        await FastAPICache.clear()
+    await redis_helper.dispose()
+    await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,115 @@
+"""Обработчик очереди загрузок (settings.uploads.async_processing):
+создает превью, записывает фотографии в базу и сбрасывает кеш ответов
+для задач, поставленных конечными точками загрузки. Обработчиков можно
+запускать сколько угодно, независимо от воркеров API; каждый берет
+из очереди Redis по одной задаче, перенося ее в свой список
+обрабатываемых задач; задачи остановленного посреди обработки обработчика
+другие обработчики возвращают в очередь. Сигнал SIGTERM дает закончить
+текущую задачу. Раз в staging_cleanup_interval секунд обработчик удаляет
+каталоги брошенных возобновляемых загрузок.
+
+Запуск из каталога photosite-application:
+
+    python -m commands.upload_worker
+
+Метрики обработчика (время создания превью, размеры файлов) пишутся
+в каталог settings.metrics.multiproc_dir, общий с воркерами gunicorn,
+и отдаются их /metrics.
+"""
+
+import os
+from pathlib import Path
+
+from core.config import settings
+
+if __name__ == "__main__":
+    # как в gunicorn.conf.py: переменная должна быть задана до импорта
+    # utils.metrics, который создает файлы метрик процесса
+    os.environ.setdefault(
+        "PROMETHEUS_MULTIPROC_DIR", str(settings.metrics.multiproc_dir)
+    )
+    Path(os.environ["PROMETHEUS_MULTIPROC_DIR"]).mkdir(parents=True, exist_ok=True)
+
+import asyncio
+import logging
+import signal
+import socket
+import time
+from uuid import uuid4
+
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.redis import RedisBackend
+from prometheus_client import multiprocess
+
+from core.models import db_helper
+from core.redis_helper import redis_helper
+from logging_config import setup_logging
+from utils.resumable_uploads import cleanup_staging_dirs
+from utils.upload_jobs import (
+    complete_upload_job,
+    heartbeat,
+    process_upload_job,
+    recover_abandoned_jobs,
+    register_worker,
+    take_upload_job,
+    unregister_worker,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def send_heartbeats(worker_id: str) -> None:
+    """Продлевает запись обработчика и во время обработки задачи"""
+    while True:
+        await heartbeat(worker_id)
+        await asyncio.sleep(settings.uploads.worker_heartbeat_ttl / 3)
+
+
+async def main() -> None:
+    FastAPICache.init(
+        RedisBackend(redis_helper.client),
+        prefix=settings.redis.prefix,
+    )
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopping.set)
+
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid4().hex[:8]}"
+    await register_worker(worker_id)
+    keep_alive = asyncio.create_task(send_heartbeats(worker_id))
+
+    logger.info(f"Обработчик загрузок {worker_id} запущен")
+    next_cleanup = 0.0
+    next_recovery = 0.0
+    try:
+        while not stopping.is_set():
+            if time.monotonic() >= next_recovery:
+                await recover_abandoned_jobs()
+                next_recovery = time.monotonic() + settings.uploads.worker_heartbeat_ttl
+            if time.monotonic() >= next_cleanup:
+                await cleanup_staging_dirs()
+                next_cleanup = (
+                    time.monotonic() + settings.uploads.staging_cleanup_interval
+                )
+            job_id = await take_upload_job(worker_id, timeout=5)
+            if job_id is None:
+                continue
+            logger.info(f"Обработка задачи загрузки {job_id}")
+            async with db_helper.session_factory() as db:
+                await process_upload_job(db, job_id)
+            await complete_upload_job(worker_id, job_id)
+    finally:
+        keep_alive.cancel()
+        await unregister_worker(worker_id)
+        if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+            multiprocess.mark_process_dead(os.getpid())
+
+    await redis_helper.dispose()
+    await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    asyncio.run(main())
@@ -1,5 +1,6 @@
+import tempfile
 from pathlib import Path
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from pydantic import PostgresDsn
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -7,6 +8,7 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class RunConfig(BaseModel):
     host: str = "0.0.0.0"
     port: int = 8000
+    workers: int = 4
 
 
 class ApiV1Prefix(BaseModel):
@@ -14,6 +16,7 @@ class ApiV1Prefix(BaseModel):
     pictures: str = "/pictures"
     events: str = "/events"
     users: str = "/users"
+    categories: str = "/categories"
 
 
 class ApiPrefix(BaseModel):
@@ -44,6 +47,21 @@ class Auth(BaseModel):
     secret_key: str = ""
     algorithm: str = "HS256"
 
+    # кеш аутентифицированного пользователя вместо запроса к базе.
+    # В приложении нет кода, меняющего или удаляющего пользователей (они
+    # правятся вручную в базе), поэтому сбросить запись некому: токен
+    # удаленного пользователя принимается до истечения записи, и время
+    # ее жизни ограничено минутой
+    principal_cache_ttl: int = Field(default=60, ge=0, le=60)
+    principal_cache_max_size: int = 1024
+    principal_cache_redis: bool = False
+
+    # потоки для bcrypt: хеширование не выполняется в цикле событий.
+    # Сверх потоков в очереди ждут не больше password_hashing_queue_size
+    # проверок, остальные получают 503
+    password_hashing_workers: int = 2
+    password_hashing_queue_size: int = 32
+
 
 class RedisConfig(BaseModel):
     url: str = "redis://localhost:6379"
@@ -54,8 +72,18 @@ class DatabaseConfig(BaseModel):
     url: PostgresDsn | None = None
     echo: bool = False
     echo_pool: bool = False
-    pool_size: int = 50
-    max_overflow: int = 10
+    # общее число соединений с базой на все воркеры gunicorn;
+    # pool_size и max_overflow воркера вычисляются из него, если не заданы явно
+    connection_budget: int = 20
+    pool_size: int | None = None
+    max_overflow: int | None = None
+    pool_timeout: float = 30
+    # подключение через PgBouncer в режиме transaction pooling
+    pgbouncer: bool = False
+    # реплики для публичных запросов на чтение; после изменения данных
+    # чтение read_your_writes_seconds секунд идет из основной базы
+    replica_urls: list[PostgresDsn] = []
+    read_your_writes_seconds: float = 5
 
     naming_convention: dict[str, str] = {
         "ix": "ix_%(column_0_label)s",
@@ -75,6 +103,79 @@ class CashConfig(BaseModel):
     max_age_maximum: int = 60
 
 
+class WarmupConfig(BaseModel):
+    # прогрев воркера в lifespan до приема запросов
+    enabled: bool = True
+    connections: int = 2
+    response_cache: bool = False
+    timeout: float = 10
+
+
+class LoggingConfig(BaseModel):
+    # размер очереди записей; при переполнении записи отбрасываются
+    queue_size: int = 10000
+    # доля записей об успешных запросах, попадающих в лог,
+    # общая и для отдельных шаблонов маршрутов
+    success_sample_rate: float = 1.0
+    route_sample_rates: dict[str, float] = {}
+
+
+class MetricsConfig(BaseModel):
+    # каталог файлов метрик воркеров gunicorn (PROMETHEUS_MULTIPROC_DIR)
+    multiproc_dir: Path = Path(tempfile.gettempdir()) / "photosite-prometheus"
+
+
+class ProfilingConfig(BaseModel):
+    # профилирование запросов по заголовку X-Profile или ?profile=1
+    # от администратора и выборочно для остальных запросов
+    enabled: bool = False
+    sample_rate: float = 0.0
+    reports_dir: Path = Path(__file__).parent.parent.resolve() / "logs" / "profiles"
+
+
+class SlowQueryConfig(BaseModel):
+    # запросы дольше threshold_ms пишутся в logs/slow_queries.log,
+    # для SELECT на PostgreSQL - вместе с EXPLAIN (ANALYZE, BUFFERS)
+    enabled: bool = True
+    threshold_ms: int = 200
+    explain: bool = True
+    explain_interval: float = 600
+    max_parameters_length: int = 1000
+
+
+class UploadsConfig(BaseModel):
+    # обработка загрузок отдельным процессом (commands/upload_worker.py):
+    # конечные точки сохраняют файлы в staging_dir и отвечают 202 с id задачи.
+    # staging_dir не должен находиться внутри раздаваемого nginx каталога static
+    async_processing: bool = False
+    staging_dir: Path = Path(__file__).parent.parent.resolve() / "upload_staging"
+    job_ttl: int = 60 * 60 * 24
+    # обработчик загрузок, не продлевавший свою запись дольше
+    # worker_heartbeat_ttl секунд, считается остановленным, и его задачи
+    # возвращаются в очередь; после max_job_attempts прерванных попыток
+    # задача помечается неудачной
+    worker_heartbeat_ttl: int = 30
+    max_job_attempts: int = 3
+    # возобновляемые загрузки: наибольший кусок (меньше client_max_body_size
+    # nginx) и время хранения незавершенной загрузки с последнего куска
+    max_chunk_size: int = 50 * 1024 * 1024
+    resumable_ttl: int = 60 * 60 * 24 * 3
+    # как часто обработчик загрузок удаляет каталоги staging_dir брошенных
+    # загрузок (не менявшиеся дольше resumable_ttl)
+    staging_cleanup_interval: int = 60 * 60
+    # параллельная запись файлов одной загрузки и общий для воркера
+    # предел объема записываемых файлов; загрузка, не дождавшаяся места
+    # за admission_timeout секунд, получает 503
+    write_concurrency: int = 4
+    max_inflight_bytes: int = 256 * 1024 * 1024
+    admission_timeout: float = 30
+    # память воркера под декодированные изображения при создании превью
+    # (оценка по заголовкам) и наибольшее допустимое число пикселей
+    # (Image.MAX_IMAGE_PIXELS); 45 Мп RGB занимают около 135 МБ
+    decode_memory_budget: int = 768 * 1024 * 1024
+    max_image_pixels: int = 120_000_000
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
         env_file=(
@@ -94,6 +195,12 @@ class Settings(BaseSettings):
     redis: RedisConfig = RedisConfig()
     querysettings: QueryConfig = QueryConfig()
     cache: CashConfig = CashConfig()
+    warmup: WarmupConfig = WarmupConfig()
+    logging: LoggingConfig = LoggingConfig()
+    metrics: MetricsConfig = MetricsConfig()
+    profiling: ProfilingConfig = ProfilingConfig()
+    slow_queries: SlowQueryConfig = SlowQueryConfig()
+    uploads: UploadsConfig = UploadsConfig()
 
     environment: str = ""
 
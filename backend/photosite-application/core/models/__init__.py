@@ -5,6 +5,7 @@ __all__ = (
     "Category",
     "Event",
     "User",
+    "CategoryStats",
 )
 
 from .db_helper import db_helper
@@ -13,3 +14,4 @@ from .picture import Picture
 from .category import Category
 from .event import Event
 from .user import User
+from .category_stats import CategoryStats
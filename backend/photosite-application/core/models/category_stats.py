@@ -0,0 +1,29 @@
+from typing import TYPE_CHECKING
+from datetime import date
+from sqlalchemy import ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from core.models.base import Base
+
+if TYPE_CHECKING:
+    from core.models.category import Category
+
+
+class CategoryStats(Base):
+    """Агрегированные данные по категории для навигации и админки.
+    Строка пересчитывается функцией utils.category_stats.refresh_category_stats
+    в той же транзакции, что и изменение съемок или фотографий категории."""
+
+    __tablename__ = "category_stats"
+
+    category_id: Mapped[int] = mapped_column(
+        ForeignKey("category.id", ondelete="CASCADE"),
+        unique=True,
+    )
+    event_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    active_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    picture_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    # дата и обложка последней созданной активной съемки
+    latest_event_date: Mapped[date | None]
+    latest_cover: Mapped[str | None]
+
+    category: Mapped["Category"] = relationship("Category")
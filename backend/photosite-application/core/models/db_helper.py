@@ -1,11 +1,72 @@
-from collections.abc import AsyncGenerator
+import itertools
+import logging
+import math
+import time
+from collections.abc import AsyncGenerator, Callable, Sequence
+from uuid import uuid4
+
+from sqlalchemy import event, make_url
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
     AsyncEngine,
     async_sessionmaker,
     AsyncSession,
 )
+from sqlalchemy.orm import ORMExecuteState, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from core.config import settings
+from core.redis_helper import redis_helper
+
+logger = logging.getLogger(__name__)
+
+
+class PoolWaitStats:
+    """Статистика ожидания соединения из пула"""
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.seconds_total: float = 0.0
+        self.seconds_max: float = 0.0
+        # дополнительные получатели замеров, например метрики
+        self.observers: list[Callable[[float], None]] = []
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.seconds_total += seconds
+        self.seconds_max = max(self.seconds_max, seconds)
+        for observer in self.observers:
+            observer(seconds)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, замеряющий время получения соединения.
+    Если все соединения заняты, время включает ожидание освобождения
+    соединения (не дольше pool_timeout)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.wait_stats.observe(time.perf_counter() - started)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+
+def pool_limits(connection_budget: int, workers: int) -> tuple[int, int]:
+    """Делит общий бюджет соединений с базой между воркерами gunicorn.
+    Возвращает (pool_size, max_overflow) для одного воркера: примерно
+    четверть доли воркера отводится под временные соединения сверх пула."""
+    per_worker = max(1, connection_budget // max(1, workers))
+    max_overflow = per_worker // 4
+    return per_worker - max_overflow, max_overflow
 
 
 class DatabaseHelper:
@@ -16,33 +77,202 @@ class DatabaseHelper:
         echo_pool: bool = False,
         pool_size: int = 5,
         max_overflow: int = 10,
+        pool_timeout: float = 30,
+        pgbouncer: bool = False,
+        replica_urls: Sequence[str] = (),
+        read_your_writes_seconds: float = 5,
     ):
-        self.engine: AsyncEngine = create_async_engine(
-            url=url,
-            echo=echo,
-            echo_pool=echo_pool,
-            pool_size=pool_size,
-            max_overflow=max_overflow,
-        )
+        engine_options = {
+            "echo": echo,
+            "echo_pool": echo_pool,
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_timeout": pool_timeout,
+            "pgbouncer": pgbouncer,
+        }
+        self.engine: AsyncEngine = self._create_engine(url, **engine_options)
         self.session_factory: async_sessionmaker[AsyncSession] = async_sessionmaker(
             bind=self.engine,
+            class_=self._write_publishing_session_class(),
             autoflush=False,
             autocommit=False,
             expire_on_commit=False,
+            sync_session_class=self._write_tracking_session_class(),
+        )
+
+        # реплики только для чтения, выбираются по кругу
+        self.replica_engines: list[AsyncEngine] = [
+            self._create_engine(replica_url, **engine_options)
+            for replica_url in replica_urls
+        ]
+        self.replica_session_factories: list[async_sessionmaker[AsyncSession]] = [
+            async_sessionmaker(
+                bind=replica_engine,
+                autoflush=False,
+                autocommit=False,
+                expire_on_commit=False,
+            )
+            for replica_engine in self.replica_engines
+        ]
+        self._replica_cycle = itertools.cycle(self.replica_session_factories)
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self._last_write: float = -math.inf
+
+    @staticmethod
+    def _create_engine(
+        url: str,
+        echo: bool,
+        echo_pool: bool,
+        pool_size: int,
+        max_overflow: int,
+        pool_timeout: float,
+        pgbouncer: bool,
+    ) -> AsyncEngine:
+        connect_args = {}
+        if pgbouncer:
+            # PgBouncer в режиме transaction pooling отдает каждую транзакцию
+            # произвольному серверному соединению, поэтому prepared statements
+            # не кешируются, а их имена делаются уникальными
+            url = make_url(url).update_query_dict(
+                {"prepared_statement_cache_size": "0"}
+            )
+            connect_args = {
+                "statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            }
+
+        return create_async_engine(
+            url=url,
+            echo=echo,
+            echo_pool=echo_pool,
+            poolclass=TimedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            connect_args=connect_args,
         )
 
+    def _write_tracking_session_class(self) -> type[Session]:
+        """Создает класс сессии основной базы, запоминающий время последней
+        зафиксированной транзакции с изменениями (для read-your-writes)"""
+        session_class = type("PrimarySession", (Session,), {})
+
+        @event.listens_for(session_class, "after_flush")
+        def mark_writes(session: Session, flush_context) -> None:
+            session.info["has_writes"] = True
+
+        @event.listens_for(session_class, "do_orm_execute")
+        def mark_statement_writes(orm_execute_state: ORMExecuteState) -> None:
+            if (
+                orm_execute_state.is_insert
+                or orm_execute_state.is_update
+                or orm_execute_state.is_delete
+            ):
+                orm_execute_state.session.info["has_writes"] = True
+
+        @event.listens_for(session_class, "after_commit")
+        def remember_write(session: Session) -> None:
+            if session.info.pop("has_writes", False):
+                self._last_write = time.monotonic()
+                session.info["committed_writes"] = True
+
+        @event.listens_for(session_class, "after_rollback")
+        def forget_writes(session: Session) -> None:
+            session.info.pop("has_writes", None)
+
+        return session_class
+
+    def _write_publishing_session_class(self) -> type[AsyncSession]:
+        """Создает класс асинхронной сессии основной базы, сразу после
+        коммита с изменениями сообщающий о них остальным воркерам.
+        Окно read-your-writes открывается до того, как вызывающий код
+        сбросит кеш ответов, и для любой сессии из session_factory:
+        зависимости session_getter, обработчика загрузок, команд."""
+        helper = self
+
+        class PrimaryAsyncSession(AsyncSession):
+            async def commit(self) -> None:
+                await super().commit()
+                if self.info.pop("committed_writes", False) and helper.replica_engines:
+                    await helper._publish_write()
+
+        return PrimaryAsyncSession
+
     async def dispose(self):
         await self.engine.dispose()
+        for replica_engine in self.replica_engines:
+            await replica_engine.dispose()
 
     async def session_getter(self) -> AsyncGenerator[AsyncSession, None]:
         async with self.session_factory() as session:
             yield session
 
+    async def read_session_getter(self) -> AsyncGenerator[AsyncSession, None]:
+        """Сессия для публичных запросов на чтение. Если настроены реплики,
+        запрос уходит на очередную реплику, кроме окна read_your_writes_seconds
+        после изменения данных: в это время чтение идет из основной базы,
+        чтобы не получить (и не закешировать) данные, еще не дошедшие до реплик"""
+        if not self.replica_session_factories or await self._recent_write():
+            session_factory = self.session_factory
+        else:
+            session_factory = next(self._replica_cycle)
+        async with session_factory() as session:
+            yield session
+
+    def _write_key(self) -> str:
+        return f"{settings.redis.prefix}:db:last-write"
+
+    async def _publish_write(self) -> None:
+        """Сообщает остальным воркерам об изменении данных через Redis"""
+        try:
+            await redis_helper.client.set(
+                self._write_key(), 1, px=int(self.read_your_writes_seconds * 1000)
+            )
+        except Exception:
+            logger.warning("Не удалось записать время изменения в Redis", exc_info=True)
+
+    async def _recent_write(self) -> bool:
+        if time.monotonic() - self._last_write < self.read_your_writes_seconds:
+            return True
+        try:
+            return bool(await redis_helper.client.exists(self._write_key()))
+        except Exception:
+            logger.warning(
+                "Не удалось прочитать время изменения из Redis", exc_info=True
+            )
+            return False
+
+    def pool_stats(self) -> dict[str, int | float]:
+        """Текущее состояние пула соединений текущего воркера"""
+        pool: TimedQueuePool = self.engine.pool
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(0, pool.overflow()),
+            "wait_count": pool.wait_stats.count,
+            "wait_seconds_total": pool.wait_stats.seconds_total,
+            "wait_seconds_max": pool.wait_stats.seconds_max,
+        }
+
+
+_pool_size, _max_overflow = pool_limits(
+    settings.db.connection_budget,
+    settings.run.workers,
+)
 
 db_helper = DatabaseHelper(
     url=str(settings.db.url),
     echo=settings.db.echo,
     echo_pool=settings.db.echo_pool,
-    pool_size=settings.db.pool_size,
-    max_overflow=settings.db.max_overflow,
+    pool_size=settings.db.pool_size or _pool_size,
+    max_overflow=(
+        settings.db.max_overflow
+        if settings.db.max_overflow is not None
+        else _max_overflow
+    ),
+    pool_timeout=settings.db.pool_timeout,
+    pgbouncer=settings.db.pgbouncer,
+    replica_urls=[str(replica_url) for replica_url in settings.db.replica_urls],
+    read_your_writes_seconds=settings.db.read_your_writes_seconds,
 )
@@ -1,7 +1,7 @@
 from typing import TYPE_CHECKING
 from datetime import datetime
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import ForeignKey, func, DateTime
+from sqlalchemy import ForeignKey, func, DateTime, SmallInteger
 from .base import Base
 from utils.general import now_utc
 
@@ -22,5 +22,13 @@ class Picture(Base):
         server_default=func.timezone("UTC", func.now()),
     )
     event_id: Mapped[int] = mapped_column(ForeignKey("event.id", ondelete="CASCADE"))
+    # размеры при показе (с учетом поворота по EXIF), ориентация EXIF (1-8)
+    # и время съемки из DateTimeOriginal; заполняются при создании превью
+    width: Mapped[int | None]
+    height: Mapped[int | None]
+    orientation: Mapped[int | None] = mapped_column(SmallInteger)
+    taken_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=False))
+    # заглушка LQIP: data URI с WebP шириной 16 пикселей
+    placeholder: Mapped[str | None]
 
     event: Mapped["Event"] = relationship("Event", back_populates="pictures")
@@ -0,0 +1,29 @@
+from redis import asyncio as aioredis
+
+from core.config import settings
+
+
+class RedisHelper:
+    """Общий для процесса клиент Redis. Клиент создается при первом
+    обращении, соединения открываются пулом redis-py по мере надобности."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self._client: aioredis.Redis | None = None
+
+    @property
+    def client(self) -> aioredis.Redis:
+        if self._client is None:
+            self._client = aioredis.from_url(
+                self.url,
+                encoding="utf-8",
+            )
+        return self._client
+
+    async def dispose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+redis_helper = RedisHelper(url=settings.redis.url)
@@ -1,7 +1,20 @@
+from datetime import date as dt_date
 from pydantic import BaseModel
 
 class BaseCategory(BaseModel):
     name: str
 
 class CategoryEventRead(BaseCategory):
-    ...
\ No newline at end of file
+    ...
+
+class CategoryStatsRead(BaseCategory):
+    """
+    Схема для сводки по категории: количество съемок и фотографий,
+    дата и обложка последней созданной активной съемки
+    """
+
+    event_count: int
+    active_count: int
+    picture_count: int
+    latest_event_date: dt_date | None
+    latest_cover: str | None
@@ -1,5 +1,5 @@
 from datetime import datetime, date as dt_date
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, RootModel, field_validator
 from core.schemas.picture import PictureRead
 from core.schemas.category import CategoryEventRead
 
@@ -44,7 +44,44 @@ class EventRead(BaseEvent):
     id: int
     pictures: list[PictureRead]
 
+class EventReadCompact(BaseEvent):
+    """
+    Компактная схема съемки для галереи: общий префикс пути
+    передается один раз, фотографии - плоским списком имен файлов.
+    Полный путь фотографии - path_prefix + имя файла.
+    """
+
+    id: int
+    path_prefix: str
+    pictures: list[str]
+
+class EventReadPartial(BaseModel, DescriptionValidatorMixin):
+    """
+    Схема для разреженных ответов (параметр запроса fields).
+    Все поля необязательны, в ответ попадают только запрошенные.
+    """
+
+    id: int | None = None
+    category_id: int | None = None
+    date: dt_date | None = None
+    cover: str | None = None
+    description: str | None = None
+    created: datetime | None = None
+    active: bool | None = None
+    path_prefix: str | None = None
+    pictures: list[PictureRead] | list[str] | None = None
+
 class EventList(BaseModel):
     total_count: int
     events: list[EventReadNoPictures]
 
+class EventListPartial(BaseModel):
+    total_count: int
+    events: list[EventReadPartial]
+
+class EventListsByCategory(RootModel[dict[str, EventList | EventListPartial]]):
+    """
+    Схема для первых страниц съемок нескольких категорий,
+    ключ - имя категории
+    """
+
@@ -1,5 +1,6 @@
 from datetime import datetime
-from pydantic import BaseModel, ConfigDict
+from typing import Literal
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class BasePicture(BaseModel):
@@ -16,7 +17,41 @@ class PictureRead(BasePicture):
     uploaded: datetime
     event_id: int
     path: str
+    width: int | None = None
+    height: int | None = None
+    orientation: int | None = None
+    taken_at: datetime | None = None
+    placeholder: str | None = None
 
     model_config = ConfigDict(
         from_attributes=True,
     )
+
+
+class UploadJobRead(BaseModel):
+    job_id: str
+    status: Literal["queued", "processing", "done", "failed"]
+    detail: str | None = None
+    result: list[str] | None = None
+
+
+class ResumableFile(BaseModel):
+    name: str
+    size: int = Field(gt=0)
+
+
+class ResumableUploadCreate(BaseModel):
+    """Описание файлов возобновляемой загрузки. Если event_cover
+    не передан, файлы добавляются к существующей съемке category/date"""
+
+    category: str
+    date: str
+    files: list[ResumableFile] = Field(min_length=1)
+    event_cover: ResumableFile | None = None
+    event_description: str | None = None
+
+
+class ResumableUploadRead(BaseModel):
+    upload_id: str
+    chunk_size: int
+    offsets: dict[str, int]
@@ -0,0 +1,48 @@
+from collections.abc import Sequence
+from sqlalchemy import RowMapping, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.models.category import Category
+from core.models.category_stats import CategoryStats
+from utils.category_stats import refresh_category_stats
+
+
+async def rebuild_all_category_stats(db: AsyncSession) -> None:
+    """Пересчитывает сводку для всех категорий и фиксирует транзакцию.
+    Используется командой commands.rebuild_category_stats, которая после
+    этого сбрасывает кеш ответов."""
+    category_ids = await db.scalars(select(Category.id))
+    await refresh_category_stats(db, category_ids.all())
+    await db.commit()
+
+
+async def get_categories_stats(db: AsyncSession) -> Sequence[RowMapping]:
+    """Возвращает сводку по всем категориям, по одной строке на категорию.
+    Для категорий без строки в category_stats счетчики равны нулю."""
+    result = await db.execute(
+        select(
+            Category.name,
+            func.coalesce(CategoryStats.event_count, 0).label("event_count"),
+            func.coalesce(CategoryStats.active_count, 0).label("active_count"),
+            func.coalesce(CategoryStats.picture_count, 0).label("picture_count"),
+            CategoryStats.latest_event_date,
+            CategoryStats.latest_cover,
+        )
+        .outerjoin(CategoryStats, CategoryStats.category_id == Category.id)
+        .order_by(Category.id)
+    )
+    return result.mappings().all()
+
+
+async def get_category_event_count(
+    db: AsyncSession,
+    category: str,
+    is_active: bool = True,
+) -> int:
+    """Возвращает количество съемок (по умолчанию - только активных)
+    в категории из сводной таблицы вместо COUNT(*) по таблице event."""
+    column = CategoryStats.active_count if is_active else CategoryStats.event_count
+    count = await db.scalar(
+        select(column).join(Category).filter(Category.name == category)
+    )
+    return count or 0
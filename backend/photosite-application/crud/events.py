@@ -1,7 +1,7 @@
 from typing import Annotated
 from collections.abc import Sequence
 import shutil
-from sqlalchemy import select, func
+from sqlalchemy import RowMapping, exists, select, func
 from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Form, HTTPException, status, Path, File, UploadFile
@@ -11,8 +11,13 @@ from core.models.event import Event
 from core.models.category import Category
 from core.models.picture import Picture
 from utils.general import check_date, move_files
+from utils.upload_progress import UploadProgress
+from utils.serialization import EVENT_COLUMNS
+from crud.categories import get_category_event_count
+from utils.category_stats import refresh_category_stats
 from utils.pictures import (
     check_file_names,
+    check_jpeg_files,
     write_one_file_on_disc,
     save_multiple_files_to_event,
     check_file_name,
@@ -78,6 +83,70 @@ async def get_event_with_pictures(
     return await check_event_exists(db, category, date, with_pictures=True)
 
 
+async def get_event_row(
+    db: AsyncSession,
+    category: str,
+    date: str,
+    columns: Sequence[str],
+) -> RowMapping:
+    """Возвращает строку таблицы event с колонками columns для съемки
+    с данной категорией и датой, без создания экземпляра ORM-модели.
+    Колонки id и active выбираются всегда: они нужны для проверки
+    активности и выборки фотографий."""
+    date_obj = check_date(date)
+
+    result = await db.execute(
+        select(
+            *(
+                getattr(Event, column)
+                for column in dict.fromkeys((*columns, "id", "active"))
+            )
+        )
+        .join(Category)
+        .filter(
+            Category.name == category,
+            Event.date == date_obj,
+        )
+    )
+    event = result.mappings().one_or_none()
+
+    if event is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Такой съемки не существует",
+        )
+
+    if event["active"] is False:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Съемка была удалена",
+        )
+
+    return event
+
+
+async def get_event_picture_rows(
+    db: AsyncSession,
+    event_id: int,
+    columns: Sequence[str],
+) -> Sequence[RowMapping]:
+    """Возвращает строки таблицы picture с колонками columns для съемки,
+    отсортированные по имени файла, как и отношение Event.pictures."""
+    result = await db.execute(
+        select(*(getattr(Picture, column) for column in columns))
+        .filter(Picture.event_id == event_id)
+        .order_by(Picture.name)
+    )
+    return result.mappings().all()
+
+
+async def event_has_pictures(db: AsyncSession, event_id: int) -> bool:
+    """Проверяет, есть ли у съемки фотографии, не выбирая их строк"""
+    return bool(
+        await db.scalar(select(exists().where(Picture.event_id == event_id)))
+    )
+
+
 async def delete_event(
     db: AsyncSession,
     category: Annotated[str, Form()],
@@ -104,6 +173,7 @@ async def delete_event(
         await db.delete(picture)
 
     await db.delete(event_to_delete)
+    await refresh_category_stats(db, [event_to_delete.category_id])
     await db.commit()
 
     dir_to_remove = settings.static.image_dir / category / date
@@ -126,21 +196,15 @@ async def get_events_by_category(
     limit: int = settings.querysettings.limit,
     page: int = 1,
     is_active: bool = True,
-) -> tuple[int, Sequence[Event]]:
-    """Возвращает последовательность съемок,
-    относящихся к данной категории
+    columns: Sequence[str] = EVENT_COLUMNS,
+) -> tuple[int, Sequence[RowMapping]]:
+    """Возвращает последовательность строк таблицы event с колонками
+    columns для съемок, относящихся к данной категории,
     от наиболее новых к самым старым."""
-    event_count_stmt = (
-        select(func.count(Event.id)).join(Category).filter(Category.name == category)
-    )
-
-    if is_active:
-        event_count_stmt.filter(Event.active.is_(True))
-
-    total_events: int = await db.scalar(event_count_stmt) or 0
+    total_events = await get_category_event_count(db, category, is_active)
 
     stmt = (
-        select(Event)
+        select(*(getattr(Event, column) for column in columns))
         .join(Category)
         .filter(Category.name == category)
         .limit(limit)
@@ -151,8 +215,52 @@ async def get_events_by_category(
     if is_active:
         stmt = stmt.filter(Event.active.is_(True))
 
-    result = await db.scalars(stmt)
-    return total_events, result.all()
+    result = await db.execute(stmt)
+    return total_events, result.mappings().all()
+
+
+async def get_latest_events_by_categories(
+    db: AsyncSession,
+    categories: Sequence[str],
+    limit: int = settings.querysettings.limit,
+    columns: Sequence[str] = EVENT_COLUMNS,
+) -> dict[str, tuple[int, list[RowMapping]]]:
+    """Возвращает для каждой категории из categories общее количество
+    активных съемок и limit последних из них (как первая страница
+    get_events_by_category). Все категории выбираются одним запросом
+    с оконными функциями ROW_NUMBER() и COUNT() по category_id."""
+    ranked = (
+        select(
+            *(getattr(Event, column) for column in columns),
+            Category.name.label("category_name"),
+            func.row_number()
+            .over(partition_by=Event.category_id, order_by=Event.created.desc())
+            .label("row_number"),
+            func.count().over(partition_by=Event.category_id).label("total_count"),
+        )
+        .join(Category)
+        .filter(
+            Category.name.in_(categories),
+            Event.active.is_(True),
+        )
+        .subquery()
+    )
+
+    result = await db.execute(
+        select(ranked)
+        .filter(ranked.c.row_number <= limit)
+        .order_by(ranked.c.category_name, ranked.c.row_number)
+    )
+
+    events_by_category: dict[str, tuple[int, list[RowMapping]]] = {
+        category: (0, []) for category in categories
+    }
+    for row in result.mappings():
+        total_count, events = events_by_category[row["category_name"]]
+        events.append(row)
+        events_by_category[row["category_name"]] = (row["total_count"], events)
+
+    return events_by_category
 
 
 async def get_events_by_date_created(
@@ -180,9 +288,11 @@ async def add_pictures_to_existing_event(
     category: str,
     date: str,
     files: Annotated[list[UploadFile], File()],
+    progress: UploadProgress | None = None,
 ) -> list[str]:
     """Добавляет файлы к существующей съемке. При совпадении
-    имен файлов сохраняются старые файлы."""
+    имен файлов сохраняются старые файлы. В progress публикуется
+    прогресс по файлам."""
 
     event: Event = await check_event_exists(db, category, date, with_pictures=True)
 
@@ -198,6 +308,7 @@ async def add_pictures_to_existing_event(
             status_code=status.HTTP_409_CONFLICT,
             detail="Необходимо добавлять файлы с уникальными именами",
         )
+    await check_jpeg_files(files)
 
     existing_files = await db.scalars(select(Picture).filter(Picture.event == event))
     existing_file_names: list[str] = [file.name for file in existing_files.all()]
@@ -217,6 +328,7 @@ async def add_pictures_to_existing_event(
         files_to_add=files_to_add,
         dir_for_upload=dir_for_upload,
         dir_for_thumbnails=dir_for_thumbnails,
+        progress=progress,
     )
 
 
@@ -240,6 +352,9 @@ async def edit_event_base_data(
     cat_to_db: str = new_category or category
     date_to_db: str = new_date or date
 
+    # сводка пересчитывается для старой и, при замене, новой категории
+    category_ids: list[int] = [event.category_id]
+
     if cat_to_db != category:
         category_exists = await db.scalar(
             select(Category).filter(Category.name == cat_to_db)
@@ -251,6 +366,7 @@ async def edit_event_base_data(
             )
         # замена категории
         event.category = category_exists
+        category_ids.append(category_exists.id)
 
     for picture in event.pictures:
         picture.path = f"{cat_to_db}/{date_to_db}/{picture.name}"
@@ -276,6 +392,7 @@ async def edit_event_base_data(
     event_cover_file_name = event.cover.split("/")[-1]
     event.cover = f"{settings.static.covers_dir.name}/{cat_to_db}/{date_to_db}/{event_cover_file_name}"
 
+    await refresh_category_stats(db, category_ids)
     await db.commit()
     await db.refresh(event)
 
@@ -344,6 +461,7 @@ async def edit_event_cover(
     )
     event.cover = str(new_cover_path.relative_to(settings.static.base_image_dir))
 
+    await refresh_category_stats(db, [event.category_id])
     await db.commit()
     await db.refresh(event)
 
@@ -362,6 +480,7 @@ async def toggle_event_active_status(
     event = await check_event_exists(db, category, date, is_active=False)
     event.active = not event.active
 
+    await refresh_category_stats(db, [event.category_id])
     await db.commit()
     await db.refresh(event)
 
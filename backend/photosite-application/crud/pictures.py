@@ -4,16 +4,20 @@ from datetime import date as dt_date
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.models.picture import Picture
+from core.models.event import Event
 from fastapi import File, Form, UploadFile, HTTPException, status
 
 from core.config import settings
 from utils.pictures import (
     check_file_names,
+    check_jpeg_files,
     create_event,
     write_one_file_on_disc,
     save_multiple_files_to_event,
 )
 from utils.general import check_date
+from utils.upload_progress import UploadProgress
+from utils.category_stats import refresh_category_stats
 
 
 async def get_all_pictures(session: AsyncSession) -> Sequence[Picture]:
@@ -28,11 +32,12 @@ async def upload_pictures(
     date: Annotated[str, Form()],
     event_cover: Annotated[UploadFile, Form()],
     event_description: Annotated[str | None, Form()] = None,
+    progress: UploadProgress | None = None,
 ) -> list[str]:
     """Функция для загрузки нескольких изображений. Создает также объект
     Event, к которому относятся изображения. Должна оставаться единственным
     способом создать объект Event, чтобы не допустить создание объекта Event
-    изначально без изображений"""
+    изначально без изображений. В progress публикуется прогресс по файлам."""
 
     files = list(set(files))
 
@@ -43,6 +48,7 @@ async def upload_pictures(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Неверные имена или расширения файлов",
         )
+    await check_jpeg_files(files + [event_cover])
 
     category_dir = settings.static.image_dir / category
     thumbnails_category_dir = settings.static.thumbnails_dir / category
@@ -71,9 +77,11 @@ async def upload_pictures(
             files_to_add=files,
             dir_for_upload=date_dir,
             dir_for_thumbnails=thumbnails_date_dir,
+            progress=progress,
         )
     except Exception:
         await db.delete(new_event)
+        await refresh_category_stats(db, [new_event.category_id])
         await db.commit()
         raise
 
@@ -100,6 +108,14 @@ async def delete_pictures(
             detail="Нужно выбрать хотя бы один файл для удаления",
         )
     
+    # категории, сводку по которым нужно пересчитать после удаления
+    category_ids = await db.scalars(
+        select(Event.category_id)
+        .join(Picture)
+        .filter(Picture.path.in_(set(picture_paths)))
+    )
+    affected_category_ids = category_ids.all()
+
     for picture_path in set(
         picture_paths
     ):  # удаление дубликатов, должно сработать одно удаление без вызова исключения
@@ -109,6 +125,7 @@ async def delete_pictures(
         if picture is None:
             raise ValueError(f"Такого изображения не существует: {picture_path}")
         await db.delete(picture)
+    await refresh_category_stats(db, affected_category_ids)
     await db.commit()
     for picture_path in picture_paths:
         file_path = settings.static.image_dir / picture_path
@@ -21,4 +21,9 @@ incorrect_username_or_password = HTTPException(
 username_already_exists = HTTPException(
     status_code=status.HTTP_409_CONFLICT,
     detail="Пользователь с таким именем уже зарегистрирован",
-)
\ No newline at end of file
+)
+password_hashing_busy_exception = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Сервер занят проверкой паролей, повторите позже",
+    headers={"Retry-After": "1"},
+)
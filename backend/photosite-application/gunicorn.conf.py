@@ -1,6 +1,13 @@
+import os
+from pathlib import Path
+
 from core.config import settings
 
-workers = 4
+# метрики prometheus_client воркеров пишутся в общий каталог;
+# переменная должна быть задана до импорта приложения воркерами
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", str(settings.metrics.multiproc_dir))
+
+workers = settings.run.workers
 
 worker_class = "uvicorn.workers.UvicornWorker"
 
@@ -15,3 +22,33 @@ max_requests_jitter = 100
 daemon = False
 
 proc_name = "fastapi-gunicorn"
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def on_starting(server):
+    """Очищает метрики завершившихся процессов предыдущего запуска.
+    Файлы живых процессов сохраняются: в тот же каталог пишет метрики
+    обработчик загрузок (commands.upload_worker), работающий независимо
+    от gunicorn. Имя файла метрик заканчивается на _<pid>.db."""
+    multiproc_dir = Path(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+    multiproc_dir.mkdir(parents=True, exist_ok=True)
+    for path in multiproc_dir.glob("*.db"):
+        pid = path.stem.rsplit("_", 1)[-1]
+        if not pid.isdigit() or not process_alive(int(pid)):
+            path.unlink(missing_ok=True)
+
+
+def child_exit(server, worker):
+    """Убирает gauge-метрики завершившегося воркера"""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,10 +1,141 @@
+import atexit
+import copy
+import logging
 import logging.config
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+
+import orjson
 
 from core.config import settings
 
+# стандартные атрибуты LogRecord; все остальные пришли из extra
+LOG_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {
+    "message",
+    "asctime",
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись как одну строку JSON: время, уровень, логгер,
+    сообщение, поля из extra и, если есть, трассировку исключения"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "timestamp": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in LOG_RECORD_ATTRIBUTES and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc_info"] = record.exc_text
+        return orjson.dumps(data, default=str).decode()
+
+
+class SuccessSampleFilter(logging.Filter):
+    """Пропускает только долю записей об успешно обработанных запросах
+    (с полем status_code меньше 400). Доля задается для шаблона маршрута
+    (поле route) в route_rates или общая - default_rate. Ошибки и записи
+    без status_code пропускаются всегда."""
+
+    def __init__(self, default_rate: float, route_rates: dict[str, float]):
+        super().__init__()
+        self.default_rate = default_rate
+        self.route_rates = route_rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        status_code = getattr(record, "status_code", None)
+        if status_code is None or status_code >= 400:
+            return True
+        rate = self.route_rates.get(getattr(record, "route", ""), self.default_rate)
+        if rate >= 1:
+            return True
+        record.sample_rate = rate
+        return random.random() < rate
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler с ограниченной очередью: если очередь заполнена,
+    запись отбрасывается, а не блокирует поток (и цикл событий).
+    Количество отброшенных записей хранится в dropped, о пропуске
+    сообщается отдельной записью, как только в очереди появляется место."""
+
+    def __init__(self, log_queue: queue.Queue, route: str = ""):
+        super().__init__(log_queue)
+        # имя логгера, обработчикам которого RoutingQueueListener передаст запись
+        self.route = route
+        self.dropped: int = 0
+        self._reported: int = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # в отличие от QueueHandler.prepare, трассировка исключения
+        # не вклеивается в текст сообщения, а остается в exc_text
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record._route = self.route
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self.dropped > self._reported:
+                self.queue.put_nowait(
+                    self._dropped_record(self.dropped - self._reported)
+                )
+                self._reported = self.dropped
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _dropped_record(self, dropped: int) -> logging.LogRecord:
+        return logging.makeLogRecord(
+            {
+                "name": __name__,
+                "levelno": logging.WARNING,
+                "levelname": "WARNING",
+                "msg": f"Очередь логов переполнена, отброшено записей: {dropped}",
+                "dropped": dropped,
+                "_route": self.route,
+            }
+        )
+
+
+class RoutingQueueListener(QueueListener):
+    """QueueListener для нескольких логгеров с общей очередью: запись
+    передается обработчикам того логгера, из которого она пришла"""
+
+    def __init__(
+        self, log_queue: queue.Queue, routes: dict[str, list[logging.Handler]]
+    ):
+        super().__init__(log_queue, respect_handler_level=True)
+        self.routes = routes
+
+    def handle(self, record: logging.LogRecord) -> None:
+        record = self.prepare(record)
+        for handler in self.routes.get(record._route, ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+queue_handler: DroppingQueueHandler | None = None
+queue_listener: RoutingQueueListener | None = None
+
 
 def setup_logging(env="development"):
-    """Конфигурация логирования в зависимости от окружения."""
+    """Конфигурация логирования в зависимости от окружения.
+    Обработчики консоли и файлов работают в отдельном потоке
+    RoutingQueueListener, логгеры только кладут записи в общую очередь."""
+    global queue_handler, queue_listener
+
     log_config = {
         "version": 1,
         "disable_existing_loggers": False,
@@ -14,7 +145,7 @@ def setup_logging(env="development"):
                 "datefmt": "%Y-%m-%d %H:%M:%S",
             },
             "json": {
-                "format": '{"timestamp": "%(asctime)s", "level": "%(levelname)s", "logger": "%(name)s", "message": "%(message)s"}',
+                "()": JsonFormatter,
                 "datefmt": "%Y-%m-%dT%H:%M:%S%z",
             },
         },
@@ -34,6 +165,15 @@ def setup_logging(env="development"):
                 "backupCount": 14,
                 "encoding": "utf-8",
             },
+            "slow_queries": {
+                "class": "logging.handlers.RotatingFileHandler",
+                "formatter": "json",
+                "level": "INFO",
+                "filename": "logs/slow_queries.log",
+                "maxBytes": 10 * 1024 * 1024,
+                "backupCount": 5,
+                "encoding": "utf-8",
+            },
         },
         "loggers": {
             "": {  # root logger
@@ -51,6 +191,12 @@ def setup_logging(env="development"):
                 "level": "ERROR",
                 "propagate": False,
             },
+            # медленные запросы к базе с планами EXPLAIN (utils.slow_queries)
+            "sql.slow": {
+                "handlers": ["slow_queries"],
+                "level": "INFO",
+                "propagate": False,
+            },
         },
     }
 
@@ -60,6 +206,32 @@ def setup_logging(env="development"):
     else:
         log_config["handlers"]["console"]["level"] = "DEBUG"
 
+    if queue_listener is not None:
+        queue_listener.stop()
+
     logging.config.dictConfig(log_config)
 
+    log_queue: queue.Queue = queue.Queue(settings.logging.queue_size)
+    sample_filter = SuccessSampleFilter(
+        settings.logging.success_sample_rate,
+        settings.logging.route_sample_rates,
+    )
+    routes: dict[str, list[logging.Handler]] = {}
+    for name in log_config["loggers"]:
+        configured_logger = logging.getLogger(name)
+        routes[name] = configured_logger.handlers[:]
+
+        handler = DroppingQueueHandler(log_queue, route=name)
+        # записи, которые не пройдут ни один обработчик, не попадают в очередь
+        handler.setLevel(min(routed.level for routed in routes[name]))
+        handler.addFilter(sample_filter)
+        configured_logger.handlers = [handler]
+        if name == "":
+            queue_handler = handler
+
+    queue_listener = RoutingQueueListener(log_queue, routes)
+    queue_listener.start()
+    atexit.register(queue_listener.stop)
+
+
 logger = logging.getLogger("app")
@@ -1,9 +1,8 @@
-import time
+import asyncio
 import logging
 from contextlib import asynccontextmanager
-from collections.abc import Callable
 import uvicorn
-from fastapi import FastAPI, Request, Response
+from fastapi import FastAPI, Response
 from fastapi.responses import ORJSONResponse
 from core.config import settings
 from core.models import db_helper
@@ -12,10 +11,14 @@ from fastapi.staticfiles import StaticFiles
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
 
-from redis import asyncio as aioredis
-
+from core.redis_helper import redis_helper
 from api import router as api_router
 from logging_config import setup_logging
+from utils.metrics import instrument_engine, render_metrics
+from utils.middleware import RequestMiddleware
+from utils.profiling import ProfilingMiddleware
+from utils.slow_queries import install_slow_query_log
+from utils.warmup import warm_up
 
 setup_logging()
 
@@ -24,16 +27,17 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    redis = aioredis.from_url(
-        settings.redis.url,
-        encoding="utf-8",
-    )
     FastAPICache.init(
-        RedisBackend(redis),
+        RedisBackend(redis_helper.client),
         prefix=settings.redis.prefix,
     )
+    if settings.warmup.enabled:
+        try:
+            await asyncio.wait_for(warm_up(), timeout=settings.warmup.timeout)
+        except TimeoutError:
+            logger.warning("Прогрев воркера прерван по таймауту")
     yield
-    await redis.close()
+    await redis_helper.dispose()
     await db_helper.dispose()
 
 
@@ -67,50 +71,22 @@ main_app.add_middleware(
 )
 
 
-@main_app.middleware("http")
-async def log_requests(request: Request, call_next: Callable) -> Response:
-    start_time = time.time()
-
-    logger.info(
-        f"Request: {request.method} {request.url.path}",
-        extra={
-            "method": request.method,
-            "path": request.url.path,
-            "client_ip": request.client.host if request.client else "unknown",
-            "user_agent": request.headers.get("user-agent", "unknown"),
-        },
+if settings.profiling.enabled:
+    main_app.add_middleware(
+        ProfilingMiddleware,
+        sample_rate=settings.profiling.sample_rate,
+        reports_dir=settings.profiling.reports_dir,
     )
 
-    try:
-        response: Response = await call_next(request)
-        process_time = time.time() - start_time
-        logger.info(
-            f"Request completed in {process_time:.4f} seconds with status code {response.status_code}",
-            extra={
-                "status_code": response.status_code,
-                "processing_time": f"{process_time:.4f}",
-            },
-        )
-        return response
-    except Exception as e:
-        logger.exception(f"Error processing request: {str(e)}")
-        raise
-
-
-@main_app.middleware("http")
-async def headers_control(request: Request, call_next: Callable) -> Response:
-    """Ограничивает max_age в cache_control значением max_age_maximum, если это значение больше"""
-
-    response: Response = await call_next(request)
-    if "max-age" in (
-        cache_control_header := response.headers.get("Cache-Control", "Empty")
-    ):
-        if int(cache_control_header.split("=")[-1]) > settings.cache.max_age_maximum:
-            response.headers["Cache-Control"] = (
-                f"max-age={settings.cache.max_age_maximum}"
-            )
-
-    return response
+main_app.add_middleware(RequestMiddleware)
+
+instrument_engine(db_helper.engine, "primary")
+for number, replica_engine in enumerate(db_helper.replica_engines, start=1):
+    instrument_engine(replica_engine, f"replica-{number}")
+
+if settings.slow_queries.enabled:
+    for engine in (db_helper.engine, *db_helper.replica_engines):
+        install_slow_query_log(engine)
 
 
 main_app.include_router(
@@ -119,6 +95,14 @@ main_app.include_router(
 )
 
 
+@main_app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики в формате Prometheus. nginx проксирует только /api/,
+    поэтому точка доступна лишь из внутренней сети"""
+    content, media_type = render_metrics()
+    return Response(content=content, media_type=media_type)
+
+
 @main_app.get("/")
 async def work_check():
 
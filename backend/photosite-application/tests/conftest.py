@@ -23,6 +23,8 @@ from core.config import settings
 from core.models import db_helper
 from utils.authorization import get_current_user
 from main import main_app
+from PIL import Image
+from utils.pictures import make_placeholder, read_picture_metadata
 
 # Временная папка для картинок
 TEST_IMAGE_DIR = Path(__file__).parent.parent.resolve() / "test_static" / "images" / "fullsize"
@@ -80,6 +82,7 @@ async def client(db: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
         return db
 
     main_app.dependency_overrides[db_helper.session_getter] = override_get_db
+    main_app.dependency_overrides[db_helper.read_session_getter] = override_get_db
 
     transport = ASGITransport(app=main_app)
 
@@ -172,6 +175,9 @@ def mock_settings():
 async def init_test_cache():
     FastAPICache.init(InMemoryBackend(), prefix="test-")
     yield
+    # хранилище InMemoryBackend общее для всех экземпляров, поэтому
+    # записи нужно удалить явно до сброса
+    await FastAPICache.clear()
     FastAPICache.reset()  # очищает кеш после теста
 
 @pytest.fixture(autouse=True)
@@ -181,4 +187,7 @@ def mock_save_thumbnails(monkeypatch):
         data = input_path.read_bytes()
         output_path.parent.mkdir(exist_ok=True, parents=True)
         output_path.write_bytes(data)
+        with Image.open(input_path) as img:
+            metadata = read_picture_metadata(img)
+            return metadata._replace(placeholder=make_placeholder(img))
     monkeypatch.setattr("utils.pictures.resize_and_crop_image", test_resize_and_save_image)
\ No newline at end of file
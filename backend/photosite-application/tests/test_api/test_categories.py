@@ -0,0 +1,114 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.models.category_stats import CategoryStats
+from crud.categories import rebuild_all_category_stats
+from utils.category_stats import lock_category_stats
+from .utils import create_test_category, create_test_event
+
+
+class TestGetCategoriesSummary:
+    """Тестирование сводки по категориям. Доступно без авторизации."""
+
+    @pytest.mark.asyncio
+    async def test_get_categories_summary_success(
+        self,
+        client: AsyncClient,
+        db: AsyncSession,
+    ):
+        """Тестирование получения сводки по категориям"""
+        await create_test_event(db, "wedding", "2024-05-25")
+        await create_test_event(db, "wedding", "2024-06-25", pics=["111.jpg"])
+        await create_test_event(db, "wedding", "2024-07-25", active=False)
+        await create_test_category(db, "family")
+
+        response = await client.get("/api/v1/categories")
+
+        assert response.status_code == 200
+        data = {item["name"]: item for item in response.json()}
+        assert data["wedding"] == {
+            "name": "wedding",
+            "event_count": 3,
+            "active_count": 2,
+            "picture_count": 7,
+            "latest_event_date": "2024-06-25",
+            "latest_cover": "event_covers/wedding/2024-06-25/111.jpg",
+        }
+        assert data["family"]["event_count"] == 0
+        assert data["family"]["latest_cover"] is None
+
+    @pytest.mark.asyncio
+    async def test_toggle_active_status_updates_summary(
+        self,
+        authenticated_client: AsyncClient,
+        db: AsyncSession,
+    ):
+        """Тестирование пересчета сводки при изменении активности съемки"""
+        await create_test_event(db, "portrait", "2024-05-25")
+
+        response = await authenticated_client.patch(
+            "/api/v1/events/portrait/2024-05-25/active"
+        )
+        assert response.status_code == 200
+
+        response = await authenticated_client.get("/api/v1/categories")
+
+        assert response.status_code == 200
+        summary = response.json()[0]
+        assert summary["event_count"] == 1
+        assert summary["active_count"] == 0
+        assert summary["latest_event_date"] is None
+
+        response = await authenticated_client.get("/api/v1/events/portrait")
+        assert response.json()["total_count"] == 0
+
+    @pytest.mark.asyncio
+    async def test_rebuild_all_category_stats(
+        self,
+        client: AsyncClient,
+        db: AsyncSession,
+    ):
+        """Полный пересчет восстанавливает удаленные и испорченные строки сводки"""
+        blog = await create_test_event(db, "blog", "2024-05-25")
+        await create_test_event(db, "blog", "2024-06-25", pics=["111.jpg"])
+        await create_test_event(db, "wedding", "2024-05-25", active=False)
+        await db.execute(
+            delete(CategoryStats).filter(CategoryStats.category_id == blog.category_id)
+        )
+        await db.execute(
+            update(CategoryStats).values(
+                event_count=100, active_count=100, picture_count=100
+            )
+        )
+        await db.commit()
+
+        await rebuild_all_category_stats(db)
+
+        response = await client.get("/api/v1/categories")
+
+        data = {item["name"]: item for item in response.json()}
+        assert data["blog"] == {
+            "name": "blog",
+            "event_count": 2,
+            "active_count": 2,
+            "picture_count": 4,
+            "latest_event_date": "2024-06-25",
+            "latest_cover": "event_covers/blog/2024-06-25/111.jpg",
+        }
+        assert data["wedding"]["event_count"] == 1
+        assert data["wedding"]["active_count"] == 0
+        assert data["wedding"]["picture_count"] == 3
+
+    @pytest.mark.asyncio
+    async def test_stats_row_is_created_once(self, db: AsyncSession):
+        """Строка сводки создается при первой блокировке и не дублируется"""
+        category = await create_test_category(db, "blog")
+
+        first = await lock_category_stats(db, category.id)
+        second = await lock_category_stats(db, category.id)
+        await db.commit()
+
+        assert first is second
+        assert await db.scalar(select(func.count(CategoryStats.id))) == 1
@@ -8,7 +8,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from httpx import AsyncClient
 
 from core.models import Category, Event, Picture
-from .utils import create_test_category, get_valid_upload_files, add_pictures_for_event
+from .utils import (
+    create_test_category,
+    create_test_event,
+    get_valid_upload_files,
+    add_pictures_for_event,
+)
 
 
 class TestGetOneEventPictures:
@@ -71,6 +76,99 @@ class TestGetOneEventPictures:
         print(data)
         assert data["detail"] == "Дата должна быть в формате YYYY-MM-DD"
 
+    @pytest.mark.asyncio
+    async def test_get_one_event_pictures_compact(
+        self,
+        client: AsyncClient,
+        db: AsyncSession,
+    ):
+        """Тестирование компактного формата ответа: общий префикс пути
+        и плоский список имен файлов"""
+        await create_test_event(db, "wedding", "2024-05-25")
+
+        response = await client.get(
+            "/api/v1/events/wedding/2024-05-25", params={"format": "compact"}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["path_prefix"] == "wedding/2024-05-25/"
+        assert data["pictures"] == ["123.jpg", "456.jpeg", "789.jpeg"]
+
+        # полный формат кешируется под отдельным ключом
+        response = await client.get("/api/v1/events/wedding/2024-05-25")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert "path_prefix" not in data
+        assert [pic["path"] for pic in data["pictures"]] == [
+            "wedding/2024-05-25/123.jpg",
+            "wedding/2024-05-25/456.jpeg",
+            "wedding/2024-05-25/789.jpeg",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_get_one_event_pictures_cached_body(
+        self,
+        client: AsyncClient,
+        db: AsyncSession,
+    ):
+        """Тестирование отдачи готового тела ответа из кеша"""
+        await create_test_event(db, "wedding", "2024-05-25")
+
+        first = await client.get("/api/v1/events/wedding/2024-05-25")
+        second = await client.get("/api/v1/events/wedding/2024-05-25")
+
+        assert first.status_code == second.status_code == 200
+        assert first.headers["x-fastapi-cache"] == "MISS"
+        assert second.headers["x-fastapi-cache"] == "HIT"
+        assert first.content == second.content
+        assert first.headers["etag"] == second.headers["etag"]
+
+    @pytest.mark.asyncio
+    async def test_get_one_event_pictures_sparse_fields(
+        self,
+        client: AsyncClient,
+        db: AsyncSession,
+    ):
+        """Тестирование разреженного набора полей для одной съемки"""
+        await create_test_event(db, "wedding", "2024-05-25")
+
+        response = await client.get(
+            "/api/v1/events/wedding/2024-05-25", params={"fields": "id,cover"}
+        )
+
+        assert response.status_code == 200
+        assert set(response.json()) == {"id", "cover"}
+
+        response = await client.get(
+            "/api/v1/events/wedding/2024-05-25",
+            params={"fields": "date,pictures", "format": "compact"},
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert set(data) == {"date", "path_prefix", "pictures"}
+        assert data["pictures"] == ["123.jpg", "456.jpeg", "789.jpeg"]
+
+    @pytest.mark.asyncio
+    async def test_event_without_pictures_is_not_found_for_any_fields(
+        self,
+        client: AsyncClient,
+        db: AsyncSession,
+    ):
+        """Съемка без фотографий не отдается и тогда, когда поле pictures
+        не запрошено"""
+        category = await create_test_category(db, "wedding")
+        db.add(Event(date=date(2024, 5, 25), category_id=category.id, cover="x.jpg"))
+        await db.commit()
+
+        for params in ({}, {"fields": "id,cover"}):
+            response = await client.get(
+                "/api/v1/events/wedding/2024-05-25", params=params
+            )
+            assert response.status_code == 404
+
 
 class TestGetEventsWithCategory:
     @pytest.mark.asyncio
@@ -149,6 +247,73 @@ class TestGetEventsWithCategory:
         assert len(data["events"]) == 0
         assert data["total_count"] == 0
 
+    @pytest.mark.asyncio
+    async def test_get_events_with_category_sparse_fields(
+        self,
+        client: AsyncClient,
+        db: AsyncSession,
+    ):
+        """Тестирование разреженного набора полей: в ответ попадают
+        только запрошенные поля съемок"""
+        await create_test_event(db, "wedding", "2024-05-25")
+        await create_test_event(db, "wedding", "2024-06-25")
+
+        response = await client.get(
+            "/api/v1/events/wedding", params={"fields": "date, id,cover"}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total_count"] == 2
+        assert [set(event) for event in data["events"]] == [{"id", "date", "cover"}] * 2
+
+        # без параметра fields возвращается полный набор полей
+        response = await client.get("/api/v1/events/wedding")
+
+        assert response.status_code == 200
+        assert "description" in response.json()["events"][0]
+
+    @pytest.mark.asyncio
+    async def test_get_events_with_category_unknown_field(
+        self,
+        client: AsyncClient,
+        db: AsyncSession,
+    ):
+        """Тестирование запроса несуществующего поля"""
+        response = await client.get(
+            "/api/v1/events/wedding", params={"fields": "id,pictures"}
+        )
+
+        assert response.status_code == 400
+
+
+class TestGetLatestEventsForCategories:
+    @pytest.mark.asyncio
+    async def test_get_latest_events_for_categories(
+        self,
+        client: AsyncClient,
+        db: AsyncSession,
+    ):
+        """Тестирование получения первых страниц нескольких категорий
+        одним запросом. Доступно без авторизации"""
+        await create_test_event(db, "wedding", "2024-05-25")
+        await create_test_event(db, "wedding", "2024-06-25")
+        await create_test_event(db, "wedding", "2024-07-25", active=False)
+        await create_test_event(db, "portrait", "2024-05-28")
+
+        response = await client.get(
+            "/api/v1/events/latest",
+            params={"categories": ["wedding", "portrait", "family"], "limit": 1},
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert set(data) == {"wedding", "portrait", "family"}
+        assert data["wedding"]["total_count"] == 2
+        assert [event["date"] for event in data["wedding"]["events"]] == ["2024-06-25"]
+        assert data["portrait"]["total_count"] == 1
+        assert data["family"] == {"total_count": 0, "events": []}
+
 
 class TestAddPicturesToExistingEvent:
     """Тестирование добавления фотографий к существующей съемке. Конечная точка доступна только с авторизацией."""
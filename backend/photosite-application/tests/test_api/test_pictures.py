@@ -1,17 +1,32 @@
+import asyncio
 from collections.abc import AsyncGenerator, Sequence
 import io
-from datetime import date
+import os
+from datetime import date, datetime
+import threading
 import time
 
 import pytest
-from fastapi import UploadFile
+from PIL import Image
+from fastapi import HTTPException, UploadFile
 from httpx import Response
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from httpx import AsyncClient
 
+from core.config import settings
 from core.models import Category, Event, Picture
-from .utils import create_test_category, get_valid_upload_files, add_pictures_for_event
+from core.redis_helper import redis_helper
+from commands import upload_worker
+from utils import pictures as pictures_utils
+from utils import resumable_uploads, upload_jobs
+from .utils import (
+    create_test_category,
+    create_test_event,
+    get_valid_upload_files,
+    add_pictures_for_event,
+    make_jpeg_bytes,
+)
 
 
 class TestUploadPictures:
@@ -280,6 +295,49 @@ class TestUploadPictures:
 
         assert response.status_code == 422
 
+    @pytest.mark.asyncio
+    async def test_picture_metadata_is_stored(
+        self,
+        authenticated_client: AsyncClient,
+        db: AsyncSession,
+        mock_settings,
+    ):
+        """Размеры, ориентация и время съемки сохраняются при загрузке
+        и возвращаются в списке фотографий"""
+        await create_test_category(db, "wedding")
+        exif = Image.Exif()
+        exif[0x0112] = 6  # поворот на 90 градусов
+        exif.get_ifd(0x8769)[0x9003] = "2024:05:20 10:30:00"
+        buffer = io.BytesIO()
+        Image.new("RGB", (40, 30)).save(buffer, "JPEG", exif=exif.tobytes())
+
+        response = await authenticated_client.post(
+            "/api/v1/pictures",
+            data={"category": "wedding", "date": "2024-05-20"},
+            files=[
+                ("files", ("123.jpg", buffer.getvalue(), "image/jpeg")),
+                ("files", ("456.jpg", make_jpeg_bytes(), "image/jpeg")),
+                ("event_cover", ("300.jpg", make_jpeg_bytes(), "image/jpeg")),
+            ],
+        )
+        assert response.status_code == 201
+
+        pictures = {
+            picture.name: picture for picture in await db.scalars(select(Picture))
+        }
+        rotated = pictures["123.jpg"]
+        assert (rotated.width, rotated.height, rotated.orientation) == (30, 40, 6)
+        assert rotated.taken_at == datetime(2024, 5, 20, 10, 30)
+        plain = pictures["456.jpg"]
+        assert (plain.width, plain.height, plain.orientation) == (8, 10, None)
+        assert plain.taken_at is None
+
+        response = await authenticated_client.get("/api/v1/pictures")
+        data = {picture["name"]: picture for picture in response.json()}
+        assert data["123.jpg"]["width"] == 30
+        assert data["123.jpg"]["taken_at"] == "2024-05-20T10:30:00"
+        assert data["456.jpg"]["placeholder"].startswith("data:image/webp;base64,")
+
 
 class TestGetAllPictures:
     """Тестирование получения всех фотографий админом"""
@@ -513,3 +571,646 @@ class TestDeletePictures:
 
         response = await client.request("DELETE", "/api/v1/pictures/", json=["123.jpg"])
         assert response.status_code == 401
+
+
+class FakeRedis:
+    """Строки, хеши и списки Redis в памяти для задач и возобновляемых загрузок"""
+
+    def __init__(self):
+        self.hashes: dict[str, dict[bytes, bytes]] = {}
+        self.lists: dict[str, list[bytes]] = {}
+        self.strings: dict[str, bytes] = {}
+        self.sets: dict[str, set[bytes]] = {}
+        self.deadlines: dict[str, float] = {}
+
+    def drop_expired(self, key):
+        if key in self.deadlines and self.deadlines[key] <= time.monotonic():
+            del self.deadlines[key]
+            self.strings.pop(key, None)
+
+    async def set(self, key, value, nx=False, ex=None):
+        self.drop_expired(key)
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = str(value).encode()
+        if ex is not None:
+            self.deadlines[key] = time.monotonic() + ex
+        else:
+            self.deadlines.pop(key, None)
+        return True
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.strings.pop(key, None)
+            self.hashes.pop(key, None)
+            self.lists.pop(key, None)
+
+    async def get(self, key):
+        self.drop_expired(key)
+        return self.strings.get(key)
+
+    async def exists(self, *keys):
+        for key in keys:
+            self.drop_expired(key)
+        return sum(
+            key in self.strings or key in self.hashes or key in self.lists
+            for key in keys
+        )
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        if mapping is None:
+            mapping = {field: value}
+        self.hashes.setdefault(key, {}).update(
+            {
+                k.encode(): v if isinstance(v, bytes) else str(v).encode()
+                for k, v in mapping.items()
+            }
+        )
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field.encode())
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def expire(self, key, seconds):
+        if key in self.strings:
+            self.deadlines[key] = time.monotonic() + seconds
+
+    async def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value.encode())
+
+    async def hincrby(self, key, field, amount):
+        fields = self.hashes.setdefault(key, {})
+        value = int(fields.get(field.encode(), 0)) + amount
+        fields[field.encode()] = str(value).encode()
+        return value
+
+    async def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    async def lindex(self, key, index):
+        items = self.lists.get(key, [])
+        return items[index] if -len(items) <= index < len(items) else None
+
+    async def lrem(self, key, count, value):
+        value = value if isinstance(value, bytes) else value.encode()
+        if value in self.lists.get(key, []):
+            self.lists[key].remove(value)
+
+    async def lmove(self, source, destination, src="LEFT", dest="RIGHT"):
+        items = self.lists.get(source)
+        if not items:
+            return None
+        item = items.pop(0 if src == "LEFT" else -1)
+        target = self.lists.setdefault(destination, [])
+        target.insert(0 if dest == "LEFT" else len(target), item)
+        return item
+
+    async def blmove(self, source, destination, timeout, src="LEFT", dest="RIGHT"):
+        return await self.lmove(source, destination, src, dest)
+
+    async def sadd(self, key, *values):
+        self.sets.setdefault(key, set()).update(value.encode() for value in values)
+
+    async def srem(self, key, *values):
+        self.sets.get(key, set()).difference_update(v.encode() for v in values)
+
+    async def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    async def publish(self, channel, message):
+        pass
+
+
+class TestAsyncUploadPictures:
+    """Тесты загрузки через очередь задач (settings.uploads.async_processing)"""
+
+    @pytest.fixture(autouse=True)
+    def async_uploads(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(settings.uploads, "async_processing", True)
+        monkeypatch.setattr(settings.uploads, "staging_dir", tmp_path)
+        fake_redis = FakeRedis()
+        monkeypatch.setattr(redis_helper, "_client", fake_redis)
+        return fake_redis
+
+    @pytest.mark.asyncio
+    async def test_upload_is_queued_and_processed(
+        self,
+        authenticated_client: AsyncClient,
+        db: AsyncSession,
+        async_uploads: FakeRedis,
+        mock_settings,
+    ):
+        """Запрос возвращает 202 с id задачи, фотографии появляются
+        только после обработки задачи"""
+        await create_test_category(db, "wedding")
+        files = await get_valid_upload_files(["123.jpg", "456.jpeg"])
+        cover = (await get_valid_upload_files(["300.jpg"]))[0]
+
+        response = await authenticated_client.post(
+            "/api/v1/pictures",
+            data={"category": "wedding", "date": "2024-05-20"},
+            files=[("files", (f.filename, f.file, "image/jpeg")) for f in files]
+            + [("event_cover", (cover.filename, cover.file, "image/jpeg"))],
+        )
+
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        assert async_uploads.lists[upload_jobs.queue_key()] == [job_id.encode()]
+        assert await db.scalar(select(func.count(Picture.id))) == 0
+
+        response = await authenticated_client.get(f"/api/v1/pictures/jobs/{job_id}")
+        assert response.json()["status"] == "queued"
+
+        await upload_jobs.process_upload_job(db, job_id)
+
+        response = await authenticated_client.get(f"/api/v1/pictures/jobs/{job_id}")
+        assert response.status_code == 200
+        assert response.json()["status"] == "done"
+        assert set(response.json()["result"]) == {"123.jpg", "456.jpeg"}
+        assert await db.scalar(select(func.count(Picture.id))) == 2
+        date_dir = mock_settings.static.image_dir / "wedding" / "2024-05-20"
+        assert (date_dir / "123.jpg").exists()
+        assert not upload_jobs.job_dir(job_id).exists()
+
+    @pytest.mark.asyncio
+    async def test_failed_job_reports_detail(
+        self,
+        authenticated_client: AsyncClient,
+        db: AsyncSession,
+    ):
+        """Ошибка обработки (съемки нет) записывается в задачу"""
+        files = await get_valid_upload_files(["123.jpg"])
+
+        response = await authenticated_client.patch(
+            "/api/v1/events/wedding/2024-05-20/pictures",
+            files=[("files", (f.filename, f.file, "image/jpeg")) for f in files],
+        )
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        await upload_jobs.process_upload_job(db, job_id)
+
+        response = await authenticated_client.get(f"/api/v1/pictures/jobs/{job_id}")
+        assert response.json()["status"] == "failed"
+        assert response.json()["detail"]
+
+    @pytest.mark.asyncio
+    async def test_invalid_date_is_rejected_immediately(
+        self,
+        authenticated_client: AsyncClient,
+        async_uploads: FakeRedis,
+    ):
+        files = await get_valid_upload_files(["123.jpg"])
+        cover = (await get_valid_upload_files(["300.jpg"]))[0]
+
+        response = await authenticated_client.post(
+            "/api/v1/pictures",
+            data={"category": "wedding", "date": "2024-13-45"},
+            files=[("files", (f.filename, f.file, "image/jpeg")) for f in files]
+            + [("event_cover", (cover.filename, cover.file, "image/jpeg"))],
+        )
+
+        assert response.status_code == 400
+        assert not async_uploads.lists
+
+    @pytest.mark.asyncio
+    async def test_jobs_of_stopped_worker_are_recovered(
+        self,
+        authenticated_client: AsyncClient,
+        db: AsyncSession,
+        async_uploads: FakeRedis,
+    ):
+        """Задача остается в списке обработчика до завершения; задачи
+        обработчика без heartbeat возвращаются в очередь, а после
+        max_job_attempts прерываний помечаются неудачными"""
+        files = await get_valid_upload_files(["123.jpg"])
+        response = await authenticated_client.patch(
+            "/api/v1/events/wedding/2024-05-20/pictures",
+            files=[("files", (f.filename, f.file, "image/jpeg")) for f in files],
+        )
+        job_id = response.json()["job_id"]
+
+        await upload_jobs.register_worker("live")
+        await upload_jobs.register_worker("dead")
+        assert await upload_jobs.take_upload_job("dead", timeout=1) == job_id
+        # обработчик убит посреди задачи: heartbeat истек
+        del async_uploads.strings[upload_jobs.heartbeat_key("dead")]
+
+        for attempt in range(1, settings.uploads.max_job_attempts):
+            assert await upload_jobs.recover_abandoned_jobs() == 1
+            assert async_uploads.lists[upload_jobs.queue_key()] == [job_id.encode()]
+            job = await upload_jobs.get_upload_job(job_id)
+            assert job["status"] == "queued"  # type: ignore
+            await upload_jobs.register_worker("dead")
+            assert await upload_jobs.take_upload_job("dead", timeout=1) == job_id
+            del async_uploads.strings[upload_jobs.heartbeat_key("dead")]
+
+        assert await upload_jobs.recover_abandoned_jobs() == 1
+        job = await upload_jobs.get_upload_job(job_id)
+        assert job["status"] == "failed"  # type: ignore
+        assert not async_uploads.lists[upload_jobs.queue_key()]
+        assert not upload_jobs.job_dir(job_id).exists()
+        assert await async_uploads.smembers(upload_jobs.workers_key()) == {b"live"}
+
+        # задачи живого обработчика не трогаются
+        await upload_jobs.queue_staged_upload("other", {})
+        assert await upload_jobs.take_upload_job("live", timeout=1) == "other"
+        assert await upload_jobs.recover_abandoned_jobs() == 0
+        await upload_jobs.complete_upload_job("live", "other")
+        assert not async_uploads.lists[upload_jobs.processing_key("live")]
+
+    @pytest.mark.asyncio
+    async def test_long_job_is_not_recovered(
+        self,
+        authenticated_client: AsyncClient,
+        db: AsyncSession,
+        async_uploads: FakeRedis,
+        mock_settings,
+        monkeypatch,
+    ):
+        """Превью создаются вне цикла событий, поэтому heartbeat продлевается
+        и во время задачи дольше worker_heartbeat_ttl: восстановление,
+        запущенное другим обработчиком, не возвращает ее в очередь"""
+        monkeypatch.setattr(settings.uploads, "worker_heartbeat_ttl", 0.3)
+        resize = pictures_utils.resize_and_crop_image
+
+        def slow_resize(input_path, output_path):
+            time.sleep(0.4)
+            return resize(input_path, output_path)
+
+        monkeypatch.setattr(pictures_utils, "resize_and_crop_image", slow_resize)
+
+        await create_test_category(db, "wedding")
+        files = await get_valid_upload_files(["123.jpg", "456.jpeg"])
+        cover = (await get_valid_upload_files(["300.jpg"]))[0]
+        response = await authenticated_client.post(
+            "/api/v1/pictures",
+            data={"category": "wedding", "date": "2024-05-20"},
+            files=[("files", (f.filename, f.file, "image/jpeg")) for f in files]
+            + [("event_cover", (cover.filename, cover.file, "image/jpeg"))],
+        )
+        job_id = response.json()["job_id"]
+
+        await upload_jobs.register_worker("busy")
+        assert await upload_jobs.take_upload_job("busy", timeout=1) == job_id
+        keep_alive = asyncio.create_task(upload_worker.send_heartbeats("busy"))
+
+        # другой обработчик - отдельный процесс со своим циклом событий
+        recovered: list[int] = []
+
+        def other_worker():
+            time.sleep(0.6)
+            recovered.append(asyncio.run(upload_jobs.recover_abandoned_jobs()))
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        try:
+            await upload_jobs.process_upload_job(db, job_id)
+        finally:
+            keep_alive.cancel()
+            await asyncio.to_thread(thread.join)
+
+        assert recovered == [0]
+        assert async_uploads.lists[upload_jobs.processing_key("busy")] == [
+            job_id.encode()
+        ]
+        assert not async_uploads.lists[upload_jobs.queue_key()]
+        job = await upload_jobs.get_upload_job(job_id)
+        assert job["status"] == "done"  # type: ignore
+
+    @pytest.mark.asyncio
+    async def test_unknown_job(self, authenticated_client: AsyncClient):
+        response = await authenticated_client.get("/api/v1/pictures/jobs/missing")
+        assert response.status_code == 404
+
+
+COVER = make_jpeg_bytes()
+
+
+class TestResumableUploads:
+    """Тесты возобновляемой загрузки кусками"""
+
+    @pytest.fixture(autouse=True)
+    def fake_redis(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(settings.uploads, "staging_dir", tmp_path)
+        fake_redis = FakeRedis()
+        monkeypatch.setattr(redis_helper, "_client", fake_redis)
+        return fake_redis
+
+    async def create_upload(
+        self, client: AsyncClient, db: AsyncSession, files: dict[str, bytes]
+    ) -> str:
+        await create_test_category(db, "wedding")
+        response = await client.post(
+            "/api/v1/pictures/resumable",
+            json={
+                "category": "wedding",
+                "date": "2024-05-20",
+                "files": [
+                    {"name": name, "size": len(data)} for name, data in files.items()
+                ],
+                "event_cover": {"name": "300.jpg", "size": len(COVER)},
+            },
+        )
+        assert response.status_code == 201
+        return response.json()["upload_id"]
+
+    async def send_chunk(
+        self, client: AsyncClient, url: str, offset: int, data: bytes
+    ) -> Response:
+        return await client.patch(
+            url,
+            content=data,
+            headers={
+                "Upload-Offset": str(offset),
+                "Content-Type": "application/offset+octet-stream",
+            },
+        )
+
+    @pytest.mark.asyncio
+    async def test_chunks_are_resumed_and_finalized(
+        self,
+        authenticated_client: AsyncClient,
+        db: AsyncSession,
+        mock_settings,
+    ):
+        """Файл собирается из кусков, смещение возвращает HEAD, после
+        finalize съемка создается обычным путем загрузки"""
+        await create_test_category(db, "wedding")
+        data = make_jpeg_bytes()
+        upload_id = await self.create_upload(
+            authenticated_client, db, {"123.jpg": data}
+        )
+        url = f"/api/v1/pictures/resumable/{upload_id}/files/123.jpg"
+
+        response = await self.send_chunk(authenticated_client, url, 0, data[:4])
+        assert response.status_code == 204
+        assert response.headers["upload-offset"] == "4"
+
+        # повтор уже принятого куска отклоняется с принятым смещением
+        response = await self.send_chunk(authenticated_client, url, 0, data[:4])
+        assert response.status_code == 409
+
+        response = await authenticated_client.head(url)
+        assert response.headers["upload-offset"] == "4"
+        assert response.headers["upload-length"] == str(len(data))
+
+        # пока файлы не приняты полностью, завершить загрузку нельзя
+        response = await authenticated_client.post(
+            f"/api/v1/pictures/resumable/{upload_id}/finalize"
+        )
+        assert response.status_code == 409
+
+        await self.send_chunk(authenticated_client, url, 4, data[4:])
+        await self.send_chunk(
+            authenticated_client,
+            f"/api/v1/pictures/resumable/{upload_id}/cover/300.jpg",
+            0,
+            COVER,
+        )
+
+        response = await authenticated_client.post(
+            f"/api/v1/pictures/resumable/{upload_id}/finalize"
+        )
+        assert response.status_code == 201
+        assert response.json() == ["123.jpg"]
+
+        date_dir = mock_settings.static.image_dir / "wedding" / "2024-05-20"
+        assert (date_dir / "123.jpg").read_bytes() == data
+        assert await db.scalar(select(func.count(Picture.id))) == 1
+        assert not upload_jobs.job_dir(upload_id).exists()
+
+    @pytest.mark.asyncio
+    async def test_chunk_lock_is_kept_while_streaming(
+        self,
+        authenticated_client: AsyncClient,
+        db: AsyncSession,
+        monkeypatch,
+    ):
+        """Медленный кусок дольше CHUNK_LOCK_TTL не теряет блокировку:
+        второй запрос к тому же файлу все это время получает 409"""
+        monkeypatch.setattr(resumable_uploads, "CHUNK_LOCK_TTL", 0.3)
+        data = make_jpeg_bytes()
+        upload_id = await self.create_upload(
+            authenticated_client, db, {"123.jpg": data}
+        )
+        lock = resumable_uploads.lock_key(upload_id, "files", "123.jpg")
+        taken: list[bool] = []
+
+        async def slow_chunk():
+            for start in range(0, 5):
+                await asyncio.sleep(0.15)
+                other = resumable_uploads.ChunkLock(lock)
+                taken.append(await other.acquire())
+                yield data[start : start + 1]
+            yield data[5:]
+
+        offset = await resumable_uploads.write_chunk(
+            upload_id, "files", "123.jpg", 0, slow_chunk(), None
+        )
+
+        assert offset == len(data)
+        assert taken == [False] * 5
+
+    @pytest.mark.asyncio
+    async def test_lost_chunk_lock_does_not_overwrite_offset(
+        self,
+        authenticated_client: AsyncClient,
+        db: AsyncSession,
+        monkeypatch,
+    ):
+        """Если запрос простоял дольше CHUNK_LOCK_TTL и файл взял другой
+        запрос, первый получает 409 и не меняет файл и принятое смещение"""
+        monkeypatch.setattr(resumable_uploads, "CHUNK_LOCK_TTL", 0.2)
+        data = make_jpeg_bytes()
+        upload_id = await self.create_upload(
+            authenticated_client, db, {"123.jpg": data}
+        )
+        url = f"/api/v1/pictures/resumable/{upload_id}/files/123.jpg"
+
+        async def stalled_chunk():
+            yield data[:2]
+            await asyncio.sleep(0.3)
+            response = await self.send_chunk(authenticated_client, url, 0, data[:4])
+            assert response.status_code == 204
+            yield data[2:]
+
+        with pytest.raises(HTTPException) as e:
+            await resumable_uploads.write_chunk(
+                upload_id, "files", "123.jpg", 0, stalled_chunk(), None
+            )
+
+        assert e.value.status_code == 409
+        response = await authenticated_client.head(url)
+        assert response.headers["upload-offset"] == "4"
+        staged = upload_jobs.job_dir(upload_id) / "files" / "123.jpg"
+        assert staged.read_bytes()[:4] == data[:4]
+
+    @pytest.mark.asyncio
+    async def test_chunk_beyond_declared_size(
+        self, authenticated_client: AsyncClient, db: AsyncSession
+    ):
+        upload_id = await self.create_upload(
+            authenticated_client, db, {"123.jpg": b"\xff\xd8"}
+        )
+        url = f"/api/v1/pictures/resumable/{upload_id}/files/123.jpg"
+
+        response = await self.send_chunk(authenticated_client, url, 0, b"\xff\xd8\xff")
+        assert response.status_code == 400
+
+        response = await authenticated_client.head(url)
+        assert response.headers["upload-offset"] == "0"
+
+    @pytest.mark.asyncio
+    async def test_unknown_file_and_upload(
+        self, authenticated_client: AsyncClient, db: AsyncSession
+    ):
+        upload_id = await self.create_upload(
+            authenticated_client, db, {"123.jpg": b"12"}
+        )
+
+        response = await self.send_chunk(
+            authenticated_client,
+            f"/api/v1/pictures/resumable/{upload_id}/files/456.jpg",
+            0,
+            b"12",
+        )
+        assert response.status_code == 404
+
+        response = await authenticated_client.delete(
+            f"/api/v1/pictures/resumable/{upload_id}"
+        )
+        assert response.status_code == 204
+        assert not upload_jobs.job_dir(upload_id).exists()
+
+        response = await authenticated_client.get(
+            f"/api/v1/pictures/resumable/{upload_id}"
+        )
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_upload_id_must_be_hex(self, authenticated_client: AsyncClient):
+        """id загрузки - имя каталога, поэтому принимается только hex"""
+        response = await authenticated_client.delete(
+            "/api/v1/pictures/resumable/..static"
+        )
+        assert response.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_first_chunk_must_start_jpeg(
+        self, authenticated_client: AsyncClient, db: AsyncSession
+    ):
+        """Файл, не начинающийся с маркера SOI, отклоняется с первого куска"""
+        upload_id = await self.create_upload(
+            authenticated_client, db, {"123.jpg": b"GIF89a"}
+        )
+        url = f"/api/v1/pictures/resumable/{upload_id}/files/123.jpg"
+
+        response = await self.send_chunk(authenticated_client, url, 0, b"GIF89a")
+        assert response.status_code == 400
+
+        response = await authenticated_client.head(url)
+        assert response.headers["upload-offset"] == "0"
+
+    @pytest.mark.asyncio
+    async def test_category_and_event_are_checked_on_create(
+        self, authenticated_client: AsyncClient, db: AsyncSession
+    ):
+        """Ошибки категории и съемки возвращаются до передачи файлов"""
+        description = {
+            "category": "unknown",
+            "date": "2024-05-20",
+            "files": [{"name": "123.jpg", "size": 10}],
+            "event_cover": {"name": "300.jpg", "size": 10},
+        }
+        response = await authenticated_client.post(
+            "/api/v1/pictures/resumable", json=description
+        )
+        assert response.status_code == 400
+
+        await create_test_event(db, "wedding", "2024-05-20")
+        response = await authenticated_client.post(
+            "/api/v1/pictures/resumable", json={**description, "category": "wedding"}
+        )
+        assert response.status_code == 400
+
+        # добавление к несуществующей съемке
+        response = await authenticated_client.post(
+            "/api/v1/pictures/resumable",
+            json={
+                **description,
+                "category": "wedding",
+                "date": "2024-06-01",
+                "event_cover": None,
+            },
+        )
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_failed_finalize_can_be_retried(
+        self,
+        authenticated_client: AsyncClient,
+        db: AsyncSession,
+        fake_redis: FakeRedis,
+        monkeypatch,
+        mock_settings,
+    ):
+        """Ошибка при завершении не удаляет принятые файлы, а одновременное
+        завершение той же загрузки отклоняется"""
+        data = make_jpeg_bytes()
+        upload_id = await self.create_upload(
+            authenticated_client, db, {"123.jpg": data}
+        )
+        base = f"/api/v1/pictures/resumable/{upload_id}"
+        await self.send_chunk(authenticated_client, f"{base}/files/123.jpg", 0, data)
+        await self.send_chunk(authenticated_client, f"{base}/cover/300.jpg", 0, COVER)
+
+        # временная ошибка обработки, например занятый бюджет памяти
+        async def busy(*args, **kwargs):
+            raise HTTPException(status_code=503, detail="Сервер занят")
+
+        with monkeypatch.context() as patch:
+            patch.setattr(resumable_uploads, "run_staged_upload", busy)
+            response = await authenticated_client.post(f"{base}/finalize")
+        assert response.status_code == 503
+        assert (upload_jobs.job_dir(upload_id) / "files" / "123.jpg").exists()
+
+        claim = resumable_uploads.finalize_key(upload_id)
+        fake_redis.strings[claim] = b"1"
+        assert (await authenticated_client.post(f"{base}/finalize")).status_code == 409
+        response = await self.send_chunk(
+            authenticated_client, f"{base}/files/123.jpg", len(data), b""
+        )
+        assert response.status_code == 409
+        del fake_redis.strings[claim]
+
+        response = await authenticated_client.post(f"{base}/finalize")
+        assert response.status_code == 201
+        assert not upload_jobs.job_dir(upload_id).exists()
+        assert (await authenticated_client.post(f"{base}/finalize")).status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_abandoned_uploads_are_cleaned_up(
+        self, authenticated_client: AsyncClient, db: AsyncSession, fake_redis: FakeRedis
+    ):
+        """Каталоги загрузок, запись которых истекла в Redis, удаляются
+        по времени последнего изменения"""
+        abandoned, active, unexpired = [
+            await self.create_upload(authenticated_client, db, {"123.jpg": b"12"})
+            for _ in range(3)
+        ]
+        old = time.time() - settings.uploads.resumable_ttl - 60
+        for upload_id in (abandoned, active):
+            for path in upload_jobs.job_dir(upload_id).rglob("*"):
+                os.utime(path, (old, old))
+            os.utime(upload_jobs.job_dir(upload_id), (old, old))
+        # истекла запись в Redis только у брошенной загрузки
+        for upload_id in (abandoned, unexpired):
+            await fake_redis.delete(resumable_uploads.upload_key(upload_id))
+
+        assert await resumable_uploads.cleanup_staging_dirs() == 1
+        assert not upload_jobs.job_dir(abandoned).exists()
+        assert upload_jobs.job_dir(active).exists()
+        assert upload_jobs.job_dir(unexpired).exists()
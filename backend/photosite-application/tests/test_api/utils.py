@@ -1,6 +1,7 @@
 import io
 
 from fastapi import UploadFile
+from PIL import Image
 from httpx import AsyncClient
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -8,6 +9,7 @@ from sqlalchemy.orm import selectinload
 from utils.general import check_date
 
 from core.models import Category, Event, Picture
+from utils.category_stats import refresh_category_stats
 
 
 async def create_test_category(db: AsyncSession, name: str = "portrait") -> Category:
@@ -23,6 +25,49 @@ async def create_test_category(db: AsyncSession, name: str = "portrait") -> Cate
     return category
 
 
+async def create_test_event(
+    db: AsyncSession,
+    category_name: str = "wedding",
+    event_date: str = "2024-05-25",
+    pics: list[str] = ["123.jpg", "456.jpeg", "789.jpeg"],
+    description: str | None = "Базовое описание для тестовой съемки",
+    active: bool = True,
+) -> Event:
+    """Создает съемку с фотографиями напрямую в базе данных, без загрузки файлов"""
+    category: Category = await create_test_category(db, category_name)
+
+    event = Event(
+        date=check_date(event_date),
+        category_id=category.id,
+        cover=f"event_covers/{category_name}/{event_date}/{pics[0]}",
+        description=description,
+        active=active,
+    )
+    db.add(event)
+    await db.commit()
+
+    for name in pics:
+        db.add(
+            Picture(
+                name=name,
+                path=f"{category_name}/{event_date}/{name}",
+                event_id=event.id,
+            )
+        )
+    # сводка по категории поддерживается так же, как в функциях crud
+    await refresh_category_stats(db, [category.id])
+    await db.commit()
+    await db.refresh(event)
+    return event
+
+
+def make_jpeg_bytes(width: int = 8, height: int = 10) -> bytes:
+    """Небольшое настоящее изображение JPEG: загрузки проверяют заголовок"""
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
 async def get_valid_upload_files(filenames: list[str]) -> list[UploadFile]:
     """
     Создаёт список UploadFile с именами, состоящими из цифр и расширением .jpg/.jpeg.
@@ -40,7 +85,7 @@ async def get_valid_upload_files(filenames: list[str]) -> list[UploadFile]:
                 f"Имя файла (без расширения) должно состоять только из цифр: {name}"
             )
 
-        content = b"fake image content"
+        content = make_jpeg_bytes()
         file = UploadFile(
             filename=name,
             file=io.BytesIO(content),
@@ -0,0 +1,159 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from commands.check_integrity import (
+    MISSING_COVER,
+    MISSING_ORIGINAL,
+    MISSING_THUMBNAIL,
+    ORPHAN_DIRECTORY,
+    ORPHAN_FILE,
+    IntegrityChecker,
+    check_integrity,
+)
+from core.models import Event, Picture
+from tests.conftest import AsyncSessionLocal
+from tests.test_api.utils import create_test_event, make_jpeg_bytes
+
+
+async def create_broken_archive(db: AsyncSession, mock_settings) -> None:
+    """Съемка с фотографиями 1-3: нет исходного файла 3, превью 2 и обложки;
+    лишние исходный файл, превью, каталог съемки и файл в каталоге категории"""
+    await create_test_event(
+        db, "wedding", "2024-05-20", pics=["1.jpg", "2.jpg", "3.jpg"]
+    )
+    await create_test_event(db, "wedding", "2024-06-01", pics=["5.jpg"])
+    static = mock_settings.static
+    files = [
+        static.image_dir / "wedding/2024-05-20/1.jpg",
+        static.image_dir / "wedding/2024-05-20/2.jpg",
+        static.image_dir / "wedding/2024-05-20/9.jpg",
+        static.thumbnails_dir / "wedding/2024-05-20/1.jpg",
+        static.thumbnails_dir / "wedding/2024-05-20/8.jpg",
+        static.image_dir / "wedding/2020-01-01/7.jpg",
+        static.image_dir / "wedding/stray.txt",
+        static.image_dir / "wedding/2024-06-01/5.jpg",
+        static.thumbnails_dir / "wedding/2024-06-01/5.jpg",
+        static.covers_dir / "wedding/2024-06-01/5.jpg",
+    ]
+    for path in files:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(make_jpeg_bytes())
+
+
+class TestCheckIntegrity:
+    """Тесты сверки файлов с базой данных"""
+
+    @pytest.mark.asyncio
+    async def test_problems_are_found(self, db: AsyncSession, mock_settings):
+        await create_broken_archive(db, mock_settings)
+
+        with ThreadPoolExecutor(4) as executor:
+            checker = IntegrityChecker(executor, window=1)
+            await check_integrity(AsyncSessionLocal, checker)
+
+        assert checker.problems == {
+            MISSING_ORIGINAL: 1,
+            MISSING_THUMBNAIL: 1,
+            MISSING_COVER: 1,
+            ORPHAN_FILE: 3,
+            ORPHAN_DIRECTORY: 1,
+        }
+        assert not checker.repaired
+        # без repair ничего не удаляется
+        assert (mock_settings.static.image_dir / "wedding/2024-05-20/9.jpg").exists()
+
+    @pytest.mark.asyncio
+    async def test_repair(self, db: AsyncSession, mock_settings):
+        await create_broken_archive(db, mock_settings)
+        static = mock_settings.static
+
+        with ThreadPoolExecutor(4) as executor:
+            checker = IntegrityChecker(executor, executor, min_age=0)
+            await check_integrity(AsyncSessionLocal, checker)
+
+        assert checker.repaired == {
+            MISSING_THUMBNAIL: 1,
+            ORPHAN_FILE: 3,
+            ORPHAN_DIRECTORY: 1,
+        }
+        assert (static.thumbnails_dir / "wedding/2024-05-20/2.jpg").exists()
+        assert not (static.image_dir / "wedding/2024-05-20/9.jpg").exists()
+        assert not (static.thumbnails_dir / "wedding/2024-05-20/8.jpg").exists()
+        assert not (static.image_dir / "wedding/2020-01-01").exists()
+        assert not (static.image_dir / "wedding/stray.txt").exists()
+        assert (static.image_dir / "wedding/2024-06-01/5.jpg").exists()
+
+    @pytest.mark.asyncio
+    async def test_recent_orphans_are_kept(self, db: AsyncSession, mock_settings):
+        await create_broken_archive(db, mock_settings)
+
+        with ThreadPoolExecutor(4) as executor:
+            checker = IntegrityChecker(executor, executor, min_age=3600)
+            await check_integrity(AsyncSessionLocal, checker)
+
+        assert checker.repaired == {MISSING_THUMBNAIL: 1}
+        assert (mock_settings.static.image_dir / "wedding/2024-05-20/9.jpg").exists()
+
+    @pytest.mark.asyncio
+    async def test_failed_removal_does_not_abort_scan(
+        self, db: AsyncSession, mock_settings, monkeypatch
+    ):
+        await create_broken_archive(db, mock_settings)
+        stray = mock_settings.static.image_dir / "wedding/stray.txt"
+        unlink = Path.unlink
+
+        def deny_stray(path, *args, **kwargs):
+            if path == stray:
+                raise PermissionError("denied")
+            return unlink(path, *args, **kwargs)
+
+        monkeypatch.setattr(Path, "unlink", deny_stray)
+        with ThreadPoolExecutor(4) as executor:
+            checker = IntegrityChecker(executor, executor, min_age=0)
+            await check_integrity(AsyncSessionLocal, checker)
+
+        assert checker.failed == {ORPHAN_FILE: 1}
+        assert checker.repaired == {
+            MISSING_THUMBNAIL: 1,
+            ORPHAN_FILE: 2,
+            ORPHAN_DIRECTORY: 1,
+        }
+        assert stray.exists()
+        assert not (
+            mock_settings.static.image_dir / "wedding/2024-05-20/9.jpg"
+        ).exists()
+
+    @pytest.mark.asyncio
+    async def test_pictures_of_unlisted_event_are_skipped(
+        self, db: AsyncSession, mock_settings
+    ):
+        """Фотографии съемки, которой нет в списке съемок (например,
+        добавленной между запросами), не сбивают сопоставление следующих
+        съемок с их фотографиями"""
+        await create_test_event(db, "wedding", "2024-05-20", pics=["1.jpg"])
+        # съемка без категории не попадает в список, но ее фотографии
+        # есть в потоке строк picture
+        unlisted = Event(date=date(2024, 5, 25), category_id=999, cover="x.jpg")
+        db.add(unlisted)
+        await db.commit()
+        db.add(
+            Picture(name="3.jpg", path="unknown/2024-05-25/3.jpg", event_id=unlisted.id)
+        )
+        await db.commit()
+        await create_test_event(db, "wedding", "2024-06-01", pics=["5.jpg"])
+        static = mock_settings.static
+        for key in ("wedding/2024-05-20/1.jpg", "wedding/2024-06-01/5.jpg"):
+            for root in (static.image_dir, static.thumbnails_dir, static.covers_dir):
+                (root / key).parent.mkdir(parents=True, exist_ok=True)
+                (root / key).write_bytes(make_jpeg_bytes())
+
+        with ThreadPoolExecutor(4) as executor:
+            checker = IntegrityChecker(executor, executor, min_age=0)
+            await check_integrity(AsyncSessionLocal, checker)
+
+        assert not checker.problems
+        assert (static.image_dir / "wedding/2024-06-01/5.jpg").exists()
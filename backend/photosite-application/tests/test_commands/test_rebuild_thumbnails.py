@@ -0,0 +1,94 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from commands.rebuild_thumbnails import rebuild_thumbnails, write_checkpoint
+from core.models import Picture
+from tests.conftest import AsyncSessionLocal
+from tests.test_api.utils import create_test_event, make_jpeg_bytes
+
+
+async def create_pictures(db: AsyncSession, mock_settings, pics: list[str]) -> None:
+    await create_test_event(db, "wedding", "2024-05-20", pics=pics)
+    date_dir = mock_settings.static.image_dir / "wedding" / "2024-05-20"
+    date_dir.mkdir(parents=True, exist_ok=True)
+    for name in pics:
+        (date_dir / name).write_bytes(make_jpeg_bytes(40, 30))
+
+
+class TestRebuildThumbnails:
+    """Тесты пересоздания превью и заполнения метаданных"""
+
+    @pytest.mark.asyncio
+    async def test_thumbnails_and_metadata_are_rebuilt(
+        self, db: AsyncSession, mock_settings, tmp_path
+    ):
+        await create_pictures(db, mock_settings, ["1.jpg", "2.jpg", "3.jpg"])
+        (mock_settings.static.image_dir / "wedding" / "2024-05-20" / "2.jpg").unlink()
+        checkpoint = tmp_path / "checkpoint"
+
+        with ThreadPoolExecutor(2) as executor:
+            done, failed = await rebuild_thumbnails(
+                AsyncSessionLocal, executor, checkpoint, batch_size=2
+            )
+
+        assert (done, failed) == (3, 1)
+        assert not checkpoint.exists()
+        thumbnails = mock_settings.static.thumbnails_dir / "wedding" / "2024-05-20"
+        assert sorted(path.name for path in thumbnails.iterdir()) == ["1.jpg", "3.jpg"]
+
+        pictures = {p.name: p for p in await db.scalars(select(Picture))}
+        assert (pictures["1.jpg"].width, pictures["1.jpg"].height) == (40, 30)
+        assert pictures["1.jpg"].placeholder is not None
+        assert pictures["2.jpg"].width is None
+
+    @pytest.mark.asyncio
+    async def test_resume_from_checkpoint_and_stop(
+        self, db: AsyncSession, mock_settings, tmp_path
+    ):
+        await create_pictures(db, mock_settings, ["1.jpg", "2.jpg", "3.jpg", "4.jpg"])
+        first_id = await db.scalar(select(Picture.id).where(Picture.name == "1.jpg"))
+        checkpoint = tmp_path / "checkpoint"
+        write_checkpoint(checkpoint, first_id)  # type: ignore
+        stopping = asyncio.Event()
+        stopping.set()
+
+        with ThreadPoolExecutor(2) as executor:
+            done, failed = await rebuild_thumbnails(
+                AsyncSessionLocal, executor, checkpoint, batch_size=2, stopping=stopping
+            )
+
+        # обработана одна пачка после контрольной точки, точка сдвинута
+        assert (done, failed) == (2, 0)
+        thumbnails = mock_settings.static.thumbnails_dir / "wedding" / "2024-05-20"
+        assert sorted(path.name for path in thumbnails.iterdir()) == ["2.jpg", "3.jpg"]
+        third_id = await db.scalar(select(Picture.id).where(Picture.name == "3.jpg"))
+        assert checkpoint.read_text() == str(third_id)
+
+    @pytest.mark.asyncio
+    async def test_rate_paces_each_submission(
+        self, db: AsyncSession, mock_settings, tmp_path
+    ):
+        """С --rate изображения передаются в пул по одному через равные
+        промежутки, а не всей пачкой сразу"""
+        await create_pictures(db, mock_settings, ["1.jpg", "2.jpg", "3.jpg", "4.jpg"])
+        submitted: list[float] = []
+
+        class RecordingExecutor(ThreadPoolExecutor):
+            def submit(self, *args, **kwargs):
+                submitted.append(time.monotonic())
+                return super().submit(*args, **kwargs)
+
+        with RecordingExecutor(2) as executor:
+            done, _ = await rebuild_thumbnails(
+                AsyncSessionLocal, executor, tmp_path / "checkpoint", rate=20
+            )
+
+        assert done == 4
+        intervals = [b - a for a, b in zip(submitted, submitted[1:])]
+        assert len(intervals) == 3
+        assert all(interval >= 0.04 for interval in intervals)
@@ -0,0 +1,109 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import column, insert, table, text
+
+from core.models.db_helper import DatabaseHelper, pool_limits
+from core.redis_helper import redis_helper
+
+
+class TestPoolLimits:
+    """Тесты распределения бюджета соединений между воркерами"""
+
+    def test_budget_is_split_between_workers(self):
+        pool_size, max_overflow = pool_limits(connection_budget=20, workers=4)
+
+        assert (pool_size, max_overflow) == (4, 1)
+        assert (pool_size + max_overflow) * 4 <= 20
+
+    def test_at_least_one_connection_per_worker(self):
+        assert pool_limits(connection_budget=2, workers=8) == (1, 0)
+
+
+class TestPoolStats:
+    """Тесты статистики пула соединений"""
+
+    @pytest.mark.asyncio
+    async def test_pool_stats(self, tmp_path):
+        helper = DatabaseHelper(
+            url=f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+            pool_size=2,
+            max_overflow=0,
+        )
+        try:
+            async with helper.session_factory() as session:
+                await session.execute(text("SELECT 1"))
+                stats = helper.pool_stats()
+                assert stats["checked_out"] == 1
+                assert stats["size"] == 2
+
+            stats = helper.pool_stats()
+            assert stats["checked_out"] == 0
+            assert stats["wait_count"] == 1
+            assert stats["wait_seconds_max"] >= 0
+        finally:
+            await helper.dispose()
+
+
+class TestReadReplicas:
+    """Тесты маршрутизации чтения на реплики"""
+
+    @pytest.mark.asyncio
+    async def test_reads_go_to_primary_after_write(self, tmp_path, monkeypatch):
+        redis_client = AsyncMock()
+        redis_client.exists.return_value = 0
+        monkeypatch.setattr(redis_helper, "_client", redis_client)
+
+        helper = DatabaseHelper(
+            url=f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}",
+            replica_urls=[f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}"],
+            read_your_writes_seconds=60,
+        )
+
+        async def read_engine():
+            getter = helper.read_session_getter()
+            session = await anext(getter)
+            engine = session.bind
+            await getter.aclose()
+            return engine
+
+        try:
+            assert await read_engine() is helper.replica_engines[0]
+
+            getter = helper.session_getter()
+            session = await anext(getter)
+            await session.execute(text("CREATE TABLE item (id INTEGER)"))
+            await session.commit()
+            assert await read_engine() is helper.replica_engines[0]
+            await session.execute(insert(table("item", column("id"))).values(id=1))
+            await session.commit()
+            # чтение без изменений не открывает окно read-your-writes
+            await session.scalar(text("SELECT count(*) FROM item"))
+            await session.commit()
+            with pytest.raises(StopAsyncIteration):
+                await anext(getter)
+
+            assert await read_engine() is helper.engine
+            redis_client.set.assert_awaited_once()
+        finally:
+            await helper.dispose()
+
+    @pytest.mark.asyncio
+    async def test_write_is_published_on_commit(self, tmp_path, monkeypatch):
+        """Изменение публикуется при коммите любой сессии session_factory
+        (например, обработчика загрузок), до сброса кеша вызывающим кодом"""
+        redis_client = AsyncMock()
+        monkeypatch.setattr(redis_helper, "_client", redis_client)
+
+        helper = DatabaseHelper(
+            url=f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}",
+            replica_urls=[f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}"],
+        )
+        try:
+            async with helper.session_factory() as session:
+                await session.execute(text("CREATE TABLE item (id INTEGER)"))
+                await session.execute(insert(table("item", column("id"))).values(id=1))
+                await session.commit()
+                redis_client.set.assert_awaited_once()
+        finally:
+            await helper.dispose()
@@ -0,0 +1,159 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from utils import admission, pictures
+from utils.admission import ByteBudget, admit_upload, estimate_decode_bytes
+
+
+def jpeg_upload(name: str, width: int, height: int) -> UploadFile:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height)).save(buffer, "JPEG")
+    buffer.seek(0)
+    return UploadFile(file=buffer, filename=name, size=len(buffer.getvalue()))
+
+
+class TestByteBudget:
+    """Тесты бюджета одновременно обрабатываемых байт"""
+
+    @pytest.mark.asyncio
+    async def test_waiters_are_served_in_order(self):
+        budget = ByteBudget(10)
+        await budget.acquire(8, timeout=1)
+
+        order = []
+
+        async def take(amount: int) -> None:
+            acquired = await budget.acquire(amount, timeout=1)
+            order.append(amount)
+            budget.release(acquired)
+
+        # второй запрос поместился бы сразу, но ждет первого в очереди
+        tasks = [asyncio.create_task(take(5)), asyncio.create_task(take(1))]
+        await asyncio.sleep(0)
+        assert order == []
+
+        budget.release(8)
+        await asyncio.gather(*tasks)
+        assert order == [5, 1]
+        assert budget.used == 0
+
+    @pytest.mark.asyncio
+    async def test_amount_over_limit_takes_whole_budget(self):
+        budget = ByteBudget(10)
+        assert await budget.acquire(100, timeout=1) == 10
+        budget.release(10)
+        assert budget.used == 0
+
+    @pytest.mark.asyncio
+    async def test_timeout_returns_503(self):
+        budget = ByteBudget(10)
+        await budget.acquire(10, timeout=1)
+
+        with pytest.raises(HTTPException) as e:
+            async with budget.reserve(1, timeout=0.01):
+                pass
+        assert e.value.status_code == 503
+        assert "Retry-After" in e.value.headers  # type: ignore
+
+        # ожидание по таймауту не оставляет записей в очереди
+        budget.release(10)
+        assert budget.used == 0
+        async with budget.reserve(10, timeout=0.01):
+            assert budget.used == 10
+
+    @pytest.mark.asyncio
+    async def test_release_between_timeout_and_resume(self, monkeypatch):
+        """Если бюджет освобождается после отмены ожидания по таймауту,
+        но до возобновления задачи, клиент все равно получает 503"""
+        budget = ByteBudget(10)
+        await budget.acquire(10, timeout=1)
+
+        async def wait_for(waiter, timeout):
+            waiter.cancel()
+            budget.release(10)  # _wake снимает отмененное ожидание
+            raise TimeoutError
+
+        monkeypatch.setattr(admission.asyncio, "wait_for", wait_for)
+        with pytest.raises(HTTPException) as e:
+            async with budget.reserve(5, timeout=0.01):
+                pass
+        assert e.value.status_code == 503
+        assert budget.used == 0
+        assert not budget._waiters
+
+
+class TestWriteFilesOnDisc:
+    """Тесты параллельной записи файлов загрузки"""
+
+    @pytest.mark.asyncio
+    async def test_files_are_written(self, tmp_path):
+        files = [
+            UploadFile(
+                file=io.BytesIO(bytes([i]) * 1000), filename=f"{i}.jpg", size=1000
+            )
+            for i in range(10)
+        ]
+        await pictures.write_files_on_disc(tmp_path, files)
+
+        for i in range(10):
+            assert (tmp_path / f"{i}.jpg").read_bytes() == bytes([i]) * 1000
+
+    @pytest.mark.asyncio
+    async def test_written_files_are_removed_on_503(self, tmp_path, monkeypatch):
+        budget = ByteBudget(100)
+        monkeypatch.setattr(pictures, "upload_write_budget", budget)
+        monkeypatch.setattr(pictures.settings.uploads, "admission_timeout", 0.01)
+        await budget.acquire(100, timeout=1)
+
+        files = [jpeg_upload("1.jpg", 2, 2)]
+        with pytest.raises(HTTPException) as e:
+            await pictures.write_files_on_disc(tmp_path, files)
+
+        assert e.value.status_code == 503
+        assert not (tmp_path / "1.jpg").exists()
+
+
+class TestDecodeAdmission:
+    """Тесты допуска загрузок по оценке памяти декодирования"""
+
+    def test_estimate_from_header(self):
+        file = jpeg_upload("1.jpg", 40, 30)
+        file.file.seek(5)
+
+        assert estimate_decode_bytes(file) == 40 * 30 * 3 * 2
+        # позиция файла не меняется
+        assert file.file.tell() == 5
+
+    def test_unreadable_file_is_not_counted(self):
+        file = UploadFile(file=io.BytesIO(b"not an image"), filename="1.jpg")
+        assert estimate_decode_bytes(file) == 0
+
+    def test_too_many_pixels(self, monkeypatch):
+        monkeypatch.setattr(admission.settings.uploads, "max_image_pixels", 100)
+
+        with pytest.raises(HTTPException) as e:
+            estimate_decode_bytes(jpeg_upload("1.jpg", 20, 20))
+        assert e.value.status_code == 413
+
+    @pytest.mark.asyncio
+    async def test_largest_image_is_reserved(self, monkeypatch):
+        budget = ByteBudget(10_000)
+        monkeypatch.setattr(admission, "decode_memory_budget", budget)
+        files = [jpeg_upload("1.jpg", 10, 10), jpeg_upload("2.jpg", 20, 10)]
+
+        async with admit_upload(files):
+            assert budget.used == 20 * 10 * 3 * 2
+        assert budget.used == 0
+
+    @pytest.mark.asyncio
+    async def test_image_over_budget_is_rejected(self, monkeypatch):
+        monkeypatch.setattr(admission, "decode_memory_budget", ByteBudget(100))
+
+        with pytest.raises(HTTPException) as e:
+            async with admit_upload([jpeg_upload("1.jpg", 10, 10)]):
+                pass
+        assert e.value.status_code == 413
@@ -0,0 +1,127 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import Auth, settings
+from core.models import User
+from core.redis_helper import redis_helper
+from utils.authorization import (
+    create_access_token,
+    get_current_user,
+    hash_password,
+    invalidate_cached_user,
+    password_hashing_stats,
+    verify_password_async,
+)
+from utils.principal_cache import PrincipalCache, principal_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_principal_cache():
+    principal_cache.clear()
+    yield
+    principal_cache.clear()
+
+
+class TestGetCurrentUserCache:
+    """Тесты кеширования пользователя в get_current_user"""
+
+    @pytest.mark.asyncio
+    async def test_cached_user_does_not_query_db(self, db: AsyncSession):
+        """Повторная проверка того же токена не обращается к базе данных"""
+        user = User(id=7, username="admin", hashed_password="fakehash")
+        db.add(user)
+        await db.commit()
+        token = create_access_token(data={"sub": "admin", "id": 7})
+
+        assert (await get_current_user(token, db)).id == 7
+
+        # пользователь удален из базы, но еще находится в кеше
+        await db.delete(user)
+        await db.commit()
+        cached_user = await get_current_user(token, db)
+        assert (cached_user.id, cached_user.username) == (7, "admin")
+
+        await invalidate_cached_user(7)
+        with pytest.raises(HTTPException) as exc_info:
+            await get_current_user(token, db)
+        assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestPrincipalCache:
+    """Тесты кеша пользователей в памяти процесса"""
+
+    @pytest.mark.asyncio
+    async def test_expired_entry_is_not_returned(self):
+        cache = PrincipalCache(ttl=0, max_size=10)
+        await cache.set(1, 100, {"id": 1, "username": "admin"})
+
+        assert await cache.get(1, 100) is None
+
+    @pytest.mark.asyncio
+    async def test_least_recently_used_entry_is_evicted(self):
+        cache = PrincipalCache(ttl=60, max_size=2)
+        await cache.set(1, 100, {"id": 1, "username": "first"})
+        await cache.set(2, 100, {"id": 2, "username": "second"})
+        await cache.get(1, 100)
+        await cache.set(3, 100, {"id": 3, "username": "third"})
+
+        assert await cache.get(2, 100) is None
+        assert await cache.get(1, 100) == {"id": 1, "username": "first"}
+
+    @pytest.mark.asyncio
+    async def test_redis_errors_are_not_raised(self, monkeypatch):
+        """Недоступность Redis не превращает чтение, запись и сброс в 500"""
+        redis_client = AsyncMock()
+        redis_client.hget.side_effect = ConnectionError
+        redis_client.delete.side_effect = ConnectionError
+        redis_client.pipeline = Mock(side_effect=ConnectionError)
+        monkeypatch.setattr(redis_helper, "_client", redis_client)
+        cache = PrincipalCache(ttl=60, max_size=10, use_redis=True)
+
+        await cache.set(1, 100, {"id": 1, "username": "admin"})
+        await cache.invalidate(1)
+
+        assert await cache.get(1, 100) is None
+
+    def test_ttl_is_capped(self):
+        """Сбросить запись некому, поэтому время жизни ограничено"""
+        with pytest.raises(ValidationError):
+            Auth(principal_cache_ttl=3600)
+
+
+class TestVerifyPasswordAsync:
+    """Тесты проверки пароля в пуле потоков"""
+
+    @pytest.mark.asyncio
+    async def test_verify_password_async(self):
+        hashed = hash_password("secret")
+        count_before = password_hashing_stats.count
+
+        assert await verify_password_async("secret", hashed) is True
+        assert await verify_password_async("wrong", hashed) is False
+        assert password_hashing_stats.count == count_before + 2
+
+    @pytest.mark.asyncio
+    async def test_full_queue_is_rejected(self, monkeypatch):
+        """Проверки сверх потоков и очереди пула сразу получают 503"""
+        monkeypatch.setattr(settings.auth, "password_hashing_workers", 1)
+        monkeypatch.setattr(settings.auth, "password_hashing_queue_size", 0)
+        hashed = hash_password("secret")
+        rejected_before = password_hashing_stats.rejected
+
+        results = await asyncio.gather(
+            verify_password_async("secret", hashed),
+            verify_password_async("secret", hashed),
+            return_exceptions=True,
+        )
+
+        assert results[0] is True
+        assert isinstance(results[1], HTTPException)
+        assert results[1].status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert password_hashing_stats.rejected == rejected_before + 1
+        assert password_hashing_stats.pending == 0
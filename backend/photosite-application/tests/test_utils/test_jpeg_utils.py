@@ -0,0 +1,79 @@
+import io
+
+import pytest
+from httpx import AsyncClient
+from PIL import Image
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.models import Event
+from tests.test_api.utils import create_test_category, make_jpeg_bytes
+from utils.jpeg import InvalidJpegError, read_jpeg_header
+
+
+def jpeg_bytes(mode: str = "RGB", **options) -> bytes:
+    buffer = io.BytesIO()
+    Image.new(mode, (40, 30)).save(buffer, "JPEG", **options)
+    return buffer.getvalue()
+
+
+class TestReadJpegHeader:
+    """Тесты разбора заголовка JPEG"""
+
+    def test_baseline(self):
+        header = read_jpeg_header(io.BytesIO(jpeg_bytes()))
+        assert (header.width, header.height, header.components) == (40, 30, 3)
+        assert not header.progressive
+
+    def test_grayscale_progressive_with_exif(self):
+        exif = Image.Exif()
+        exif[0x010F] = "camera" * 1000  # Make, длинный сегмент APP1
+        data = jpeg_bytes("L", progressive=True, exif=exif.tobytes())
+
+        header = read_jpeg_header(io.BytesIO(data))
+        assert (header.width, header.height, header.components) == (40, 30, 1)
+        assert header.progressive
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            b"",
+            b"fake image content",
+            b"GIF89a" + b"\0" * 100,
+            jpeg_bytes()[:20],
+            # SOS без кадра SOF
+            b"\xff\xd8\xff\xda\x00\x02",
+        ],
+    )
+    def test_invalid(self, data: bytes):
+        with pytest.raises(InvalidJpegError):
+            read_jpeg_header(io.BytesIO(data))
+
+
+class TestUploadValidation:
+    """Файлы, не являющиеся JPEG, отклоняются до записи и создания съемки"""
+
+    @pytest.mark.asyncio
+    async def test_upload_with_invalid_file(
+        self,
+        authenticated_client: AsyncClient,
+        db: AsyncSession,
+        mock_settings,
+    ):
+        await create_test_category(db, "wedding")
+
+        response = await authenticated_client.post(
+            "/api/v1/pictures",
+            data={"category": "wedding", "date": "2024-05-20"},
+            files=[
+                ("files", ("123.jpg", make_jpeg_bytes(), "image/jpeg")),
+                ("files", ("456.jpg", b"fake image content", "image/jpeg")),
+                ("event_cover", ("300.jpg", make_jpeg_bytes(), "image/jpeg")),
+            ],
+        )
+
+        assert response.status_code == 400
+        assert "456.jpg" in response.json()["detail"]
+        assert await db.scalar(select(func.count(Event.id))) == 0
+        date_dir = mock_settings.static.image_dir / "wedding" / "2024-05-20"
+        assert not (date_dir / "123.jpg").exists()
@@ -0,0 +1,63 @@
+import logging
+import queue
+
+import orjson
+
+from logging_config import DroppingQueueHandler, JsonFormatter, SuccessSampleFilter
+
+
+def make_record(message: str, **extra) -> logging.LogRecord:
+    record = logging.makeLogRecord(
+        {"name": "test", "levelno": logging.INFO, "levelname": "INFO", "msg": message}
+    )
+    record.__dict__.update(extra)
+    return record
+
+
+class TestJsonFormatter:
+    """Тесты форматирования записей лога в JSON"""
+
+    def test_message_with_quotes_is_valid_json(self):
+        record = make_record('Съемка "Свадьба"', status_code=200)
+
+        data = orjson.loads(JsonFormatter().format(record))
+
+        assert data["message"] == 'Съемка "Свадьба"'
+        assert data["status_code"] == 200
+        assert data["level"] == "INFO"
+
+
+class TestSuccessSampleFilter:
+    """Тесты выборочного логирования успешных запросов"""
+
+    def test_errors_are_always_kept(self):
+        sample_filter = SuccessSampleFilter(0, {})
+
+        assert sample_filter.filter(make_record("ok", status_code=500))
+        assert sample_filter.filter(make_record("no status"))
+        assert not sample_filter.filter(make_record("ok", status_code=200))
+
+    def test_route_rate_overrides_default(self):
+        sample_filter = SuccessSampleFilter(0, {"/api/v1/events/{category}": 1})
+
+        assert sample_filter.filter(
+            make_record("ok", status_code=200, route="/api/v1/events/{category}")
+        )
+
+
+class TestDroppingQueueHandler:
+    """Тесты очереди логов с отбрасыванием записей"""
+
+    def test_records_are_dropped_when_queue_is_full(self):
+        handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+
+        handler.handle(make_record("first"))
+        handler.handle(make_record("second"))
+        handler.handle(make_record("third"))
+        assert handler.dropped == 2
+
+        assert handler.queue.get_nowait().getMessage() == "first"
+        handler.handle(make_record("fourth"))
+        # освободившееся место занимает запись о пропуске
+        assert handler.queue.get_nowait().dropped == 2
+        assert handler.dropped == 3
@@ -0,0 +1,79 @@
+import pytest
+from httpx import AsyncClient
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.models.db_helper import DatabaseHelper
+from tests.test_api.utils import create_test_event
+from utils.authorization import hash_password, verify_password_async
+from utils.metrics import instrument_engine
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetrics:
+    """Тесты метрик Prometheus"""
+
+    @pytest.mark.asyncio
+    async def test_route_and_cache_metrics(self, client: AsyncClient, db: AsyncSession):
+        await create_test_event(db, "wedding", "2024-05-25")
+        route = "/api/v1/events/{category}"
+        requests_before = sample(
+            "http_request_duration_seconds_count",
+            method="GET",
+            route=route,
+            status="200",
+        )
+        hits_before = sample("response_cache_requests_total", route=route, result="HIT")
+
+        await client.get("/api/v1/events/wedding")
+        await client.get("/api/v1/events/wedding")
+
+        assert (
+            sample(
+                "http_request_duration_seconds_count",
+                method="GET",
+                route=route,
+                status="200",
+            )
+            == requests_before + 2
+        )
+        assert (
+            sample("response_cache_requests_total", route=route, result="HIT")
+            == hits_before + 1
+        )
+
+        response = await client.get("/metrics")
+        assert response.status_code == 200
+        assert "response_cache_requests_total" in response.text
+
+    @pytest.mark.asyncio
+    async def test_pool_metrics(self, tmp_path):
+        helper = DatabaseHelper(
+            url=f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", pool_size=3
+        )
+        instrument_engine(helper.engine, "test")
+        try:
+            async with helper.engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+                assert sample("db_pool_checked_out", engine="test") == 1
+                assert sample("db_pool_size", engine="test") == 3
+            assert sample("db_pool_checked_out", engine="test") == 0
+            assert sample("db_pool_wait_seconds_count", engine="test") == 1
+        finally:
+            await helper.dispose()
+
+    @pytest.mark.asyncio
+    async def test_password_hashing_metrics(self, client: AsyncClient):
+        """Ожидание проверки пароля в очереди пула попадает в /metrics"""
+        count_before = sample("password_hashing_queue_seconds_count")
+
+        await verify_password_async("secret", hash_password("secret"))
+
+        assert sample("password_hashing_queue_seconds_count") == count_before + 1
+        assert sample("password_hashing_pending") == 0
+        response = await client.get("/metrics")
+        assert "password_hashing_queue_seconds_bucket" in response.text
@@ -0,0 +1,49 @@
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from httpx import ASGITransport, AsyncClient
+
+from utils.middleware import RequestMiddleware
+
+
+@pytest.fixture
+def app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/cached")
+    async def cached():
+        return Response(content=b"{}", headers={"Cache-Control": "max-age=604800"})
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for chunk in (b"first ", b"second"):
+                yield chunk
+
+        return StreamingResponse(chunks(), headers={"Cache-Control": "max-age=10"})
+
+    app.add_middleware(RequestMiddleware, max_age_maximum=60)
+    return app
+
+
+class TestRequestMiddleware:
+    """Тесты ASGI-middleware запросов"""
+
+    @pytest.mark.asyncio
+    async def test_max_age_is_clamped(self, app: FastAPI):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            response = await client.get("/cached")
+
+        assert response.headers["cache-control"] == "max-age=60"
+
+    @pytest.mark.asyncio
+    async def test_streaming_response_passes_through(self, app: FastAPI):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            response = await client.get("/stream")
+
+        assert response.content == b"first second"
+        assert response.headers["cache-control"] == "max-age=10"
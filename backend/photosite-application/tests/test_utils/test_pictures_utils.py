@@ -1,5 +1,16 @@
+import base64
+import io
+from datetime import datetime
+
 import pytest
-from utils.pictures import check_file_name, check_file_names
+from PIL import Image
+
+from utils.pictures import (
+    check_file_name,
+    check_file_names,
+    make_placeholder,
+    read_picture_metadata,
+)
 
 
 class TestCheckFileName:
@@ -24,3 +35,62 @@ class TestCheckFileName:
         для различных входных данных.
         """
         assert check_file_name(filename) == expected
+
+
+def image_with_exif(exif: Image.Exif) -> Image.Image:
+    buffer = io.BytesIO()
+    Image.new("RGB", (40, 30)).save(buffer, "JPEG", exif=exif.tobytes())
+    buffer.seek(0)
+    return Image.open(buffer)
+
+
+class TestReadPictureMetadata:
+    """Тесты чтения размеров, ориентации и времени съемки"""
+
+    def test_without_exif(self):
+        metadata = read_picture_metadata(image_with_exif(Image.Exif()))
+        assert metadata == (40, 30, None, None, None)
+
+    @pytest.mark.parametrize("orientation, size", [(3, (40, 30)), (6, (30, 40))])
+    def test_orientation_swaps_size(self, orientation, size):
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        metadata = read_picture_metadata(image_with_exif(exif))
+        assert (metadata.width, metadata.height) == size
+        assert metadata.orientation == orientation
+
+    def test_taken_at_prefers_datetime_original(self):
+        exif = Image.Exif()
+        exif[0x0132] = "2020:01:01 00:00:00"
+        exif.get_ifd(0x8769)[0x9003] = "2024:05:20 10:30:00"
+        metadata = read_picture_metadata(image_with_exif(exif))
+        assert metadata.taken_at == datetime(2024, 5, 20, 10, 30)
+
+    def test_invalid_values_are_ignored(self):
+        exif = Image.Exif()
+        exif[0x0112] = 42
+        exif[0x0132] = "0000:00:00 00:00:00"
+        assert read_picture_metadata(image_with_exif(exif)) == (
+            40,
+            30,
+            None,
+            None,
+            None,
+        )
+
+
+class TestMakePlaceholder:
+    """Тесты заглушки LQIP"""
+
+    @pytest.mark.parametrize("mode", ["RGB", "L", "CMYK"])
+    def test_placeholder_is_small_webp(self, mode):
+        placeholder = make_placeholder(Image.new(mode, (640, 800)))
+
+        prefix = "data:image/webp;base64,"
+        assert placeholder.startswith(prefix)
+        assert len(placeholder) < 500
+        with Image.open(
+            io.BytesIO(base64.b64decode(placeholder[len(prefix) :]))
+        ) as img:
+            assert img.format == "WEBP"
+            assert img.size == (16, 20)
@@ -0,0 +1,62 @@
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from utils.profiling import REPORT_HEADER, ProfilingMiddleware
+
+
+def make_app(sample_rate: float, reports_dir) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/gallery")
+    async def gallery():
+        return {"pictures": list(range(100))}
+
+    app.add_middleware(
+        ProfilingMiddleware, sample_rate=sample_rate, reports_dir=reports_dir
+    )
+    return app
+
+
+async def get(app: FastAPI, url: str, **kwargs):
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        return await client.get(url, **kwargs)
+
+
+class TestProfilingMiddleware:
+    """Тесты профилирования запросов"""
+
+    @pytest.mark.asyncio
+    async def test_admin_request_is_profiled(self, tmp_path, monkeypatch):
+        async def is_admin(scope):
+            return True
+
+        monkeypatch.setattr(ProfilingMiddleware, "is_admin", staticmethod(is_admin))
+        app = make_app(0, tmp_path)
+
+        response = await get(app, "/gallery", headers={"X-Profile": "1"})
+
+        report_name = response.headers[REPORT_HEADER]
+        assert (tmp_path / f"{report_name}.prof").exists()
+        assert "GET /gallery" in (tmp_path / f"{report_name}.txt").read_text()
+
+    @pytest.mark.asyncio
+    async def test_flag_without_admin_is_ignored(self, tmp_path):
+        app = make_app(0, tmp_path)
+
+        response = await get(app, "/gallery?profile=1")
+
+        assert response.status_code == 200
+        assert REPORT_HEADER not in response.headers
+        assert list(tmp_path.iterdir()) == []
+
+    @pytest.mark.asyncio
+    async def test_sampled_request_is_stored_without_header(self, tmp_path):
+        app = make_app(1, tmp_path)
+
+        response = await get(app, "/gallery")
+
+        assert REPORT_HEADER not in response.headers
+        assert len(list(tmp_path.glob("*.prof"))) == 1
@@ -0,0 +1,99 @@
+import logging
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from utils import slow_queries
+from utils.slow_queries import SKIP_OPTION, SlowQueryLog, fingerprint
+
+
+class RecordsHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records: list[logging.LogRecord] = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def slow_records():
+    handler = RecordsHandler()
+    slow_logger = logging.getLogger("sql.slow")
+    slow_logger.addHandler(handler)
+    yield handler.records
+    slow_logger.removeHandler(handler)
+
+
+class TestSlowQueryLog:
+    """Тесты журнала медленных запросов"""
+
+    @pytest.mark.asyncio
+    async def test_slow_query_is_logged(self, tmp_path, slow_records):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'slow.db'}")
+        slow_query_log = SlowQueryLog(
+            engine,
+            threshold=0,
+            explain=True,
+            explain_interval=600,
+            max_parameters_length=1000,
+        )
+        observed_before = (
+            REGISTRY.get_sample_value(
+                "db_slow_query_duration_seconds_count", {"operation": "SELECT"}
+            )
+            or 0
+        )
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT :value"), {"value": 42})
+                skipped = await conn.execution_options(**{SKIP_OPTION: True})
+                await skipped.execute(text("SELECT 1"))
+        finally:
+            await engine.dispose()
+
+        # EXPLAIN ANALYZE выполняется только на PostgreSQL
+        assert slow_query_log.explain is False
+        assert [record.statement for record in slow_records] == ["SELECT ?"]
+        assert "42" in slow_records[0].parameters
+        assert (
+            REGISTRY.get_sample_value(
+                "db_slow_query_duration_seconds_count", {"operation": "SELECT"}
+            )
+            == observed_before + 1
+        )
+
+
+class TestExplainMemory:
+    """Отпечатки запросов для explain_interval не накапливаются"""
+
+    def test_fingerprint_ignores_values(self):
+        assert fingerprint(
+            "SELECT a FROM t WHERE id IN ($1::INTEGER, $2::INTEGER) AND n = 'x'"
+        ) == fingerprint(
+            "SELECT a FROM t\nWHERE id IN ($1::INTEGER, $2::INTEGER, $3::INTEGER)"
+            " AND n = 'it''s'"
+        )
+        assert fingerprint("SELECT a FROM t1 LIMIT 10") == "SELECT a FROM t1 LIMIT ?"
+
+    @pytest.mark.asyncio
+    async def test_expired_and_excess_entries_are_removed(self, monkeypatch):
+        engine = create_async_engine("sqlite+aiosqlite://")
+        slow_query_log = SlowQueryLog(
+            engine,
+            threshold=0,
+            explain=False,
+            explain_interval=10,
+            max_parameters_length=1000,
+        )
+        monkeypatch.setattr(slow_queries, "MAX_EXPLAINED_STATEMENTS", 3)
+
+        for i in range(5):
+            slow_query_log.remember_explain(f"q{i}", now=i)
+        assert list(slow_query_log._explained_at) == ["q2", "q3", "q4"]
+
+        slow_query_log.remember_explain("q5", now=13.5)
+        assert list(slow_query_log._explained_at) == ["q4", "q5"]
+        await engine.dispose()
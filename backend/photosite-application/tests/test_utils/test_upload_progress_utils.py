@@ -0,0 +1,192 @@
+import orjson
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.redis_helper import redis_helper
+from tests.test_api.utils import create_test_category, get_valid_upload_files
+from utils import admission
+from utils.admission import ByteBudget
+from utils.upload_progress import (
+    FILE_STAGES,
+    UploadProgress,
+    channel_key,
+    progress_events,
+)
+
+
+class FakePubSub:
+    def __init__(self, redis: "FakeRedis"):
+        self.redis = redis
+
+    async def subscribe(self, channel):
+        self.channel = channel
+
+    async def get_message(self, ignore_subscribe_messages, timeout):
+        messages = self.redis.published.get(self.channel, [])
+        if not messages:
+            return None
+        return {"type": "message", "data": messages.pop(0)}
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeRedis:
+    """Хеши и pub/sub Redis в памяти"""
+
+    def __init__(self):
+        self.hashes: dict[str, dict[bytes, bytes]] = {}
+        self.published: dict[str, list[bytes]] = {}
+
+    async def hincrby(self, key, field, amount):
+        fields = self.hashes.setdefault(key, {})
+        fields[field.encode()] = str(
+            int(fields.get(field.encode(), 0)) + amount
+        ).encode()
+
+    async def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(
+            {k.encode(): str(v).encode() for k, v in mapping.items()}
+        )
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def expire(self, key, seconds):
+        pass
+
+    async def publish(self, channel, message):
+        self.published.setdefault(channel, []).append(message)
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+
+class FakeRequest:
+    async def is_disconnected(self):
+        return False
+
+
+@pytest.fixture
+def fake_redis(monkeypatch) -> FakeRedis:
+    redis = FakeRedis()
+    monkeypatch.setattr(redis_helper, "_client", redis)
+    return redis
+
+
+class TestUploadProgress:
+    """Тесты публикации прогресса загрузки"""
+
+    @pytest.mark.asyncio
+    async def test_upload_publishes_file_stages(
+        self,
+        authenticated_client: AsyncClient,
+        db: AsyncSession,
+        fake_redis: FakeRedis,
+    ):
+        """Для каждого файла публикуются все этапы по порядку, затем done"""
+        await create_test_category(db, "wedding")
+        files = await get_valid_upload_files(["123.jpg", "456.jpeg"])
+        cover = (await get_valid_upload_files(["300.jpg"]))[0]
+
+        response = await authenticated_client.post(
+            "/api/v1/pictures",
+            data={"category": "wedding", "date": "2024-05-20"},
+            files=[("files", (f.filename, f.file, "image/jpeg")) for f in files]
+            + [("event_cover", (cover.filename, cover.file, "image/jpeg"))],
+            headers={"X-Upload-Id": "upload-1"},
+        )
+        assert response.status_code == 201
+
+        events = [
+            orjson.loads(m) for m in fake_redis.published[channel_key("upload-1")]
+        ]
+        assert events[0] == {"stage": "started", "total": 2}
+        assert events[-1] == {"stage": "done"}
+        for filename in ("123.jpg", "456.jpeg"):
+            stages = [e["stage"] for e in events if e.get("file") == filename]
+            assert stages == list(FILE_STAGES)
+
+    @pytest.mark.asyncio
+    async def test_failed_upload_publishes_detail(
+        self,
+        authenticated_client: AsyncClient,
+        fake_redis: FakeRedis,
+    ):
+        files = await get_valid_upload_files(["123.jpg"])
+
+        response = await authenticated_client.patch(
+            "/api/v1/events/wedding/2024-05-20/pictures",
+            files=[("files", (f.filename, f.file, "image/jpeg")) for f in files],
+            headers={"X-Upload-Id": "upload-2"},
+        )
+        assert response.status_code == 404
+
+        events = [
+            orjson.loads(m) for m in fake_redis.published[channel_key("upload-2")]
+        ]
+        assert events == [{"stage": "failed", "detail": response.json()["detail"]}]
+
+    @pytest.mark.asyncio
+    async def test_rejected_admission_publishes_failure(
+        self,
+        authenticated_client: AsyncClient,
+        db: AsyncSession,
+        fake_redis: FakeRedis,
+        monkeypatch,
+    ):
+        """Отказ допуска по памяти декодирования (413) завершает поток
+        событий загрузки, а не оставляет подписчика ждать"""
+        monkeypatch.setattr(admission, "decode_memory_budget", ByteBudget(1))
+        await create_test_category(db, "wedding")
+        files = await get_valid_upload_files(["123.jpg"])
+        cover = (await get_valid_upload_files(["300.jpg"]))[0]
+
+        response = await authenticated_client.post(
+            "/api/v1/pictures",
+            data={"category": "wedding", "date": "2024-05-20"},
+            files=[("files", (f.filename, f.file, "image/jpeg")) for f in files]
+            + [("event_cover", (cover.filename, cover.file, "image/jpeg"))],
+            headers={"X-Upload-Id": "upload-4"},
+        )
+        assert response.status_code == 413
+
+        events = [
+            orjson.loads(m) for m in fake_redis.published[channel_key("upload-4")]
+        ]
+        assert events == [{"stage": "failed", "detail": response.json()["detail"]}]
+
+    @pytest.mark.asyncio
+    async def test_invalid_upload_id(self, authenticated_client: AsyncClient):
+        response = await authenticated_client.patch(
+            "/api/v1/events/wedding/2024-05-20/pictures",
+            files=[("files", ("123.jpg", b"data", "image/jpeg"))],
+            headers={"X-Upload-Id": "a:b"},
+        )
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_progress_events_stream(self, fake_redis: FakeRedis):
+        """Поток начинается со snapshot и закрывается после done"""
+        progress = UploadProgress("upload-3")
+        await progress.start(1)
+        await progress.file_stage("received", "123.jpg")
+
+        stream = progress_events(FakeRequest(), "upload-3", keepalive=0)  # type: ignore
+        first = await anext(stream)
+        assert first.startswith(b"event: snapshot\n")
+        snapshot = orjson.loads(first.split(b"data: ")[1])
+        assert snapshot["total"] == 1 and snapshot["received"] == 1
+
+        async with progress:
+            pass
+        chunks = [chunk async for chunk in stream]
+        assert chunks[0].startswith(b"event: progress\n")
+        assert chunks[-1].startswith(b"event: done\n")
+
+    @pytest.mark.asyncio
+    async def test_without_upload_id_nothing_is_published(self, fake_redis: FakeRedis):
+        async with UploadProgress(None) as progress:
+            await progress.start(1)
+        assert fake_redis.published == {}
@@ -0,0 +1,28 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from tests.test_api.utils import create_test_event
+from utils.warmup import compile_hot_statements, prewarm_response_cache
+
+
+class TestWarmup:
+    """Тесты прогрева воркера"""
+
+    @pytest.mark.asyncio
+    async def test_compile_hot_statements(self, db: AsyncSession):
+        """Запросы прогрева выполняются и на пустой базе"""
+        await compile_hot_statements(db)
+
+    @pytest.mark.asyncio
+    async def test_prewarmed_response_is_served_from_cache(
+        self, client: AsyncClient, db: AsyncSession
+    ):
+        """Ключи кеша прогрева совпадают с ключами настоящих запросов"""
+        await create_test_event(db, "wedding", "2024-05-25")
+        await prewarm_response_cache(db)
+
+        for url in ("/api/v1/events/wedding", "/api/v1/events/latest"):
+            response = await client.get(url)
+            assert response.status_code == 200
+            assert response.headers["x-fastapi-cache"] == "HIT"
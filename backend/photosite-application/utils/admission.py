@@ -0,0 +1,138 @@
+import asyncio
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException, UploadFile, status
+from PIL import Image
+
+from core.config import settings
+from utils.jpeg import InvalidJpegError, read_jpeg_header
+
+# Pillow предупреждает о больших изображениях с 89 Мп и отказывается
+# открывать вдвое большие; предел задается настройкой и до декодирования
+# проверяется по заголовку в estimate_decode_bytes
+Image.MAX_IMAGE_PIXELS = settings.uploads.max_image_pixels
+
+
+class ByteBudget:
+    """Ограничение суммарного объема одновременно обрабатываемых данных
+    в воркере. Запросы обслуживаются по очереди: пока первый ожидающий
+    не помещается в бюджет, следующие тоже ждут, чтобы большие файлы
+    не ждали бесконечно. Запрос больше всего бюджета занимает его целиком
+    и выполняется один."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.used = 0
+        self._waiters: deque[tuple[int, asyncio.Future]] = deque()
+
+    async def acquire(self, amount: int, timeout: float) -> int:
+        """Занимает amount байт, ожидая не дольше timeout секунд
+        (TimeoutError). Возвращает фактически занятый объем для release."""
+        amount = min(amount, self.limit)
+        if not self._waiters and self.used + amount <= self.limit:
+            self.used += amount
+            return amount
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append((amount, waiter))
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # бюджет выделен одновременно с отменой ожидания
+                self.release(amount)
+            else:
+                # отмененное ожидание могло быть уже снято из очереди в _wake,
+                # если бюджет освобождался до возобновления этой задачи
+                try:
+                    self._waiters.remove((amount, waiter))
+                except ValueError:
+                    pass
+                self._wake()
+            raise
+        return amount
+
+    def release(self, amount: int) -> None:
+        self.used -= amount
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters:
+            amount, waiter = self._waiters[0]
+            if waiter.cancelled():
+                self._waiters.popleft()
+                continue
+            if self.used + amount > self.limit:
+                break
+            self._waiters.popleft()
+            self.used += amount
+            waiter.set_result(None)
+
+    @asynccontextmanager
+    async def reserve(self, amount: int, timeout: float) -> AsyncIterator[None]:
+        """Занимает бюджет на время блока. Если он не освободился за timeout
+        секунд, запрос получает 503 с Retry-After, а не ждет бесконечно."""
+        try:
+            acquired = await self.acquire(amount, timeout)
+        except TimeoutError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервер занят обработкой других загрузок, повторите позже",
+                headers={"Retry-After": str(max(1, int(timeout)))},
+            )
+        try:
+            yield
+        finally:
+            self.release(acquired)
+
+
+# объем файлов загрузок, одновременно записываемых на диск воркером
+upload_write_budget = ByteBudget(settings.uploads.max_inflight_bytes)
+# память под декодированные изображения, одновременно занятая воркером
+decode_memory_budget = ByteBudget(settings.uploads.decode_memory_budget)
+
+
+def estimate_decode_bytes(file: UploadFile) -> int:
+    """Оценивает память для создания превью по заголовку JPEG (utils.jpeg),
+    не декодируя пиксели. Учитываются исходное изображение и его обрезанная
+    копия. Файлы, заголовок которых не читается, не учитываются: они
+    отклоняются проверкой содержимого (check_jpeg_files)."""
+    position = file.file.tell()
+    try:
+        file.file.seek(0)
+        header = read_jpeg_header(file.file)
+    except InvalidJpegError:
+        return 0
+    finally:
+        file.file.seek(position)
+
+    pixels = header.width * header.height
+    if pixels > settings.uploads.max_image_pixels:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail=f"Слишком большое изображение: {file.filename}",
+        )
+    return pixels * header.components * 2
+
+
+@asynccontextmanager
+async def admit_upload(files: list[UploadFile]) -> AsyncIterator[None]:
+    """Пропускает загрузку к созданию превью, когда в бюджете
+    decode_memory_budget есть место для самого большого ее изображения
+    (превью создаются по одному). Загрузка, не дождавшаяся места за
+    admission_timeout секунд, получает 503, изображение больше всего
+    бюджета - 413, поэтому одновременные загрузки не выводят воркер
+    за предел памяти."""
+    estimates = await asyncio.to_thread(
+        lambda: [estimate_decode_bytes(file) for file in files]
+    )
+    peak = max(estimates, default=0)
+    if peak > decode_memory_budget.limit:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail="Для обработки изображения недостаточно памяти",
+        )
+    async with decode_memory_budget.reserve(peak, settings.uploads.admission_timeout):
+        yield
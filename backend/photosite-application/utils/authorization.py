@@ -1,4 +1,9 @@
-from typing import Annotated
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections.abc import Callable
+from typing import Annotated, Any, TypeVar
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime, timedelta, timezone
@@ -11,7 +16,21 @@ from core.config import settings
 from core.models.db_helper import db_helper
 from core.models import User
 
-from exceptions.user import credential_exception, token_expire_exception
+from exceptions.user import (
+    credential_exception,
+    password_hashing_busy_exception,
+    token_expire_exception,
+)
+from utils.metrics import (
+    PASSWORD_HASHING_PENDING,
+    PASSWORD_HASHING_QUEUE_SECONDS,
+    PASSWORD_HASHING_REJECTED,
+)
+from utils.principal_cache import principal_cache
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
 
 pwd_context = CryptContext(
     schemes=["bcrypt"],
@@ -23,6 +42,36 @@ oauth2_scheme = OAuth2PasswordBearer(
 )
 
 
+# bcrypt намеренно медленный (сотни миллисекунд CPU), поэтому хеширование
+# выполняется в отдельном ограниченном пуле потоков, а не в цикле событий
+password_hashing_executor = ThreadPoolExecutor(
+    max_workers=settings.auth.password_hashing_workers,
+    thread_name_prefix="password-hashing",
+)
+
+
+class PasswordHashingStats:
+    """Статистика ожидания задач хеширования в очереди пула потоков.
+    Замеры дублируются в метрики Prometheus (utils.metrics)."""
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.queue_seconds_total: float = 0.0
+        self.queue_seconds_max: float = 0.0
+        # задачи, выполняемые и ждущие в очереди пула
+        self.pending: int = 0
+        self.rejected: int = 0
+
+    def observe(self, queue_seconds: float) -> None:
+        self.count += 1
+        self.queue_seconds_total += queue_seconds
+        self.queue_seconds_max = max(self.queue_seconds_max, queue_seconds)
+        PASSWORD_HASHING_QUEUE_SECONDS.observe(queue_seconds)
+
+
+password_hashing_stats = PasswordHashingStats()
+
+
 def hash_password(password: str) -> str:
     """Преобразует пароль в хеш с помощью bcrypt"""
     return pwd_context.hash(password)
@@ -36,13 +85,66 @@ def verify_password(
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def run_password_hashing(func: Callable[..., T], *args: Any) -> T:
+    """Выполняет функцию хеширования в пуле password_hashing_executor.
+    Число одновременных вычислений ограничено размером пула, остальные
+    ждут в очереди; время ожидания учитывается в password_hashing_stats.
+    Очередь ограничена password_hashing_queue_size задачами: при всплеске
+    входов лишние запросы сразу получают 503, а не копятся без предела."""
+    limit = (
+        settings.auth.password_hashing_workers
+        + settings.auth.password_hashing_queue_size
+    )
+    if password_hashing_stats.pending >= limit:
+        password_hashing_stats.rejected += 1
+        PASSWORD_HASHING_REJECTED.inc()
+        raise password_hashing_busy_exception
+
+    submitted = time.perf_counter()
+
+    def job() -> tuple[T, float]:
+        queue_seconds = time.perf_counter() - submitted
+        return func(*args), queue_seconds
+
+    password_hashing_stats.pending += 1
+    PASSWORD_HASHING_PENDING.inc()
+    try:
+        result, queue_seconds = await asyncio.get_running_loop().run_in_executor(
+            password_hashing_executor, job
+        )
+    finally:
+        password_hashing_stats.pending -= 1
+        PASSWORD_HASHING_PENDING.dec()
+    password_hashing_stats.observe(queue_seconds)
+    if queue_seconds > 1:
+        logger.warning(
+            f"Проверка пароля ждала в очереди {queue_seconds:.2f} секунд",
+            extra={"queue_seconds": queue_seconds},
+        )
+    return result
+
+
+async def hash_password_async(password: str) -> str:
+    """Асинхронная версия hash_password, не блокирующая цикл событий"""
+    return await run_password_hashing(hash_password, password)
+
+
+async def verify_password_async(
+    plain_password: str,
+    hashed_password: str,
+) -> bool:
+    """Асинхронная версия verify_password, не блокирующая цикл событий"""
+    return await run_password_hashing(verify_password, plain_password, hashed_password)
+
+
 def create_access_token(data: dict) -> str:
-    """Создает JWT-токен с payload (sub, id, exp)"""
+    """Создает JWT-токен с payload (sub, id, exp, iat)"""
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(
+    issued_at = datetime.now(timezone.utc)
+    expire = issued_at + timedelta(
         minutes=int(settings.auth.access_token_expires_minutes)
     )
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": issued_at})
     return jwt.encode(
         payload=to_encode,
         key=settings.auth.secret_key,
@@ -53,10 +155,9 @@ def create_access_token(data: dict) -> str:
 def create_refresh_token(data: dict) -> str:
     """Создает рефреш-токен с длительным сроком действия"""
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(
-        days=settings.auth.refresh_token_expire_days
-    )
-    to_encode.update({"exp": expire})
+    issued_at = datetime.now(timezone.utc)
+    expire = issued_at + timedelta(days=settings.auth.refresh_token_expire_days)
+    to_encode.update({"exp": expire, "iat": issued_at})
     return jwt.encode(
         payload=to_encode,
         key=settings.auth.secret_key,
@@ -68,7 +169,9 @@ async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
     db: AsyncSession = Depends(db_helper.session_getter),
 ):
-    """Проверяет JWT-токен и возвращает пользователя из базы"""
+    """Проверяет JWT-токен и возвращает пользователя. Пользователь берется
+    из кеша (utils.principal_cache) по id и времени выпуска токена, к базе
+    данных запрос выполняется только при промахе кеша."""
     try:
         payload = jwt.decode(
             jwt=token,
@@ -85,7 +188,31 @@ async def get_current_user(
     except jwt.PyJWTError:
         raise credential_exception
 
+    user_id: int | None = payload.get("id")
+    # токены, выпущенные до появления iat, в кеш не попадают
+    issued_at: int | None = payload.get("iat")
+
+    if user_id is not None and issued_at is not None:
+        principal = await principal_cache.get(user_id, issued_at)
+        if principal is not None and principal["username"] == username:
+            return User(id=principal["id"], username=principal["username"])
+
     user = await db.scalar(select(User).filter(User.username == username))
     if user is None:
         raise credential_exception
+
+    if issued_at is not None and user.id == user_id:
+        await principal_cache.set(
+            user.id,
+            issued_at,
+            {"id": user.id, "username": user.username},
+        )
     return user
+
+
+async def invalidate_cached_user(user_id: int) -> None:
+    """Удаляет пользователя из кеша аутентификации. Должна вызываться
+    любым кодом, изменяющим пароль или имя пользователя или удаляющим
+    его. Сейчас такого кода нет, пользователи меняются вручную в базе,
+    и запись кеша живет не дольше settings.auth.principal_cache_ttl."""
+    await principal_cache.invalidate(user_id)
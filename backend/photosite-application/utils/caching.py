@@ -1,9 +1,13 @@
 from typing import Any
 from collections.abc import Callable
 from fastapi import Request, Response
+from fastapi_cache import FastAPICache
+from fastapi_cache.coder import Coder
 from sqlalchemy.ext.asyncio import AsyncSession
 import hashlib
 
+from core.config import settings
+
 
 def events_key_builder(
     func: Callable[..., Any],
@@ -26,3 +30,37 @@ def events_key_builder(
         f"{func.__module__}:{func.__name__}:{args}:{custom_kwargs}".encode()
     ).hexdigest()
     return f"{namespace}:{cache_key}"
+
+
+def cached_json_response(body: bytes, cache_status: str = "MISS") -> Response:
+    """Ответ с готовым JSON-телом и заголовками кеширования, которые
+    fastapi-cache выставляет сам, когда конечная точка возвращает данные,
+    а не экземпляр Response. max-age ограничивается middleware."""
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={
+            "Cache-Control": f"max-age={settings.cache.term}",
+            "ETag": f"W/{hash(body)}",
+            FastAPICache.get_cache_status_header(): cache_status,
+        },
+    )
+
+
+class JsonResponseCoder(Coder):
+    """Кодер для конечных точек, которые сами сериализуют ответ
+    (utils.serialization) и возвращают cached_json_response. В кеше хранится
+    готовое тело ответа, при попадании оно отдается как есть, без
+    декодирования JSON и повторной валидации схемой response_model."""
+
+    @classmethod
+    def encode(cls, value: Response) -> bytes:
+        return bytes(value.body)
+
+    @classmethod
+    def decode(cls, value: bytes) -> Response:
+        return cached_json_response(value, cache_status="HIT")
+
+    @classmethod
+    def decode_as_type(cls, value: bytes, *, type_: Any) -> Response:
+        return cls.decode(value)
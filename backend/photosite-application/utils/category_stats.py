@@ -0,0 +1,86 @@
+from collections.abc import Iterable
+from sqlalchemy import select, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.models.category_stats import CategoryStats
+from core.models.event import Event
+from core.models.picture import Picture
+
+
+async def lock_category_stats(db: AsyncSession, category_id: int) -> CategoryStats:
+    """Создает строку сводки категории, если ее нет, и блокирует ее
+    до конца транзакции. Вставка без ошибки при существующей строке
+    (ON CONFLICT DO NOTHING) не дает двум транзакциям создать ее дважды."""
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    await db.execute(
+        dialect.insert(CategoryStats)
+        .values(category_id=category_id)
+        .on_conflict_do_nothing(index_elements=[CategoryStats.category_id])
+    )
+    stats = await db.scalar(
+        select(CategoryStats)
+        .filter(CategoryStats.category_id == category_id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    return stats  # type: ignore
+
+
+async def refresh_category_stats(
+    db: AsyncSession,
+    category_ids: Iterable[int],
+) -> None:
+    """Пересчитывает строки category_stats для переданных категорий.
+    Изменения сессии предварительно сбрасываются в базу (flush), commit
+    не выполняется: функция вызывается в той же транзакции, что и
+    изменение съемок или фотографий, и фиксируется вместе с ним.
+
+    Перед подсчетом строка сводки блокируется (SELECT ... FOR UPDATE) до конца
+    транзакции. Иначе при READ COMMITTED две одновременные транзакции в одной
+    категории не видят незафиксированных изменений друг друга, и последняя
+    записывает устаревшие счетчики. Вторая транзакция ждет фиксации первой
+    и считает уже с ее изменениями. Категории блокируются по возрастанию id,
+    чтобы транзакции не блокировали друг друга взаимно."""
+    await db.flush()
+
+    for category_id in sorted(set(category_ids)):
+        stats = await lock_category_stats(db, category_id)
+
+        event_count, active_count = (
+            await db.execute(
+                select(
+                    func.count(Event.id),
+                    func.count(Event.id).filter(Event.active.is_(True)),
+                ).filter(Event.category_id == category_id)
+            )
+        ).one()
+
+        picture_count: int = (
+            await db.scalar(
+                select(func.count(Picture.id))
+                .join(Event)
+                .filter(Event.category_id == category_id)
+            )
+            or 0
+        )
+
+        latest = (
+            await db.execute(
+                select(Event.date, Event.cover)
+                .filter(
+                    Event.category_id == category_id,
+                    Event.active.is_(True),
+                )
+                .order_by(Event.created.desc())
+                .limit(1)
+            )
+        ).one_or_none()
+
+        stats.event_count = event_count
+        stats.active_count = active_count
+        stats.picture_count = picture_count
+        stats.latest_event_date = latest.date if latest else None
+        stats.latest_cover = latest.cover if latest else None
+
+    await db.flush()
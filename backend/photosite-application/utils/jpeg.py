@@ -0,0 +1,81 @@
+from typing import BinaryIO, NamedTuple
+
+# Разбор заголовка JPEG без декодирования: маркер SOI, затем сегменты
+# (APPn с EXIF, DQT, DHT и т.д.) до кадра SOFn с размерами изображения.
+# Содержимое сегментов пропускается, читаются только маркеры и длины,
+# поэтому обычно хватает первых нескольких КБ файла.
+
+SOI = b"\xff\xd8"
+# маркеры SOFn, кроме DHT (C4), JPG (C8) и DAC (CC)
+SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# маркеры без длины и содержимого: TEM и RSTn
+STANDALONE_MARKERS = frozenset([0x01, *range(0xD0, 0xD8)])
+SOS = 0xDA
+EOI = 0xD9
+
+# EXIF, XMP и ICC-профиль в сегментах APPn редко занимают больше
+MAX_HEADER_BYTES = 1024 * 1024
+
+
+class InvalidJpegError(ValueError):
+    pass
+
+
+class JpegHeader(NamedTuple):
+    width: int
+    height: int
+    components: int
+    progressive: bool
+
+
+def read_exactly(file: BinaryIO, size: int) -> bytes:
+    data = file.read(size)
+    if len(data) != size:
+        raise InvalidJpegError("файл обрывается в заголовке")
+    return data
+
+
+def read_jpeg_header(file: BinaryIO) -> JpegHeader:
+    """Читает заголовок JPEG с текущей позиции файла до кадра SOFn
+    и возвращает размеры и число компонент. Позиция файла после чтения
+    не восстанавливается. InvalidJpegError, если это не JPEG, заголовок
+    поврежден или длиннее MAX_HEADER_BYTES."""
+    start = file.tell()
+    if file.read(2) != SOI:
+        raise InvalidJpegError("нет маркера начала изображения")
+
+    while file.tell() - start < MAX_HEADER_BYTES:
+        if read_exactly(file, 1) != b"\xff":
+            raise InvalidJpegError("ожидался маркер сегмента")
+        marker = read_exactly(file, 1)[0]
+        while marker == 0xFF:  # заполняющие байты перед маркером
+            marker = read_exactly(file, 1)[0]
+
+        if marker in STANDALONE_MARKERS:
+            continue
+        if marker in (SOS, EOI):
+            raise InvalidJpegError("нет кадра с размерами изображения")
+
+        length = int.from_bytes(read_exactly(file, 2))
+        if length < 2:
+            raise InvalidJpegError("неверная длина сегмента")
+
+        if marker in SOF_MARKERS:
+            frame = read_exactly(file, min(length - 2, 6))
+            if len(frame) < 6:
+                raise InvalidJpegError("неверная длина кадра")
+            height = int.from_bytes(frame[1:3])
+            width = int.from_bytes(frame[3:5])
+            components = frame[5]
+            if not width or not height or components not in (1, 3, 4):
+                raise InvalidJpegError("неверные параметры кадра")
+            return JpegHeader(
+                width=width,
+                height=height,
+                components=components,
+                progressive=marker in (0xC2, 0xC6, 0xCA, 0xCE),
+            )
+
+        file.seek(length - 2, 1)
+
+    raise InvalidJpegError("слишком длинный заголовок")
@@ -0,0 +1,128 @@
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Под gunicorn метрики каждого воркера пишутся в файлы каталога
+# PROMETHEUS_MULTIPROC_DIR (задается в gunicorn.conf.py и в
+# commands.upload_worker), /metrics любого воркера собирает их вместе,
+# включая метрики обработчика загрузок
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Время обработки HTTP-запроса",
+    ["method", "route", "status"],
+)
+RESPONSE_CACHE_REQUESTS = Counter(
+    "response_cache_requests_total",
+    "Ответы конечных точек с @cache: попадания (HIT) и промахи (MISS) кеша",
+    ["route", "result"],
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Соединения, выданные из пула",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Размер пула соединений",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow",
+    "Соединения, открытые сверх размера пула",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds",
+    "Время получения соединения из пула",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+
+SLOW_QUERIES = Histogram(
+    "db_slow_query_duration_seconds",
+    "Время выполнения запросов к базе дольше порога slow_queries.threshold_ms",
+    ["operation"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+PASSWORD_HASHING_QUEUE_SECONDS = Histogram(
+    "password_hashing_queue_seconds",
+    "Время ожидания проверки пароля в очереди пула потоков bcrypt",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+PASSWORD_HASHING_PENDING = Gauge(
+    "password_hashing_pending",
+    "Проверки паролей, выполняемые и ждущие в очереди пула потоков",
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASHING_REJECTED = Counter(
+    "password_hashing_rejected_total",
+    "Проверки паролей, отклоненные с 503 из-за переполненной очереди",
+)
+
+THUMBNAIL_SECONDS = Histogram(
+    "thumbnail_duration_seconds",
+    "Время создания одного превью",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+THUMBNAIL_SOURCE_BYTES = Counter(
+    "thumbnail_source_bytes_total",
+    "Размер исходных файлов, по которым созданы превью",
+)
+UPLOAD_FILE_BYTES = Histogram(
+    "upload_file_size_bytes",
+    "Размер загруженного файла фотографии",
+    buckets=tuple(
+        megabytes * 1024 * 1024 for megabytes in (0.25, 1, 2, 5, 10, 20, 50, 100)
+    ),
+)
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> None:
+    """Обновляет метрики пула соединений движка при выдаче и возврате
+    соединения. Значения обновляются в том воркере, где меняется пул,
+    поэтому в многопроцессном режиме они суммируются по живым воркерам."""
+    pool = engine.pool
+    checked_out = DB_POOL_CHECKED_OUT.labels(name)
+
+    def on_checkout(*args) -> None:
+        checked_out.inc()
+        DB_POOL_SIZE.labels(name).set(pool.size())
+        DB_POOL_OVERFLOW.labels(name).set(max(0, pool.overflow()))
+
+    def on_checkin(*args) -> None:
+        # событие вызывается до возврата соединения в очередь пула,
+        # поэтому счетчик ведется отдельно, а не берется из pool.checkedout()
+        checked_out.dec()
+
+    event.listen(engine.sync_engine, "checkout", on_checkout)
+    event.listen(engine.sync_engine, "checkin", on_checkin)
+
+    wait_seconds = DB_POOL_WAIT_SECONDS.labels(name)
+    pool.wait_stats.observers.append(wait_seconds.observe)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Возвращает текст метрик в формате Prometheus и его content type"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
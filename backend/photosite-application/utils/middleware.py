@@ -0,0 +1,95 @@
+import logging
+import time
+
+from fastapi_cache import FastAPICache
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import settings
+from utils.metrics import REQUEST_SECONDS, RESPONSE_CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMiddleware:
+    """ASGI-middleware для HTTP-запросов: логирование запроса и времени
+    его обработки, метрики времени ответа и попаданий в кеш, ограничение max-age в Cache-Control значением
+    max_age_maximum. В отличие от @app.middleware("http") не создает
+    отдельную задачу и поток для тела ответа и не буферизует потоковые
+    ответы: заголовки правятся в сообщении http.response.start."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_age_maximum: int = settings.cache.max_age_maximum,
+    ) -> None:
+        self.app = app
+        self.max_age_maximum = max_age_maximum
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        method, path = scope["method"], scope["path"]
+        client = scope.get("client")
+
+        # в лог попадает итоговая запись о запросе, начало - только в debug
+        logger.debug(
+            f"Request: {method} {path}",
+            extra={
+                "method": method,
+                "path": path,
+                "client_ip": client[0] if client else "unknown",
+                "user_agent": Headers(scope=scope).get("user-agent", "unknown"),
+            },
+        )
+
+        status_code = 500
+        cache_status_header = FastAPICache.get_cache_status_header()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                self.clamp_max_age(headers)
+                if cache_status := headers.get(cache_status_header):
+                    route = scope.get("route")
+                    RESPONSE_CACHE_REQUESTS.labels(
+                        route.path if route else path, cache_status
+                    ).inc()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            logger.exception(f"Error processing request: {str(e)}")
+            raise
+        finally:
+            process_time = time.perf_counter() - start_time
+            route = scope.get("route")
+            REQUEST_SECONDS.labels(
+                method, route.path if route else "unmatched", status_code
+            ).observe(process_time)
+
+        logger.info(
+            f"Request completed in {process_time:.4f} seconds with status code {status_code}",
+            extra={
+                "method": method,
+                "path": path,
+                # шаблон маршрута, по нему выбирается доля сохраняемых записей
+                "route": route.path if route else path,
+                "status_code": status_code,
+                "processing_time": f"{process_time:.4f}",
+            },
+        )
+
+    def clamp_max_age(self, headers: MutableHeaders) -> None:
+        """Ограничивает max_age в cache_control значением max_age_maximum,
+        если это значение больше"""
+        cache_control_header = headers.get("Cache-Control", "Empty")
+        if "max-age" in cache_control_header:
+            if int(cache_control_header.split("=")[-1]) > self.max_age_maximum:
+                headers["Cache-Control"] = f"max-age={self.max_age_maximum}"
@@ -1,6 +1,10 @@
+import asyncio
+import base64
+import io
 import shutil
-from datetime import date as dt_date
+from datetime import date as dt_date, datetime
 from pathlib import Path
+from typing import NamedTuple
 import aiofiles
 from fastapi import UploadFile, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -12,13 +16,88 @@ from PIL import Image
 
 
 from core.config import settings
+from utils.category_stats import refresh_category_stats
+from utils.admission import upload_write_budget
+from utils.jpeg import InvalidJpegError, JpegHeader, read_jpeg_header
+from utils.metrics import THUMBNAIL_SECONDS, THUMBNAIL_SOURCE_BYTES, UPLOAD_FILE_BYTES
+from utils.upload_progress import (
+    STAGE_COMMITTED,
+    STAGE_RECEIVED,
+    STAGE_THUMBNAILED,
+    STAGE_WRITTEN,
+    UploadProgress,
+)
+
+
+class PictureMetadata(NamedTuple):
+    width: int
+    height: int
+    orientation: int | None
+    taken_at: datetime | None
+    placeholder: str | None = None
+
+
+# теги EXIF: ориентация, дата изменения, блок Exif IFD, время съемки
+EXIF_ORIENTATION = 0x0112
+EXIF_DATETIME = 0x0132
+EXIF_IFD = 0x8769
+EXIF_DATETIME_ORIGINAL = 0x9003
+
+
+def read_picture_metadata(img: Image.Image) -> PictureMetadata:
+    """Размеры, ориентация и время съемки из уже открытого изображения.
+    EXIF читается из заголовка, пиксели для этого не декодируются.
+    Размеры - при показе: для ориентаций 5-8 (поворот на 90 градусов)
+    ширина и высота меняются местами, как это делает браузер."""
+    exif = img.getexif()
+    orientation = exif.get(EXIF_ORIENTATION)
+    if orientation not in range(1, 9):
+        orientation = None
+
+    taken_at = None
+    raw_taken_at = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL) or exif.get(
+        EXIF_DATETIME
+    )
+    if isinstance(raw_taken_at, str):
+        try:
+            taken_at = datetime.strptime(
+                raw_taken_at.strip("\x00 "), "%Y:%m:%d %H:%M:%S"
+            )
+        except ValueError:
+            pass
+
+    width, height = img.size
+    if orientation is not None and orientation >= 5:
+        width, height = height, width
+    return PictureMetadata(width, height, orientation, taken_at)
+
+
+# ширина заглушки, показываемой до загрузки превью; высота - по пропорциям превью
+PLACEHOLDER_WIDTH = 16
 
 
-def resize_and_crop_image(input_path: Path, output_path: Path) -> None:
+def make_placeholder(thumbnail: Image.Image) -> str:
+    """Заглушка LQIP: превью, уменьшенное до PLACEHOLDER_WIDTH пикселей
+    по ширине, в виде data URI с WebP (около 100-200 байт). Браузер
+    растягивает и размывает ее до размеров превью, поэтому сетка галереи
+    отрисовывается по одному ответу JSON."""
+    height = max(1, round(PLACEHOLDER_WIDTH * thumbnail.height / thumbnail.width))
+    small = thumbnail.resize((PLACEHOLDER_WIDTH, height), Image.Resampling.BOX)
+    if small.mode not in ("RGB", "RGBA"):
+        small = small.convert("RGB")
+    buffer = io.BytesIO()
+    small.save(buffer, "WEBP", quality=40)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def resize_and_crop_image(input_path: Path, output_path: Path) -> PictureMetadata:
     """Функция, создающая и записывающая в файловую систему превью для фотографии.
     Принимает путь (pathlib.Path) к исходному файлу на диске (уже записанному) и путь файла
-    назначения."""
+    назначения. Возвращает метаданные фотографии, прочитанные при том же открытии файла,
+    и заглушку, построенную по уменьшенному превью.
+    """
     with Image.open(input_path) as img:
+        metadata = read_picture_metadata(img)
         width, height = img.size
 
         target_ratio = settings.static.thumbnails_target_ratio
@@ -46,6 +125,26 @@ def resize_and_crop_image(input_path: Path, output_path: Path) -> None:
 
         resized_img.save(output_path, quality=90)
 
+    return metadata._replace(placeholder=make_placeholder(resized_img))
+
+
+def rebuild_thumbnail(picture_path: str) -> PictureMetadata:
+    """Заново создает превью фотографии по пути из Picture.path
+    (относительно image_dir). Превью записывается во временный файл рядом
+    и заменяет прежнее одной операцией, поэтому сайт не отдает
+    недописанный файл. Выполняется в отдельном процессе командами
+    commands.rebuild_thumbnails и commands.check_integrity."""
+    source = settings.static.image_dir / picture_path
+    target = settings.static.thumbnails_dir / picture_path
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temporary = target.with_name(f".{target.stem}.rebuild{target.suffix}")
+    try:
+        metadata = resize_and_crop_image(source, temporary)
+        temporary.replace(target)
+    finally:
+        temporary.unlink(missing_ok=True)
+    return metadata
+
 
 def check_file_name(filename: str | None) -> bool:
     if filename is None:
@@ -61,6 +160,33 @@ def check_file_names(files: list[UploadFile]) -> bool:
     return all(check_file_name(file.filename) for file in files)
 
 
+def read_upload_header(file: UploadFile) -> JpegHeader:
+    """Читает заголовок JPEG загруженного файла, не меняя позицию файла.
+    Для файла, не являющегося JPEG, возвращает 400."""
+    position = file.file.tell()
+    try:
+        file.file.seek(0)
+        return read_jpeg_header(file.file)
+    except InvalidJpegError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Файл {file.filename} не является изображением JPEG: {e}",
+        )
+    finally:
+        file.file.seek(position)
+
+
+async def check_jpeg_files(files: list[UploadFile]) -> dict[str, JpegHeader]:
+    """Проверяет заголовки JPEG всех файлов загрузки (первые несколько КБ
+    каждого файла) до записи файлов, создания превью и записи в базу.
+    Возвращает заголовки с размерами изображений по именам файлов."""
+
+    def read_headers() -> dict[str, JpegHeader]:
+        return {str(file.filename): read_upload_header(file) for file in files}
+
+    return await asyncio.to_thread(read_headers)
+
+
 async def check_event_and_category(
     db: AsyncSession,
     category: str,
@@ -112,6 +238,7 @@ async def create_event(
         description=description,
     )
     db.add(new_event)
+    await refresh_category_stats(db, [category_in_db.id])
     await db.commit()
     await db.refresh(new_event)
     return new_event
@@ -122,12 +249,12 @@ async def save_file_to_db(
     name: str,
     event: Event,
     file_rel_path: str,
-) -> None:
+) -> Picture:
     """Сохраняет путь к одному изображению, дату съемки и категорию
     в базе данных, проверяя корректность категории и даты.
     Добавление происходит без commit. Функция, использующая данную, должна
     принимать тот же объект AsyncSession и выполнить единый коммит для всех
-    фотографий.
+    фотографий. Возвращает добавленный объект Picture.
     """
     new_picture = Picture(
         name=name,
@@ -137,12 +264,53 @@ async def save_file_to_db(
 
     db.add(new_picture)
     await db.flush()  # проверка на уровне базы данных, что категория и дата допустимы
+    return new_picture
+
+
+def copy_file_object(source, destination: str | Path) -> int:
+    """Копирует файл загрузки на диск блоками по 1 МБ и возвращает размер"""
+    source.seek(0)
+    with open(destination, "wb") as buffer:
+        shutil.copyfileobj(source, buffer, 1024 * 1024)
+        return buffer.tell()
 
 
 async def write_one_file_on_disc(filename: str | Path, file: UploadFile) -> None:
-    async with aiofiles.open(filename, "wb") as buffer:
-        while chunk := await file.read(8192):
-            await buffer.write(chunk)
+    """Записывает файл загрузки одним переходом в поток, а не отдельным
+    переходом на каждый блок, как при чтении UploadFile и записи через aiofiles"""
+    size = await asyncio.to_thread(copy_file_object, file.file, filename)
+    UPLOAD_FILE_BYTES.observe(size)
+
+
+async def write_files_on_disc(
+    directory: Path,
+    files: list[UploadFile],
+    progress: UploadProgress | None = None,
+) -> None:
+    """Записывает файлы параллельно, не больше write_concurrency
+    одновременно. Каждый файл на время записи занимает свой размер в общем
+    для воркера бюджете upload_write_budget, поэтому одновременные загрузки
+    не перегружают диск и память: новые ждут освобождения места или
+    получают 503. При ошибке записанные файлы удаляются."""
+    progress = progress or UploadProgress(None)
+    semaphore = asyncio.Semaphore(settings.uploads.write_concurrency)
+
+    async def write(file: UploadFile) -> None:
+        async with semaphore:
+            async with upload_write_budget.reserve(
+                file.size or 0, settings.uploads.admission_timeout
+            ):
+                await write_one_file_on_disc(directory / str(file.filename), file)
+        await progress.file_stage(STAGE_WRITTEN, str(file.filename))
+
+    try:
+        async with asyncio.TaskGroup() as tasks:
+            for file in files:
+                tasks.create_task(write(file))
+    except ExceptionGroup as e:
+        for file in files:
+            (directory / str(file.filename)).unlink(missing_ok=True)
+        raise e.exceptions[0]
 
 
 async def save_multiple_files_to_event(
@@ -153,7 +321,13 @@ async def save_multiple_files_to_event(
     files_to_add: list[UploadFile],
     dir_for_upload: Path,
     dir_for_thumbnails: Path,
+    progress: UploadProgress | None = None,
 ) -> list[str]:
+    """Записывает фотографии съемки в базу и на диск и создает превью.
+    Если передан progress, после каждого этапа для каждого файла
+    публикуется событие прогресса (received, written, thumbnailed,
+    committed)."""
+    progress = progress or UploadProgress(None)
     added_files: list[str] = []
 
     filenames: list[str] = []
@@ -170,8 +344,14 @@ async def save_multiple_files_to_event(
                 detail="Необходимо загружать файлы с уникальными именами",
             )
         filenames.append(file.filename)
+
+    await progress.start(len(files_to_add))
+    for filename in filenames:
+        await progress.file_stage(STAGE_RECEIVED, filename)
+
+    new_pictures: dict[str, Picture] = {}
     for file in files_to_add:
-        await save_file_to_db(
+        new_pictures[str(file.filename)] = await save_file_to_db(
             db,
             file.filename,  # type: ignore
             event,
@@ -179,14 +359,28 @@ async def save_multiple_files_to_event(
         )
         added_files.append(str(file.filename))
 
-    for file in files_to_add:
-        await write_one_file_on_disc(dir_for_upload / file.filename, file)  # type: ignore
+    await write_files_on_disc(dir_for_upload, files_to_add, progress)
 
+    # превью создаются в потоке: декодирование больших JPEG занимает секунды,
+    # и цикл событий за это время должен продолжать обслуживать запросы
+    # (а в обработчике загрузок - продлевать heartbeat)
     for item in dir_for_upload.iterdir():
         if item.is_file():
-            resize_and_crop_image(item, dir_for_thumbnails / item.name)
+            with THUMBNAIL_SECONDS.time():
+                metadata = await asyncio.to_thread(
+                    resize_and_crop_image, item, dir_for_thumbnails / item.name
+                )
+            THUMBNAIL_SOURCE_BYTES.inc(item.stat().st_size)
+            if item.name in new_pictures:
+                picture = new_pictures[item.name]
+                picture.width, picture.height = metadata.width, metadata.height
+                picture.orientation = metadata.orientation
+                picture.taken_at = metadata.taken_at
+                picture.placeholder = metadata.placeholder
+                await progress.file_stage(STAGE_THUMBNAILED, item.name)
 
     try:
+        await refresh_category_stats(db, [event.category_id])
         await db.commit()
     except Exception as e:
         await db.rollback()
@@ -196,4 +390,7 @@ async def save_multiple_files_to_event(
             detail=f"Ошибка при добавлении фотографий: {e}",
         )
 
+    for filename in added_files:
+        await progress.file_stage(STAGE_COMMITTED, filename)
+
     return added_files
@@ -0,0 +1,100 @@
+import logging
+import time
+from collections import OrderedDict
+
+import orjson
+
+from core.config import settings
+from core.redis_helper import redis_helper
+
+logger = logging.getLogger(__name__)
+
+
+class PrincipalCache:
+    """Кеш аутентифицированных пользователей с коротким временем жизни.
+    Ключ - id пользователя и время выпуска токена (iat), значение -
+    словарь с id и username. Первый уровень хранится в памяти процесса
+    (LRU), второй, необязательный, - в Redis, общий для всех воркеров.
+
+    Сброс через invalidate удаляет записи в памяти текущего процесса
+    и в Redis; в памяти остальных воркеров запись живет не дольше ttl."""
+
+    def __init__(self, ttl: int, max_size: int, use_redis: bool = False):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.use_redis = use_redis
+        self._entries: OrderedDict[tuple[int, int], tuple[float, dict]] = OrderedDict()
+
+    @staticmethod
+    def _redis_key(user_id: int) -> str:
+        return f"{settings.redis.prefix}:principal:{user_id}"
+
+    async def get(self, user_id: int, issued_at: int) -> dict | None:
+        key = (user_id, issued_at)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, principal = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                return principal
+            del self._entries[key]
+
+        if not self.use_redis:
+            return None
+
+        try:
+            cached = await redis_helper.client.hget(
+                self._redis_key(user_id), str(issued_at)
+            )
+        except Exception:
+            logger.warning("Не удалось прочитать пользователя из Redis", exc_info=True)
+            return None
+        if cached is None:
+            return None
+
+        principal = orjson.loads(cached)
+        self._remember(key, principal)
+        return principal
+
+    async def set(self, user_id: int, issued_at: int, principal: dict) -> None:
+        self._remember((user_id, issued_at), principal)
+
+        if not self.use_redis:
+            return
+
+        redis_key = self._redis_key(user_id)
+        try:
+            async with redis_helper.client.pipeline(transaction=True) as pipe:
+                pipe.hset(redis_key, str(issued_at), orjson.dumps(principal))
+                pipe.expire(redis_key, self.ttl)
+                await pipe.execute()
+        except Exception:
+            logger.warning("Не удалось сохранить пользователя в Redis", exc_info=True)
+
+    async def invalidate(self, user_id: int) -> None:
+        for key in [key for key in self._entries if key[0] == user_id]:
+            del self._entries[key]
+
+        if not self.use_redis:
+            return
+
+        try:
+            await redis_helper.client.delete(self._redis_key(user_id))
+        except Exception:
+            logger.warning("Не удалось удалить пользователя из Redis", exc_info=True)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def _remember(self, key: tuple[int, int], principal: dict) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, principal)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+principal_cache = PrincipalCache(
+    ttl=settings.auth.principal_cache_ttl,
+    max_size=settings.auth.principal_cache_max_size,
+    use_redis=settings.auth.principal_cache_redis,
+)
@@ -0,0 +1,121 @@
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import random
+import time
+from pathlib import Path
+from uuid import uuid4
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.models import db_helper
+from utils.authorization import get_current_user
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_QUERY_PARAM = "profile"
+REPORT_HEADER = "X-Profile-Report"
+
+
+class ProfilingMiddleware:
+    """ASGI-middleware для профилирования отдельных запросов через cProfile.
+    Запрос профилируется, если администратор передал заголовок X-Profile: 1
+    или параметр ?profile=1 вместе с токеном (проверяется get_current_user),
+    а также с вероятностью sample_rate для остальных запросов.
+
+    Отчеты (.prof для pstats/snakeviz и .txt с топом функций) сохраняются
+    в reports_dir, имя отчета администратор получает в заголовке
+    X-Profile-Report. Для ответов из кеша стоит добавить заголовок
+    Cache-Control: no-cache, иначе профилируется только чтение кеша.
+
+    cProfile профилирует весь поток, поэтому одновременно профилируется
+    не больше одного запроса, а в отчет могут попасть параллельные запросы
+    того же воркера. Middleware подключается только при
+    settings.profiling.enabled и в остальное время не добавляет накладных
+    расходов."""
+
+    def __init__(self, app: ASGIApp, sample_rate: float, reports_dir: Path) -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+        self.reports_dir = reports_dir
+        self._lock = asyncio.Lock()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self._lock.locked():
+            await self.app(scope, receive, send)
+            return
+
+        requested = self.is_requested(scope) and await self.is_admin(scope)
+        sampled = not requested and random.random() < self.sample_rate
+        # пока проверялся токен, мог начаться профилируемый запрос
+        if not (requested or sampled) or self._lock.locked():
+            await self.app(scope, receive, send)
+            return
+
+        async with self._lock:
+            report_name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid4().hex[:8]}"
+
+            async def send_wrapper(message: Message) -> None:
+                if requested and message["type"] == "http.response.start":
+                    MutableHeaders(scope=message).append(REPORT_HEADER, report_name)
+                await send(message)
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                profiler.disable()
+                await asyncio.to_thread(
+                    self.save_report,
+                    profiler,
+                    report_name,
+                    scope["method"],
+                    scope["path"],
+                )
+
+    @staticmethod
+    def is_requested(scope: Scope) -> bool:
+        if Headers(scope=scope).get(PROFILE_HEADER) == "1":
+            return True
+        query_params = QueryParams(scope.get("query_string", b""))
+        return query_params.get(PROFILE_QUERY_PARAM) == "1"
+
+    @staticmethod
+    async def is_admin(scope: Scope) -> bool:
+        scheme, _, token = Headers(scope=scope).get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return False
+        async with db_helper.session_factory() as db:
+            try:
+                await get_current_user(token, db)
+            except HTTPException:
+                return False
+        return True
+
+    def save_report(
+        self,
+        profiler: cProfile.Profile,
+        report_name: str,
+        method: str,
+        path: str,
+    ) -> None:
+        self.reports_dir.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(self.reports_dir / f"{report_name}.prof")
+
+        summary = io.StringIO()
+        summary.write(f"{method} {path}\n\n")
+        stats = pstats.Stats(profiler, stream=summary)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(50)
+        (self.reports_dir / f"{report_name}.txt").write_text(
+            summary.getvalue(), encoding="utf-8"
+        )
+        logger.info(
+            f"Профиль запроса {method} {path} сохранен в {report_name}",
+            extra={"method": method, "path": path, "report": report_name},
+        )
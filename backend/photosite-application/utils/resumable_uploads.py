@@ -0,0 +1,382 @@
+import logging
+import shutil
+import time
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+import aiofiles
+import orjson
+from fastapi import HTTPException, status
+from fastapi_cache import FastAPICache
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.redis_helper import redis_helper
+from core.schemas.picture import ResumableUploadCreate
+from crud.events import check_event_exists
+from utils.general import check_date
+from utils.jpeg import SOI
+from utils.pictures import check_event_and_category, check_file_name
+from utils.upload_jobs import (
+    JOB_ADD_PICTURES,
+    JOB_CREATE_EVENT,
+    job_dir,
+    job_key,
+    queue_staged_upload,
+    run_staged_upload,
+)
+from utils.upload_progress import UploadProgress
+
+logger = logging.getLogger(__name__)
+
+# Возобновляемая загрузка в духе протокола tus: клиент описывает файлы,
+# получает id загрузки и отправляет каждый файл кусками PATCH с заголовком
+# Upload-Offset. Куски дописываются прямо в файл каталога job_dir(upload_id),
+# принятое смещение хранится в Redis, после обрыва клиент узнает его
+# через HEAD и продолжает с него. finalize передает файлы обычному пути
+# загрузки или очереди задач. Раскладка каталога совпадает с задачами
+# upload_jobs: files/<имя> и cover/<имя>.
+
+PARTS = ("files", "cover")
+
+# время, на которое finalize захватывает загрузку; если процесс завершится
+# посреди обработки, загрузку можно будет завершить снова по истечении
+FINALIZE_CLAIM_TTL = 60 * 60
+
+# время жизни блокировки файла на время записи куска; продлевается,
+# пока поступают данные (см. ChunkLock)
+CHUNK_LOCK_TTL = 60
+
+
+def upload_key(upload_id: str) -> str:
+    return f"{settings.redis.prefix}:resumable:{upload_id}"
+
+
+def lock_key(upload_id: str, part: str, name: str) -> str:
+    return f"{settings.redis.prefix}:resumable-lock:{upload_id}:{part}/{name}"
+
+
+def finalize_key(upload_id: str) -> str:
+    return f"{settings.redis.prefix}:resumable-finalize:{upload_id}"
+
+
+async def check_not_finalizing(upload_id: str) -> None:
+    if await redis_helper.client.exists(finalize_key(upload_id)):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Загрузка уже завершается",
+        )
+
+
+async def create_resumable_upload(
+    db: AsyncSession,
+    data: ResumableUploadCreate,
+) -> dict[str, Any]:
+    """Проверяет описание загрузки, создает пустые файлы и запись в Redis.
+    Категория и съемка проверяются так же, как при обычной загрузке, чтобы
+    ошибка вернулась до передачи файлов, а не при завершении."""
+    date_obj = check_date(data.date)
+    described = data.files + ([data.event_cover] if data.event_cover else [])
+    if not all(check_file_name(file.name) for file in described):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Неверные имена или расширения файлов",
+        )
+    filenames = [file.name for file in data.files]
+    if len(set(filenames)) != len(filenames):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Необходимо загружать файлы с уникальными именами",
+        )
+    if data.event_cover is not None:
+        await check_event_and_category(db, data.category, date_obj)
+    else:
+        await check_event_exists(db, data.category, data.date, with_pictures=True)
+
+    upload_id = uuid4().hex
+    sizes = {f"files/{file.name}": file.size for file in data.files}
+    if data.event_cover is not None:
+        sizes[f"cover/{data.event_cover.name}"] = data.event_cover.size
+    payload = {
+        "kind": JOB_CREATE_EVENT if data.event_cover else JOB_ADD_PICTURES,
+        "category": data.category,
+        "date": data.date,
+        "files": filenames,
+        "event_cover": data.event_cover.name if data.event_cover else None,
+        "event_description": data.event_description,
+        "sizes": sizes,
+    }
+
+    for part in PARTS:
+        (job_dir(upload_id) / part).mkdir(parents=True)
+    for path in sizes:
+        (job_dir(upload_id) / path).touch()
+
+    key = upload_key(upload_id)
+    await redis_helper.client.hset(
+        key,
+        mapping={"payload": orjson.dumps(payload), **{path: 0 for path in sizes}},
+    )
+    await redis_helper.client.expire(key, settings.uploads.resumable_ttl)
+    return await get_resumable_upload(upload_id)
+
+
+async def load_upload(upload_id: str) -> tuple[dict[str, Any], dict[str, int]]:
+    """Возвращает описание загрузки и принятые смещения файлов"""
+    state = await redis_helper.client.hgetall(upload_key(upload_id))
+    if b"payload" not in state:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Загрузка не найдена",
+        )
+    state = {key.decode(): value for key, value in state.items()}
+    payload = orjson.loads(state.pop("payload"))
+    return payload, {path: int(offset) for path, offset in state.items()}
+
+
+async def get_resumable_upload(upload_id: str) -> dict[str, Any]:
+    _, offsets = await load_upload(upload_id)
+    return {
+        "upload_id": upload_id,
+        "chunk_size": settings.uploads.max_chunk_size,
+        "offsets": offsets,
+    }
+
+
+async def get_file_offset(upload_id: str, part: str, name: str) -> tuple[int, int]:
+    """Возвращает принятое смещение и полный размер файла загрузки"""
+    payload, offsets = await load_upload(upload_id)
+    path = f"{part}/{name}"
+    if path not in payload["sizes"]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Файл не входит в загрузку",
+        )
+    return offsets[path], payload["sizes"][path]
+
+
+class ChunkLockLost(HTTPException):
+    """Блокировка файла истекла и захвачена другим запросом"""
+
+    def __init__(self) -> None:
+        super().__init__(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Файл уже загружается другим запросом",
+        )
+
+
+class ChunkLock:
+    """Блокировка файла загрузки на время записи куска. Время жизни
+    короткое (CHUNK_LOCK_TTL) и продлевается по мере поступления данных,
+    поэтому кусок до max_chunk_size по медленному каналу не теряет
+    блокировку, а блокировка оборванного запроса быстро истекает.
+    В значении хранится случайный токен: продлевается и снимается
+    только своя блокировка."""
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.token = uuid4().hex
+        self.refreshed = 0.0
+
+    async def acquire(self) -> bool:
+        self.refreshed = time.monotonic()
+        return bool(
+            await redis_helper.client.set(
+                self.key, self.token, nx=True, ex=CHUNK_LOCK_TTL
+            )
+        )
+
+    async def refresh(self) -> None:
+        """Продлевает блокировку не чаще раза в треть ее времени жизни.
+        Если данные не поступали дольше CHUNK_LOCK_TTL и блокировку
+        успел взять другой запрос, выбрасывает ChunkLockLost."""
+        if time.monotonic() - self.refreshed < CHUNK_LOCK_TTL / 3:
+            return
+        if await redis_helper.client.get(self.key) != self.token.encode():
+            raise ChunkLockLost()
+        await redis_helper.client.expire(self.key, CHUNK_LOCK_TTL)
+        self.refreshed = time.monotonic()
+
+    async def release(self) -> None:
+        if await redis_helper.client.get(self.key) == self.token.encode():
+            await redis_helper.client.delete(self.key)
+
+
+async def write_chunk(
+    upload_id: str,
+    part: str,
+    name: str,
+    offset: int,
+    chunk: AsyncIterator[bytes],
+    content_length: int | None,
+) -> int:
+    """Дописывает кусок в файл загрузки, начиная с offset, и возвращает
+    новое смещение. Смещение должно совпадать с принятым (иначе 409).
+    Принятым считается все, что успело записаться, в том числе при обрыве
+    соединения посреди куска; хвост после него обрезается следующим куском."""
+    if content_length is not None and content_length > settings.uploads.max_chunk_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail="Слишком большой кусок файла",
+        )
+    lock = ChunkLock(lock_key(upload_id, part, name))
+    if not await lock.acquire():
+        raise ChunkLockLost()
+    try:
+        await check_not_finalizing(upload_id)
+        current, size = await get_file_offset(upload_id, part, name)
+        if offset != current:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Смещение не совпадает с принятым: {current}",
+            )
+        return await append_chunk(
+            upload_id, f"{part}/{name}", offset, size, chunk, lock
+        )
+    finally:
+        await lock.release()
+
+
+async def append_chunk(
+    upload_id: str,
+    path: str,
+    offset: int,
+    size: int,
+    chunk: AsyncIterator[bytes],
+    lock: ChunkLock,
+) -> int:
+    """Дописывает данные куска, продлевая блокировку перед каждой записью.
+    Если блокировка потеряна, файлом и смещением уже распоряжается другой
+    запрос, поэтому файл не обрезается и смещение не сохраняется."""
+    written = 0
+    lost = False
+    async with aiofiles.open(job_dir(upload_id) / path, "r+b") as file:
+        await file.seek(offset)
+        try:
+            async for data in chunk:
+                await lock.refresh()
+                if offset + written + len(data) > size:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Данные выходят за размер файла",
+                    )
+                # файл, не начинающийся с маркера JPEG, отклоняется сразу,
+                # полностью заголовок проверяется при завершении загрузки
+                if offset + written < len(SOI) and not SOI[
+                    offset + written :
+                ].startswith(data[: len(SOI) - offset - written]):
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Файл не является изображением JPEG",
+                    )
+                await file.write(data)
+                written += len(data)
+        except ChunkLockLost:
+            lost = True
+            raise
+        finally:
+            if not lost:
+                await file.truncate(offset + written)
+                await redis_helper.client.hset(
+                    upload_key(upload_id), path, offset + written
+                )
+                await redis_helper.client.expire(
+                    upload_key(upload_id), settings.uploads.resumable_ttl
+                )
+    return offset + written
+
+
+async def delete_resumable_upload(upload_id: str) -> None:
+    await check_not_finalizing(upload_id)
+    await load_upload(upload_id)
+    await redis_helper.client.delete(upload_key(upload_id))
+    shutil.rmtree(job_dir(upload_id), ignore_errors=True)
+
+
+async def finalize_resumable_upload(
+    db: AsyncSession,
+    upload_id: str,
+    async_processing: bool,
+) -> list[str] | None:
+    """Завершает загрузку, когда все файлы приняты полностью. При
+    async_processing файлы передаются очереди задач под тем же id (результат
+    None), иначе обрабатываются сразу обычным путем загрузки. Прогресс
+    публикуется по id загрузки.
+
+    Загрузка захватывается ключом finalize_key (SET NX), поэтому
+    одновременные запросы не обработают ее дважды. Состояние в Redis
+    и принятые файлы удаляются только после успешной обработки или
+    постановки в очередь; при ошибке захват снимается, и клиент может
+    повторить finalize без повторной передачи файлов."""
+    claim = finalize_key(upload_id)
+    if not await redis_helper.client.set(claim, 1, nx=True, ex=FINALIZE_CLAIM_TTL):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Загрузка уже завершается",
+        )
+
+    try:
+        payload, offsets = await load_upload(upload_id)
+        incomplete = [
+            path for path, size in payload["sizes"].items() if offsets[path] != size
+        ]
+        if incomplete:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Файлы загружены не полностью: {', '.join(incomplete)}",
+            )
+
+        if async_processing:
+            await queue_staged_upload(upload_id, payload)
+            result = None
+        else:
+            async with UploadProgress(upload_id) as progress:
+                result = await run_staged_upload(db, upload_id, payload, progress)
+    except BaseException:
+        await redis_helper.client.delete(claim)
+        raise
+
+    # каталог поставленной в очередь загрузки принадлежит задаче
+    await redis_helper.client.delete(upload_key(upload_id), claim)
+    if result is not None:
+        shutil.rmtree(job_dir(upload_id), ignore_errors=True)
+        await FastAPICache.clear()
+    return result
+
+
+def newest_mtime(directory: Path) -> float:
+    """Время последнего изменения каталога загрузки или задачи: куски
+    дописываются в файлы, не меняя время изменения самого каталога"""
+    paths = [directory, *directory.iterdir()]
+    paths += [path for part in paths[1:] if part.is_dir() for path in part.iterdir()]
+    return max(path.stat().st_mtime for path in paths)
+
+
+async def cleanup_staging_dirs() -> int:
+    """Удаляет каталоги staging_dir, которые не менялись дольше
+    resumable_ttl и для которых в Redis нет ни возобновляемой загрузки,
+    ни задачи: брошенные без DELETE загрузки и каталоги задач, оставшиеся
+    после сбоев. Выполняется обработчиком загрузок. Возвращает число
+    удаленных каталогов."""
+    staging_dir = settings.uploads.staging_dir
+    if not staging_dir.is_dir():
+        return 0
+    expired_before = time.time() - settings.uploads.resumable_ttl
+    removed = 0
+    for directory in staging_dir.iterdir():
+        if not directory.is_dir():
+            continue
+        try:
+            if newest_mtime(directory) > expired_before:
+                continue
+        except FileNotFoundError:
+            continue
+        name = directory.name
+        if await redis_helper.client.exists(upload_key(name), job_key(name)):
+            continue
+        shutil.rmtree(directory, ignore_errors=True)
+        logger.info(f"Удален устаревший каталог загрузки {name}")
+        removed += 1
+    return removed
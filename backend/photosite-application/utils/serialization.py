@@ -0,0 +1,74 @@
+from collections.abc import Callable, Mapping, Sequence
+from typing import Annotated, Any
+
+import orjson
+from fastapi import HTTPException, Query, status
+
+from core.schemas.event import EventReadNoPictures
+from core.schemas.picture import PictureRead
+
+# колонки съемки и фотографии в порядке полей схем ответа
+EVENT_COLUMNS: tuple[str, ...] = tuple(EventReadNoPictures.model_fields)
+PICTURE_COLUMNS: tuple[str, ...] = tuple(PictureRead.model_fields)
+
+# поля съемки, которые можно запросить через параметр fields
+EVENT_FIELDS: frozenset[str] = frozenset(EVENT_COLUMNS)
+EVENT_FIELDS_WITH_PICTURES: frozenset[str] = EVENT_FIELDS | {"pictures"}
+
+# Z вместо +00:00 - так же, как сериализует datetime pydantic
+ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+def sparse_fields_parser(
+    allowed: frozenset[str],
+) -> Callable[[str | None], tuple[str, ...] | None]:
+    """Создает зависимость, разбирающую параметр запроса fields
+    (список полей через запятую). Зависимость возвращает отсортированный
+    кортеж полей, чтобы одинаковые наборы давали один ключ кеша,
+    или None, если параметр не передан."""
+
+    def parse_fields(
+        fields: Annotated[
+            str | None,
+            Query(description="Поля съемки через запятую, например id,date,cover"),
+        ] = None,
+    ) -> tuple[str, ...] | None:
+        if fields is None:
+            return None
+        requested = {field.strip() for field in fields.split(",") if field.strip()}
+        if not requested or not requested <= allowed:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Недопустимые поля. Допустимые поля: {', '.join(sorted(allowed))}",
+            )
+        return tuple(sorted(requested))
+
+    return parse_fields
+
+
+def render_event(
+    event: Mapping[str, Any],
+    fields: Sequence[str],
+    pictures: Sequence[Mapping[str, Any]] | None = None,
+    path_prefix: str | None = None,
+) -> dict[str, Any]:
+    """Собирает словарь ответа из строки таблицы event, оставляя только
+    поля fields. Если переданы строки фотографий, они добавляются в поле
+    pictures; при переданном path_prefix - в компактном формате
+    (схема EventReadCompact): общий префикс и список имен файлов."""
+    data = {field: event[field] for field in fields}
+    if pictures is not None:
+        if path_prefix is None:
+            data["pictures"] = [dict(picture) for picture in pictures]
+        else:
+            data["path_prefix"] = path_prefix
+            data["pictures"] = [picture["name"] for picture in pictures]
+    return data
+
+
+def dump_json(content: Any) -> bytes:
+    """Сериализует данные, прочитанные из собственной базы, сразу в байты
+    ответа. Данные не проходят повторную валидацию схемами pydantic,
+    поэтому функция должна получать только словари, собранные
+    render_event и подобными функциями."""
+    return orjson.dumps(content, option=ORJSON_OPTIONS)
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, ExecutionContext
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.config import settings
+from utils.metrics import SLOW_QUERIES
+
+logger = logging.getLogger("sql.slow")
+
+# execution option, отключающая учет запроса (сами EXPLAIN)
+SKIP_OPTION = "skip_slow_query_log"
+
+# наибольшее число запомненных отпечатков запросов для explain_interval
+MAX_EXPLAINED_STATEMENTS = 1000
+
+# параметры и литералы, которые не меняют запрос по существу: параметры
+# драйверов (asyncpg $1::INTEGER, psycopg %(name)s и %s), строки, числа;
+# списки из них в IN (...) разной длины сворачиваются в один элемент
+_PARAMETER = re.compile(r"\$\d+(?:::\w+)?|%\(\w+\)s|%s|'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])\d+(?:\.\d+)?\b")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """Текст запроса без литералов, с одним элементом вместо списков
+    значений и без лишних пробелов: запросы, отличающиеся только ими,
+    получают один отпечаток"""
+    statement = _PARAMETER.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _VALUE_LIST.sub("(?)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+class SlowQueryLog:
+    """Записывает в лог sql.slow (logs/slow_queries.log) запросы движка,
+    выполнявшиеся дольше threshold секунд, с параметрами. Для SELECT
+    на PostgreSQL дополнительно в фоне выполняется
+    EXPLAIN (ANALYZE, BUFFERS) на отдельном соединении из пула: не больше
+    одного одновременно и не чаще раза в explain_interval секунд для
+    одного и того же запроса (по отпечатку fingerprint, не больше
+    MAX_EXPLAINED_STATEMENTS запомненных), так как ANALYZE выполняет запрос
+    повторно."""
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        threshold: float,
+        explain: bool,
+        explain_interval: float,
+        max_parameters_length: int,
+    ) -> None:
+        self.engine = engine
+        self.threshold = threshold
+        self.explain = explain and engine.dialect.name == "postgresql"
+        self.explain_interval = explain_interval
+        self.max_parameters_length = max_parameters_length
+        # отпечаток запроса -> время EXPLAIN, в порядке времени
+        self._explained_at: OrderedDict[str, float] = OrderedDict()
+        self._explain_semaphore = asyncio.Semaphore(1)
+        self._tasks: set[asyncio.Task] = set()
+
+        event.listen(engine.sync_engine, "before_cursor_execute", self.before_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", self.after_execute)
+
+    def before_execute(
+        self,
+        conn: Connection,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: ExecutionContext,
+        executemany: bool,
+    ) -> None:
+        context._slow_query_started = time.perf_counter()
+
+    def after_execute(
+        self,
+        conn: Connection,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: ExecutionContext,
+        executemany: bool,
+    ) -> None:
+        started = getattr(context, "_slow_query_started", None)
+        if started is None or context.execution_options.get(SKIP_OPTION):
+            return
+        duration = time.perf_counter() - started
+        if duration < self.threshold:
+            return
+
+        operation = statement.lstrip().split(maxsplit=1)[0].upper()
+        SLOW_QUERIES.labels(operation).observe(duration)
+        logger.warning(
+            f"Медленный запрос: {duration:.3f} секунд",
+            extra={
+                "duration": round(duration, 6),
+                "statement": statement,
+                "parameters": repr(parameters)[: self.max_parameters_length],
+                "executemany": executemany,
+            },
+        )
+
+        if self.explain and operation == "SELECT" and not executemany:
+            self.schedule_explain(statement, parameters)
+
+    def schedule_explain(self, statement: str, parameters: Any) -> None:
+        now = time.monotonic()
+        key = fingerprint(statement)
+        explained_at = self._explained_at.get(key)
+        if explained_at is not None and now - explained_at < self.explain_interval:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.remember_explain(key, now)
+
+        task = loop.create_task(self.capture_explain(statement, parameters))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def remember_explain(self, key: str, now: float) -> None:
+        """Запоминает время EXPLAIN и удаляет истекшие записи, а при
+        превышении MAX_EXPLAINED_STATEMENTS - самые старые"""
+        self._explained_at[key] = now
+        self._explained_at.move_to_end(key)
+        while self._explained_at:
+            oldest_key, oldest = next(iter(self._explained_at.items()))
+            if (
+                now - oldest < self.explain_interval
+                and len(self._explained_at) <= MAX_EXPLAINED_STATEMENTS
+            ):
+                break
+            del self._explained_at[oldest_key]
+
+    async def capture_explain(self, statement: str, parameters: Any) -> None:
+        if self._explain_semaphore.locked():
+            return
+        async with self._explain_semaphore:
+            try:
+                async with self.engine.connect() as conn:
+                    conn = await conn.execution_options(**{SKIP_OPTION: True})
+                    result = await conn.exec_driver_sql(
+                        f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters
+                    )
+                    plan = "\n".join(row[0] for row in result)
+                    # EXPLAIN ANALYZE выполняет запрос, изменения не сохраняются
+                    await conn.rollback()
+            except Exception:
+                logger.warning("Не удалось получить план запроса", exc_info=True)
+                return
+
+        logger.warning(
+            "План медленного запроса",
+            extra={"statement": statement, "plan": plan},
+        )
+
+
+def install_slow_query_log(engine: AsyncEngine) -> SlowQueryLog:
+    return SlowQueryLog(
+        engine,
+        threshold=settings.slow_queries.threshold_ms / 1000,
+        explain=settings.slow_queries.explain,
+        explain_interval=settings.slow_queries.explain_interval,
+        max_parameters_length=settings.slow_queries.max_parameters_length,
+    )
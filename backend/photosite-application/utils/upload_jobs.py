@@ -0,0 +1,294 @@
+import logging
+import shutil
+import time
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+import orjson
+from fastapi import HTTPException, UploadFile, status
+from fastapi_cache import FastAPICache
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.redis_helper import redis_helper
+from crud import events as events_crud
+from crud import pictures as pictures_crud
+from utils.admission import admit_upload
+from utils.general import check_date
+from utils.pictures import (
+    check_file_names,
+    check_jpeg_files,
+    write_one_file_on_disc,
+)
+from utils.upload_progress import UploadProgress
+
+logger = logging.getLogger(__name__)
+
+# виды задач: загрузка новой съемки и добавление фотографий к существующей
+JOB_CREATE_EVENT = "create_event"
+JOB_ADD_PICTURES = "add_pictures"
+
+
+def queue_key() -> str:
+    return f"{settings.redis.prefix}:upload-jobs"
+
+
+def job_key(job_id: str) -> str:
+    return f"{settings.redis.prefix}:upload-job:{job_id}"
+
+
+def workers_key() -> str:
+    return f"{settings.redis.prefix}:upload-workers"
+
+
+def processing_key(worker_id: str) -> str:
+    return f"{settings.redis.prefix}:upload-processing:{worker_id}"
+
+
+def heartbeat_key(worker_id: str) -> str:
+    return f"{settings.redis.prefix}:upload-worker-alive:{worker_id}"
+
+
+def recovery_lock_key() -> str:
+    return f"{settings.redis.prefix}:upload-recovery-lock"
+
+
+def job_dir(job_id: str) -> Path:
+    return settings.uploads.staging_dir / job_id
+
+
+async def enqueue_upload_job(
+    kind: str,
+    category: str,
+    date: str,
+    files: list[UploadFile],
+    event_cover: UploadFile | None = None,
+    event_description: str | None = None,
+) -> str:
+    """Сохраняет загруженные файлы во временный каталог staging_dir
+    и ставит задачу их обработки в очередь Redis. Быстрые проверки
+    (дата, имена файлов) выполняются сразу, чтобы ошибка вернулась
+    в ответе на запрос; остальные - обработчиком задачи. Возвращает id задачи."""
+    check_date(date)
+    covers = [event_cover] if event_cover is not None else []
+    if not check_file_names(files + covers):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Неверные имена или расширения файлов",
+        )
+    filenames = [str(file.filename) for file in files]
+    if len(set(filenames)) != len(filenames):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Необходимо загружать файлы с уникальными именами",
+        )
+    await check_jpeg_files(files + covers)
+
+    job_id = uuid4().hex
+    files_dir = job_dir(job_id) / "files"
+    cover_dir = job_dir(job_id) / "cover"
+    files_dir.mkdir(parents=True)
+    cover_dir.mkdir()
+    try:
+        for file in files:
+            await write_one_file_on_disc(files_dir / str(file.filename), file)
+        for cover in covers:
+            await write_one_file_on_disc(cover_dir / str(cover.filename), cover)
+
+        payload = {
+            "kind": kind,
+            "category": category,
+            "date": date,
+            "files": filenames,
+            "event_cover": event_cover.filename if event_cover else None,
+            "event_description": event_description,
+        }
+        await queue_staged_upload(job_id, payload)
+    except Exception:
+        shutil.rmtree(job_dir(job_id), ignore_errors=True)
+        raise
+
+    return job_id
+
+
+async def queue_staged_upload(job_id: str, payload: dict[str, Any]) -> None:
+    """Ставит в очередь задачу для файлов, уже лежащих в job_dir(job_id)"""
+    await save_job(job_id, status="queued", payload=orjson.dumps(payload))
+    await redis_helper.client.lpush(queue_key(), job_id)
+
+
+async def save_job(job_id: str, **fields: Any) -> None:
+    """Обновляет поля задачи в хеше Redis и продлевает его время жизни"""
+    key = job_key(job_id)
+    await redis_helper.client.hset(key, mapping={**fields, "updated": time.time()})
+    await redis_helper.client.expire(key, settings.uploads.job_ttl)
+
+
+async def get_upload_job(job_id: str) -> dict[str, Any] | None:
+    """Возвращает состояние задачи для конечной точки статуса
+    или None, если задачи нет (или она устарела)"""
+    job = await redis_helper.client.hgetall(job_key(job_id))
+    if not job:
+        return None
+    job = {key.decode(): value for key, value in job.items()}
+    return {
+        "job_id": job_id,
+        "status": job["status"].decode(),
+        "detail": job["detail"].decode() if "detail" in job else None,
+        "result": orjson.loads(job["result"]) if "result" in job else None,
+    }
+
+
+# Надежная очередь: обработчик забирает задачу командой BLMOVE в свой
+# список обрабатываемых задач и убирает ее оттуда после обработки. Пока
+# обработчик жив, он продлевает ключ heartbeat_key. Задачи обработчиков,
+# ключ которых истек (процесс убит, остановлен по OOM, перезапущен при
+# развертывании), возвращаются в очередь recover_abandoned_jobs, а после
+# max_job_attempts прерванных попыток помечаются неудачными.
+
+
+async def register_worker(worker_id: str) -> None:
+    await redis_helper.client.sadd(workers_key(), worker_id)
+    await heartbeat(worker_id)
+
+
+async def heartbeat(worker_id: str) -> None:
+    await redis_helper.client.set(
+        heartbeat_key(worker_id), 1, ex=settings.uploads.worker_heartbeat_ttl
+    )
+
+
+async def unregister_worker(worker_id: str) -> None:
+    """Снимает регистрацию остановленного обработчика. Незавершенные
+    задачи из его списка вернет в очередь recover_abandoned_jobs."""
+    await redis_helper.client.delete(heartbeat_key(worker_id))
+    if not await redis_helper.client.llen(processing_key(worker_id)):
+        await redis_helper.client.srem(workers_key(), worker_id)
+
+
+async def take_upload_job(worker_id: str, timeout: float) -> str | None:
+    """Переносит следующую задачу из очереди в список задач обработчика
+    и возвращает ее id или None, если за timeout секунд задач не было"""
+    item = await redis_helper.client.blmove(
+        queue_key(), processing_key(worker_id), timeout, src="RIGHT", dest="LEFT"
+    )
+    return item.decode() if item is not None else None
+
+
+async def complete_upload_job(worker_id: str, job_id: str) -> None:
+    await redis_helper.client.lrem(processing_key(worker_id), 1, job_id)
+
+
+async def recover_abandoned_jobs() -> int:
+    """Возвращает в очередь задачи обработчиков, переставших продлевать
+    heartbeat_key. Задача, обработка которой прерывалась max_job_attempts
+    раз, помечается неудачной, а ее временный каталог удаляется.
+    Возвращает число найденных задач."""
+    client = redis_helper.client
+    if not await client.set(
+        recovery_lock_key(), 1, nx=True, ex=settings.uploads.worker_heartbeat_ttl
+    ):
+        return 0  # восстановлением уже занят другой обработчик
+
+    recovered = 0
+    try:
+        for member in await client.smembers(workers_key()):
+            worker_id = member.decode()
+            if await client.exists(heartbeat_key(worker_id)):
+                continue
+            processing = processing_key(worker_id)
+            while (item := await client.lindex(processing, -1)) is not None:
+                job_id = item.decode()
+                recovered += 1
+                if not await client.exists(job_key(job_id)):
+                    await client.lrem(processing, 1, item)
+                    continue
+                attempts = await client.hincrby(job_key(job_id), "attempts", 1)
+                if attempts >= settings.uploads.max_job_attempts:
+                    logger.error(f"Задача загрузки {job_id} прервана {attempts} раз")
+                    await save_job(
+                        job_id,
+                        status="failed",
+                        detail="Обработка загрузки несколько раз прерывалась",
+                    )
+                    shutil.rmtree(job_dir(job_id), ignore_errors=True)
+                    await client.lrem(processing, 1, item)
+                else:
+                    logger.warning(f"Задача загрузки {job_id} возвращена в очередь")
+                    await save_job(job_id, status="queued")
+                    # в конец, из которого очередь читается: задача выполнится первой
+                    await client.lmove(processing, queue_key(), "RIGHT", "RIGHT")
+            await client.srem(workers_key(), worker_id)
+    finally:
+        await client.delete(recovery_lock_key())
+    return recovered
+
+
+def staged_file(path: Path) -> UploadFile:
+    return UploadFile(
+        file=open(path, "rb"), filename=path.name, size=path.stat().st_size
+    )
+
+
+async def run_staged_upload(
+    db: AsyncSession,
+    job_id: str,
+    payload: dict[str, Any],
+    progress: UploadProgress,
+) -> list[str]:
+    """Передает файлы из job_dir(job_id) обычному пути загрузки
+    (upload_pictures или add_pictures_to_existing_event) как UploadFile
+    и возвращает его результат"""
+    files_dir = job_dir(job_id) / "files"
+    cover_dir = job_dir(job_id) / "cover"
+    files = [staged_file(files_dir / name) for name in payload["files"]]
+    cover = None
+    if payload["event_cover"] is not None:
+        cover = staged_file(cover_dir / payload["event_cover"])
+
+    try:
+        async with admit_upload(files):
+            if payload["kind"] == JOB_CREATE_EVENT:
+                return await pictures_crud.upload_pictures(
+                    db,
+                    files,
+                    payload["category"],
+                    payload["date"],
+                    cover,  # type: ignore
+                    payload["event_description"],
+                    progress=progress,
+                )
+            return await events_crud.add_pictures_to_existing_event(
+                db, payload["category"], payload["date"], files, progress=progress
+            )
+    finally:
+        for file in files + ([cover] if cover else []):
+            file.file.close()
+
+
+async def process_upload_job(db: AsyncSession, job_id: str) -> None:
+    """Обрабатывает задачу из очереди через run_staged_upload, сбрасывает
+    кеш ответов и записывает результат. Прогресс по файлам публикуется
+    как для синхронной загрузки с X-Upload-Id, равным id задачи.
+    Временный каталог задачи удаляется."""
+    job = await redis_helper.client.hget(job_key(job_id), "payload")
+    if job is None:
+        logger.warning(f"Задача загрузки {job_id} не найдена")
+        return
+    payload = orjson.loads(job)
+    await save_job(job_id, status="processing")
+
+    try:
+        async with UploadProgress(job_id) as progress:
+            result = await run_staged_upload(db, job_id, payload, progress)
+            await FastAPICache.clear()
+    except HTTPException as e:
+        await save_job(job_id, status="failed", detail=str(e.detail))
+    except Exception:
+        logger.exception(f"Ошибка обработки задачи загрузки {job_id}")
+        await save_job(job_id, status="failed", detail="Ошибка обработки загрузки")
+    else:
+        await save_job(job_id, status="done", result=orjson.dumps(result))
+    finally:
+        shutil.rmtree(job_dir(job_id), ignore_errors=True)
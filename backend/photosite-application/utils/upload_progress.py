@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import re
+from collections.abc import AsyncIterator
+from typing import Annotated, Any
+
+import orjson
+from fastapi import Header, HTTPException, Request, status
+
+from core.config import settings
+from core.redis_helper import redis_helper
+
+logger = logging.getLogger(__name__)
+
+# этапы обработки одного файла в save_multiple_files_to_event
+STAGE_RECEIVED = "received"
+STAGE_WRITTEN = "written"
+STAGE_THUMBNAILED = "thumbnailed"
+STAGE_COMMITTED = "committed"
+FILE_STAGES = (STAGE_RECEIVED, STAGE_WRITTEN, STAGE_THUMBNAILED, STAGE_COMMITTED)
+
+# итог загрузки, после которого поток событий закрывается
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+UPLOAD_ID_PATTERN = re.compile(r"^[A-Za-z0-9-]{1,64}$")
+
+
+def channel_key(upload_id: str) -> str:
+    return f"{settings.redis.prefix}:upload-progress:{upload_id}"
+
+
+def snapshot_key(upload_id: str) -> str:
+    return f"{settings.redis.prefix}:upload-progress-state:{upload_id}"
+
+
+def get_upload_id(
+    x_upload_id: Annotated[str | None, Header()] = None,
+) -> str | None:
+    """Зависимость конечных точек загрузки: идентификатор загрузки,
+    который клиент генерирует сам и передает в заголовке X-Upload-Id,
+    чтобы заранее открыть поток прогресса"""
+    if x_upload_id is not None and not UPLOAD_ID_PATTERN.match(x_upload_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Неверный идентификатор загрузки",
+        )
+    return x_upload_id
+
+
+class UploadProgress:
+    """Публикует прогресс загрузки в канал Redis pub/sub, поэтому поток
+    событий может отдавать любой воркер, а не только принявший загрузку.
+    Счетчики этапов дублируются в хеше Redis, из которого клиент,
+    подключившийся позже, получает текущее состояние. При upload_id=None
+    (клиент не просил прогресс) методы ничего не делают. Ошибки Redis
+    записываются в лог и не прерывают загрузку."""
+
+    def __init__(self, upload_id: str | None) -> None:
+        self.upload_id = upload_id
+        self.total = 0
+
+    async def __aenter__(self) -> "UploadProgress":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        """Публикует итог загрузки: done или failed с текстом ошибки"""
+        if exc is None:
+            await self.finish(STATUS_DONE)
+        elif isinstance(exc, HTTPException):
+            await self.finish(STATUS_FAILED, str(exc.detail))
+        else:
+            await self.finish(STATUS_FAILED, "Ошибка обработки загрузки")
+
+    async def start(self, total: int) -> None:
+        self.total = total
+        await self.publish({"stage": "started", "total": total}, total=total)
+
+    async def file_stage(self, stage: str, filename: str) -> None:
+        await self.publish({"stage": stage, "file": filename}, increment=stage)
+
+    async def finish(self, status: str, detail: str | None = None) -> None:
+        event: dict[str, Any] = {"stage": status}
+        if detail is not None:
+            event["detail"] = detail
+        await self.publish(event, status=status, detail=detail or "")
+
+    async def publish(
+        self,
+        event: dict[str, Any],
+        increment: str | None = None,
+        **snapshot: Any,
+    ) -> None:
+        if self.upload_id is None:
+            return
+        key = snapshot_key(self.upload_id)
+        try:
+            if increment is not None:
+                await redis_helper.client.hincrby(key, increment, 1)
+            if snapshot:
+                await redis_helper.client.hset(key, mapping=snapshot)
+            await redis_helper.client.expire(key, settings.uploads.job_ttl)
+            await redis_helper.client.publish(
+                channel_key(self.upload_id), orjson.dumps(event)
+            )
+        except Exception:
+            logger.warning(
+                f"Не удалось опубликовать прогресс загрузки {self.upload_id}",
+                exc_info=True,
+            )
+
+
+async def get_progress_snapshot(upload_id: str) -> dict[str, Any]:
+    state = await redis_helper.client.hgetall(snapshot_key(upload_id))
+    state = {key.decode(): value.decode() for key, value in state.items()}
+    snapshot: dict[str, Any] = {
+        stage: int(state.get(stage, 0)) for stage in FILE_STAGES
+    }
+    snapshot["total"] = int(state.get("total", 0))
+    snapshot["status"] = state.get("status") or None
+    if state.get("detail"):
+        snapshot["detail"] = state["detail"]
+    return snapshot
+
+
+def format_sse(event: str, data: bytes) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + data + b"\n\n"
+
+
+async def progress_events(
+    request: Request,
+    upload_id: str,
+    keepalive: float = 15,
+) -> AsyncIterator[bytes]:
+    """Поток Server-Sent Events: сначала событие snapshot с текущим
+    состоянием, затем события progress из канала до итогового done или
+    failed. Подписка оформляется до чтения состояния, чтобы не потерять
+    события между ними. Пока событий нет, отправляется комментарий,
+    чтобы прокси не закрывали соединение."""
+    pubsub = redis_helper.client.pubsub()
+    await pubsub.subscribe(channel_key(upload_id))
+    try:
+        snapshot = await get_progress_snapshot(upload_id)
+        yield format_sse("snapshot", orjson.dumps(snapshot))
+        if snapshot["status"] in (STATUS_DONE, STATUS_FAILED):
+            return
+
+        while not await request.is_disconnected():
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=keepalive
+            )
+            if message is None:
+                yield b": keepalive\n\n"
+                continue
+            event = orjson.loads(message["data"])
+            if event["stage"] in (STATUS_DONE, STATUS_FAILED):
+                yield format_sse(event["stage"], message["data"])
+                return
+            yield format_sse("progress", message["data"])
+    finally:
+        await asyncio.shield(pubsub.aclose())
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import time
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from api.api_v1 import events as events_api
+from core.config import settings
+from core.models import db_helper
+from core.models.category import CategoryName
+from core.redis_helper import redis_helper
+from crud import categories as categories_crud
+from crud import events as events_crud
+from crud import users as users_crud
+from utils.serialization import EVENT_COLUMNS, PICTURE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = [category.value for category in CategoryName]
+
+
+async def open_connections(engine: AsyncEngine, count: int) -> None:
+    """Одновременно открывает count соединений и возвращает их в пул,
+    чтобы первые запросы воркера не ждали установки соединения с базой"""
+    connections = await asyncio.gather(*(engine.connect() for _ in range(count)))
+    try:
+        for connection in connections:
+            await connection.execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            await connection.close()
+
+
+async def compile_hot_statements(db: AsyncSession) -> None:
+    """Выполняет запросы публичных конечных точек, чтобы их SQL попал
+    в кеш скомпилированных выражений SQLAlchemy (он свой у каждого движка)"""
+    limit = settings.querysettings.limit
+    await events_crud.get_events_by_category(db, CATEGORIES[0], limit=limit)
+    await events_crud.get_latest_events_by_categories(db, CATEGORIES, limit=limit)
+    await events_crud.get_event_picture_rows(db, 0, PICTURE_COLUMNS)
+    await events_crud.get_event_picture_rows(db, 0, ("name",))
+    await categories_crud.get_categories_stats(db)
+    try:
+        await events_crud.get_event_row(db, CATEGORIES[0], "1970-01-01", EVENT_COLUMNS)
+    except HTTPException:
+        pass
+
+
+async def prewarm_response_cache(db: AsyncSession) -> None:
+    """Заполняет кеш ответов первыми страницами всех категорий и ответом
+    для главной страницы. Аргументы передаются в том же порядке, в котором
+    их передает FastAPI (сначала зависимости, затем путь и параметры
+    запроса): от этого зависит ключ кеша events_key_builder."""
+    limit = settings.querysettings.limit
+    for category in CATEGORIES:
+        await events_api.get_events_with_category(
+            db=db, fields=None, category=category, limit=limit, page=1
+        )
+    await events_api.get_latest_events_for_categories(
+        db=db, fields=None, categories=CATEGORIES, limit=limit
+    )
+
+
+async def warm_up_database(
+    engine: AsyncEngine,
+    session_factory: async_sessionmaker[AsyncSession],
+) -> None:
+    await open_connections(engine, min(settings.warmup.connections, engine.pool.size()))
+    async with session_factory() as db:
+        await compile_hot_statements(db)
+
+
+async def warm_up() -> None:
+    """Прогрев воркера при запуске: соединения с базой (основной
+    и репликами) и Redis, кеш скомпилированных запросов и, если включено,
+    кеш ответов. Ошибки прогрева записываются в лог и не мешают запуску."""
+    started = time.perf_counter()
+
+    try:
+        await redis_helper.client.ping()
+    except Exception:
+        logger.warning("Прогрев: Redis недоступен", exc_info=True)
+
+    try:
+        await warm_up_database(db_helper.engine, db_helper.session_factory)
+        async with db_helper.session_factory() as db:
+            await users_crud.get_user_by_username(db, "")
+        for engine, session_factory in zip(
+            db_helper.replica_engines, db_helper.replica_session_factories
+        ):
+            await warm_up_database(engine, session_factory)
+
+        if settings.warmup.response_cache:
+            async with db_helper.session_factory() as db:
+                await prewarm_response_cache(db)
+    except Exception:
+        logger.warning("Прогрев: ошибка при обращении к базе данных", exc_info=True)
+
+    logger.info(f"Прогрев воркера занял {time.perf_counter() - started:.3f} секунд")